@@ -0,0 +1,133 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ("ReportBundle",)
+
+
+import os, json, zipfile, warnings
+
+from wirelog import WireLog
+
+
+class ReportBundle:
+   """
+   Report bundle: a single ZIP file holding compressed case detail records
+   (in JSON, one entry per agent/case) and the master report index (as
+   "index.json"). Case records are added as soon as cases are logged, and
+   the ZIP central directory is written with each flush. When an entry is
+   written more than once (a case rerun, or the index), the last one wins,
+   and the bundle is compacted on flush when superseded entries take up
+   more space than live ones.
+   """
+
+   INDEX = "index.json"
+
+   def __init__(self, filename, mode = 'r'):
+      """
+      :param filename: Bundle file name.
+      :type filename: str
+      :param mode: 'r' to read an existing bundle, 'w' to create a new one.
+      :type mode: str
+      """
+      self.filename = filename
+      self.zip = zipfile.ZipFile(filename, mode, zipfile.ZIP_DEFLATED, allowZip64 = True)
+
+      ## octets in the bundle taken up by superseded entries
+      ##
+      self.stale = 0
+
+
+   def _entrySize(self, info):
+      return 30 + len(info.filename) + len(info.extra) + info.compress_size
+
+
+   def _write(self, name, data):
+      if name in self.zip.NameToInfo:
+         self.stale += self._entrySize(self.zip.NameToInfo[name])
+      with warnings.catch_warnings():
+         warnings.simplefilter("ignore") # duplicate names
+         self.zip.writestr(name, data)
+
+
+   def addCase(self, filename, case):
+      """
+      Add case detail record.
+
+      :param filename: Entry name (the classic case detail report JSON file name).
+      :type filename: str
+      :param case: Case results.
+      :type case: dict
+      """
+      if isinstance(case["wirelog"], WireLog):
+         case = dict(case)
+         case["wirelog"] = case["wirelog"].decode()
+      self._write(filename, json.dumps(case, separators = (',', ':')))
+
+
+   def setIndex(self, index):
+      """
+      Set master report index.
+
+      :param index: Master report as created by FuzzingFactory.createMasterReport.
+      :type index: dict
+      """
+      self._write(ReportBundle.INDEX, json.dumps(index, separators = (',', ':')))
+
+
+   def flush(self):
+      """
+      Write out the ZIP central directory, so the bundle can be read. When
+      superseded entries take up more space than live ones, the bundle is
+      rewritten with live entries only, so its size stays within twice the
+      size of the live entries.
+      """
+      live = sum([self._entrySize(info) for info in self.zip.NameToInfo.values()])
+      self.zip.close()
+      if self.stale > live:
+         self.compact()
+      self.zip = zipfile.ZipFile(self.filename, 'a', zipfile.ZIP_DEFLATED, allowZip64 = True)
+
+
+   def compact(self):
+      """
+      Rewrite the (closed) bundle with the last entry written for each name.
+      """
+      tmpname = self.filename + ".tmp"
+      src = zipfile.ZipFile(self.filename, 'r')
+      dst = zipfile.ZipFile(tmpname, 'w', zipfile.ZIP_DEFLATED, allowZip64 = True)
+      for info in src.infolist():
+         if src.NameToInfo[info.filename] is info:
+            dst.writestr(zipfile.ZipInfo(info.filename, info.date_time), src.read(info), zipfile.ZIP_DEFLATED)
+      dst.close()
+      src.close()
+      if os.name == 'nt':
+         os.remove(self.filename)
+      os.rename(tmpname, self.filename)
+      self.stale = 0
+
+
+   def getIndex(self):
+      return json.loads(self.zip.read(ReportBundle.INDEX))
+
+
+   def getCase(self, filename):
+      return json.loads(self.zip.read(filename))
+
+
+   def close(self):
+      self.zip.close()
@@ -49,6 +49,8 @@ CaseCategories = {"0": "Handshake",
                   "10": "Misc",
                   "12": "WebSocket Compression (different payloads)",
                   "13": "WebSocket Compression (different parameters)",
+                  "14": "Limits/Performance (pipelined echo)",
+                  "15": "Limits/Performance (sustained streaming)",
                   }
 
 CaseSubCategories = {"1.1": "Text Messages",
@@ -257,6 +259,10 @@ from case10_1_1 import *
 
 from case12_x_x import *
 
+from case14_x_x import *
+
+from case15_x_x import *
+
 
 ##
 ## This is the list of Case classes that will be run by the fuzzing server/client
@@ -302,3 +308,11 @@ CaseSubCategories.update(Case12_X_X_CaseSubCategories)
 
 Cases.extend(Case13_X_X)
 CaseSubCategories.update(Case13_X_X_CaseSubCategories)
+
+## Pipelined echo throughput
+Cases.extend(Case14_X_X)
+CaseSubCategories.update(Case14_X_X_CaseSubCategories)
+
+## Sustained streaming throughput
+Cases.extend(Case15_X_X)
+CaseSubCategories.update(Case15_X_X_CaseSubCategories)
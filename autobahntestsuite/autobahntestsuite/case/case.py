@@ -16,9 +16,91 @@
 ##
 ###############################################################################
 
-import pickle
+import pickle, hashlib, binascii
 
 from autobahn.websocket.protocol import WebSocketProtocol
+from autobahntestsuite.wirelog import asciiLogData
+
+
+class EventPayload:
+   """
+   Payload of a received or expected event for matching: payloads are
+   compared by their type, length and SHA1 digest, and only a short prefix
+   is kept. Received payloads longer than the prefix are stored as such.
+   """
+
+   def __init__(self, data, prefixLen):
+      self.type = type(data)
+      self.length = len(data)
+      self.digest = hashlib.sha1(data.encode('utf8') if self.type == unicode else data).digest()
+      self.prefix = data[:prefixLen]
+
+   def __eq__(self, other):
+      return isinstance(other, EventPayload) and self.digest == other.digest and \
+             self.length == other.length and self.type == other.type
+
+   def __ne__(self, other):
+      return not self.__eq__(other)
+
+   def logData(self):
+      """
+      Render payload for case reports: the prefix, with length and digest.
+      """
+      prefix = self.prefix.encode('utf8') if self.type == unicode else self.prefix
+      return u"%s [length %d, SHA1 %s]" % (asciiLogData(prefix, replace = True), self.length, binascii.b2a_hex(self.digest))
+
+
+
+class ExpectedOutcome:
+   """
+   Matching state of an expected outcome (a list of events) of a case.
+   """
+
+   def __init__(self, events, keys):
+      self.events = events
+      self.length = len(events)
+      self.keys = keys
+      self.matching = True
+
+   def isFor(self, events):
+      return events is self.events and len(events) == self.length
+
+
+
+class OutcomeMatcher:
+   """
+   Matching state of the expected outcomes of a case against the events
+   received, kept between calls to Case.matchReceived.
+   """
+
+   def __init__(self, expected, eventKey):
+      self.expected = expected
+      self.outcomes = dict([(e, ExpectedOutcome(v, [eventKey(x) for x in v])) for e, v in expected.items()])
+      self.matched = 0
+
+   def isFor(self, expected):
+      """
+      Check if the matcher is for the expected outcomes as they are now, since
+      cases may change those after matching started.
+      """
+      return expected is self.expected and len(expected) == len(self.outcomes) and \
+             all(e in self.outcomes and self.outcomes[e].isFor(v) for e, v in expected.iteritems())
+
+   def match(self, keys):
+      """
+      Match events received since the last call.
+
+      :param keys: Keys of all events received so far.
+      :type keys: list
+      :returns: list -- Expected outcomes the received events match.
+      """
+      for i in xrange(self.matched, len(keys)):
+         for o in self.outcomes.itervalues():
+            if o.matching and (i >= o.length or o.keys[i] != keys[i]):
+               o.matching = False
+      self.matched = len(keys)
+      return [e for e in self.expected if self.outcomes[e].matching and self.outcomes[e].length == self.matched]
+
 
 
 class Case:
@@ -37,9 +119,21 @@ class Case:
 
    SUBCASES = []
 
+   ## opt-in cases are only run when selected by id, or by a case pattern
+   ## naming their category (as "14.*"), but not by e.g. "*"
+   ##
+   OPT_IN = False
+
+   ## received payloads longer than this are stored as EventPayload (length,
+   ## digest and prefix of this length), while matching covers the full payload
+   ##
+   RECEIVED_PAYLOAD_LEN = 64
+
    def __init__(self, protocol):
       self.p = protocol
       self.received = []
+      self.receivedKeys = []
+      self.matcher = None
       self.expected = {}
       self.expectedClose = {}
       self.behavior = Case.FAILED
@@ -49,6 +143,8 @@ class Case:
       self.reportTime = False
       self.reportCompressionRatio = False
       self.trafficStats = None
+      self.rtt = None # round trip times histogram, for cases measuring those
+      self.throughput = None # messages/octets per second, for cases measuring those
       self.subcase = None
       self.suppressClose = False # suppresses automatic close behavior (used in cases that deliberately send bad close behavior)
 
@@ -74,15 +170,15 @@ class Case:
       pass
 
    def onMessage(self, msg, binary):
-      self.received.append(("message", msg, binary))
+      self.appendReceived(("message", msg, binary))
       self.finishWhenDone()
 
    def onPing(self, payload):
-      self.received.append(("ping", payload))
+      self.appendReceived(("ping", payload))
       self.finishWhenDone()
 
    def onPong(self, payload):
-      self.received.append(("pong", payload))
+      self.appendReceived(("pong", payload))
       self.finishWhenDone()
 
    def onClose(self, wasClean, code, reason):
@@ -91,10 +187,50 @@ class Case:
    def compare(self, obj1, obj2):
       return pickle.dumps(obj1) == pickle.dumps(obj2)
 
+   def eventKey(self, event):
+      """
+      Key of a received or expected event for matching, with payloads as
+      EventPayload.
+      """
+      return tuple([EventPayload(x, Case.RECEIVED_PAYLOAD_LEN) if isinstance(x, basestring) else (type(x), x) for x in event])
+
+   def appendReceived(self, event):
+      """
+      Store a received event, with payloads longer than RECEIVED_PAYLOAD_LEN
+      as EventPayload.
+      """
+      self.catchUpReceived()
+      key = self.eventKey(event)
+      self.receivedKeys.append(key)
+      self.received.append(tuple([k if isinstance(k, EventPayload) and k.length > Case.RECEIVED_PAYLOAD_LEN else x for x, k in zip(event, key)]))
+
+   def catchUpReceived(self):
+      ## cases may append events to self.received directly
+      ##
+      for i in xrange(len(self.receivedKeys), len(self.received)):
+         self.receivedKeys.append(self.eventKey(self.received[i]))
+
+   def matchReceived(self):
+      """
+      Match received events against expected outcomes. Each event received
+      is only matched once, so this is O(1) per event.
+
+      :returns: list -- Expected outcomes the received events match.
+      """
+      self.catchUpReceived()
+
+      ## (re)start matching when the expected outcomes were changed
+      ##
+      if self.matcher is None or not self.matcher.isFor(self.expected):
+         self.matcher = OutcomeMatcher(self.expected, self.eventKey)
+
+      return self.matcher.match(self.receivedKeys)
+
    def onConnectionLost(self, failedByMe):
       # check if we passed the test
+      matched = self.matchReceived()
       for e in self.expected:
-         if self.compare(self.received, self.expected[e]):
+         if e in matched:
             self.behavior = e
             self.passed = True
             self.result = "Actual events match at least one expected."
@@ -132,9 +268,8 @@ class Case:
    def finishWhenDone(self):
       # if we match at least one expected outcome check if we are supposed to
       # start the closing handshake and if so, do it.
-      for e in self.expected:
-         if not self.compare(self.received, self.expected[e]):
-            return
+      if len(self.matchReceived()) < len(self.expected):
+         return
       if self.expectedClose["closedByMe"] and not self.suppressClose:
          self.p.sendClose(self.expectedClose["closeCode"][0])
 
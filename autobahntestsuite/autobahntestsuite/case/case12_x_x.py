@@ -22,9 +22,11 @@ __all__ = ['Case12_X_X',
            'Case13_X_X_CaseSubCategories',
            ]
 
-import copy, os, pkg_resources, hashlib, binascii
+import copy, os, mmap, pkg_resources, hashlib, binascii
 
 from case import Case
+from autobahntestsuite.util import monotonic
+from autobahntestsuite.histogram import Histogram
 from autobahn.websocket.compress import *
 
 
@@ -91,6 +93,103 @@ WS_COMPRESSION_TESTDATA = {
 WS_COMPRESSION_TESTDATA_KEYS = ['json_data1', 'lena512', 'gutenberg_faust', 'html_data1', 'ooms']
 
 
+class TestCorpus:
+   """
+   Test data file, memory mapped once per process. Messages are consecutive
+   windows of LEN octets (binary data) or characters (text data) of the file,
+   wrapping around at its end. The windows (as octet ranges into the file) and
+   the SHA1 digests of the messages are cached in a fixed number of slots per
+   message length, so sending a message usually only slices the mapped file.
+   """
+
+   ## number of windows cached per message length (message i goes to slot
+   ## i % WINDOW_SLOTS), enough for the messages of all cases
+   ##
+   WINDOW_SLOTS = max([count for _, count, _, _ in MSG_SIZES])
+
+   ## text data: octet offsets are kept for every OFFSET_STRIDE-th character
+   ##
+   OFFSET_STRIDE = 4096
+
+   def __init__(self, testdata):
+      fn = pkg_resources.resource_filename("autobahntestsuite", "testdata/%s" % testdata['file'])
+      f = open(fn, 'rb')
+      self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+      f.close()
+
+      ## text data: windows are in characters of the decoded file
+      ##
+      if testdata['binary']:
+         self.text = None
+         self.length = len(self.data)
+      else:
+         self.text = self.data[:].decode('utf-8')
+         self.length = len(self.text)
+         self.offsets = []
+         offset = 0
+         for i in xrange(0, self.length, TestCorpus.OFFSET_STRIDE):
+            self.offsets.append(offset)
+            offset += len(self.text[i:i + TestCorpus.OFFSET_STRIDE].encode('utf-8'))
+
+      ## message length -> list of (message index, octet start, octet end, digest)
+      ##
+      self.windows = {}
+
+
+   def slice(self, start, end):
+      if end > start:
+         return self.data[start:end]
+      else:
+         return self.data[start:] + self.data[:end]
+
+
+   def byteOffset(self, idx):
+      """
+      Octet offset of the octet (binary data) or character (text data) with given index.
+      """
+      if self.text is None:
+         return idx
+      i = idx // TestCorpus.OFFSET_STRIDE
+      return self.offsets[i] + len(self.text[i * TestCorpus.OFFSET_STRIDE:idx].encode('utf-8'))
+
+
+   def window(self, length, index):
+      idxFrom = (index * length) % self.length
+      idxTo = (idxFrom + length) % self.length
+      byteFrom = self.byteOffset(idxFrom)
+      byteTo = self.byteOffset(idxTo)
+      return index, byteFrom, byteTo, hashlib.sha1(self.slice(byteFrom, byteTo)).digest()
+
+
+   def message(self, length, index):
+      """
+      Get message with given index of the messages of given length.
+
+      :returns: tuple -- (message, SHA1 digest of message).
+      """
+      if length == 0:
+         return '', hashlib.sha1('').digest()
+      windows = self.windows.get(length)
+      if windows is None:
+         windows = self.windows[length] = [None] * TestCorpus.WINDOW_SLOTS
+      slot = index % TestCorpus.WINDOW_SLOTS
+      if windows[slot] is None or windows[slot][0] != index:
+         windows[slot] = self.window(length, index)
+      _, byteFrom, byteTo, digest = windows[slot]
+      return self.slice(byteFrom, byteTo), digest
+
+
+
+## test data file -> TestCorpus, shared by all cases in this process
+##
+TEST_CORPORA = {}
+
+def getTestCorpus(testdata):
+   if testdata['file'] not in TEST_CORPORA:
+      TEST_CORPORA[testdata['file']] = TestCorpus(testdata)
+   return TEST_CORPORA[testdata['file']]
+
+
 def __init__(self, protocol):
    Case.__init__(self, protocol)
 
@@ -118,12 +217,7 @@ def init(self):
       self.p.perMessageCompressionAccept = accept
 
 
-   self.payloadRXPtr = 0
-   self.payloadTXPtr = 0
-
-   fn = pkg_resources.resource_filename("autobahntestsuite", "testdata/%s" % self.TESTDATA['file'])
-   self.testData = open(fn, 'rb').read()
-   self.testDataLen = len(self.testData)
+   self.corpus = getTestCorpus(self.TESTDATA)
 
 
 def onOpen(self):
@@ -139,44 +233,30 @@ def onOpen(self):
       self.p.closeAfter(self.WAITSECS)
 
       self.count = 0
+      self.rtt = Histogram()
       self.sendOne()
 
 
 def sendOne(self):
-   payload = self.testData
-   if not self.TESTDATA['binary']:
-      # If we're not working with a "binary" payload, treat it as a unicode string
-      payload = payload.decode('utf-8')
-   if self.LEN > 0:
-      idxFrom = self.payloadRXPtr
-      idxTo = (self.payloadRXPtr + self.LEN) % len(payload)
-      if idxTo > idxFrom:
-         msg = payload[idxFrom:idxTo]
-      else:
-         msg = payload[idxFrom:] + payload[:idxTo]
-      self.payloadRXPtr = idxTo
-   else:
-      msg = ''
-
-   if not self.TESTDATA['binary']:
-      msg = msg.encode('utf-8')
-
-   m = hashlib.sha1()
-   m.update(msg)
-   self._expected_hash = m.digest()
-
+   msg, self._expected_hash = self.corpus.message(self.LEN, self.count)
+   self.sent = monotonic()
    self.p.sendMessage(msg, self.TESTDATA['binary'])
    self.count += 1
 
 
 def onMessage(self, msg, binary):
+   self.rtt.record(round(1000000. * (monotonic() - self.sent)))
    m = hashlib.sha1()
    m.update(msg)
    received_hash = m.digest()
-   if not self.TESTDATA['binary']:
-      msg = msg.decode('utf-8')
 
-   if binary != self.TESTDATA['binary'] or len(msg) != self.LEN or received_hash != self._expected_hash:
+   ## the echo'ed message is as sent when its digest matches, so a text
+   ## message only gets decoded (to report its length) when it does not
+   ##
+   if binary != self.TESTDATA['binary'] or received_hash != self._expected_hash:
+
+      if not self.TESTDATA['binary']:
+         msg = msg.decode('utf-8')
 
       self.behavior = Case.FAILED
       self.p.enableWirelog(True)
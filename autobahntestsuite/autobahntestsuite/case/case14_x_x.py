@@ -0,0 +1,201 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ['Case14_X_X',
+           'Case14_X_X_CaseSubCategories',
+           ]
+
+import copy, hashlib, binascii
+from collections import deque
+
+from case import Case
+from case12_x_x import WS_COMPRESSION_TESTDATA, getTestCorpus, accept_deflate
+from autobahntestsuite.util import monotonic
+from autobahntestsuite.histogram import Histogram
+from autobahn.websocket.compress import *
+
+
+## list of (payload length, message count, case timeout)
+##
+MSG_SIZES = [
+   (16,    1000, 60),
+   (1024,  1000, 120),
+   (65536, 1000, 480),
+]
+
+## number of messages in flight (sent, but not yet echo'ed)
+##
+WINDOWS = [1, 8, 64, 512]
+
+## list of (test data, permessage-deflate)
+##
+PAYLOADS = [
+   (WS_COMPRESSION_TESTDATA['json_data1'], False),
+   (WS_COMPRESSION_TESTDATA['lena512'], False),
+   (WS_COMPRESSION_TESTDATA['json_data1'], True),
+   (WS_COMPRESSION_TESTDATA['lena512'], True),
+]
+
+
+def __init__(self, protocol):
+   Case.__init__(self, protocol)
+
+
+def init(self):
+   self.reportTime = True
+   self.reportCompressionRatio = self.DEFLATE
+
+   self.expectedClose = {"closedByMe": True,
+                         "closeCode": [self.p.CLOSE_STATUS_CODE_NORMAL],
+                         "requireClean": True}
+
+   ## permessage-deflate setup
+   ##
+   if self.DEFLATE:
+      if self.p.factory.isServer:
+         self.p.perMessageCompressionAccept = accept_deflate
+
+      else:
+         self.p.perMessageCompressionOffers = [PerMessageDeflateOffer()]
+
+         def accept(response):
+            if isinstance(response, PerMessageDeflateResponse):
+               return PerMessageDeflateResponseAccept(response)
+
+         self.p.perMessageCompressionAccept = accept
+
+   self.corpus = getTestCorpus(self.TESTDATA)
+
+
+def onOpen(self):
+   self.p.enableWirelog(False)
+
+   if self.DEFLATE and self.p._perMessageCompress is None:
+      self.behavior = Case.UNIMPLEMENTED
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+   else:
+      self.behavior = Case.FAILED
+      self.result = "Case did not finish within %d seconds." % self.WAITSECS
+      self.p.closeAfter(self.WAITSECS)
+
+      ## (time sent, SHA1 digest) of messages in flight - echo'ed messages
+      ## arrive in order
+      ##
+      self.inFlight = deque()
+      self.sentCount = 0
+      self.echoCount = 0
+      self.sentOctets = 0
+      self.rtt = Histogram()
+      self.started = monotonic()
+
+      while self.sentCount < min(self.WINDOW, self.COUNT):
+         self.sendOne()
+
+
+def sendOne(self):
+   msg, digest = self.corpus.message(self.LEN, self.sentCount)
+   self.inFlight.append((monotonic(), digest))
+   self.p.sendMessage(msg, self.TESTDATA['binary'])
+   self.sentCount += 1
+   self.sentOctets += len(msg)
+
+
+def onMessage(self, msg, binary):
+   if len(self.inFlight) == 0:
+      self.behavior = Case.FAILED
+      self.result = "Received more messages than I sent."
+      self.p.enableWirelog(True)
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+      return
+
+   sent, digest = self.inFlight.popleft()
+   now = monotonic()
+   self.rtt.record(round(1000000. * (now - sent)))
+   self.echoCount += 1
+
+   received_hash = hashlib.sha1(msg).digest()
+
+   if binary != self.TESTDATA['binary'] or received_hash != digest:
+
+      self.behavior = Case.FAILED
+      self.p.enableWirelog(True)
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+
+      if binary != self.TESTDATA['binary']:
+         self.result = "Echo'ed message type differs from what I sent (got binary {0}, expected binary {1}).".format(binary, self.TESTDATA['binary'])
+      else:
+         self.result = "Echo'ed message {0} contents differs from what I sent (got SHA1 {1}, expected SHA1 {2}).".format(self.echoCount, binascii.hexlify(received_hash), binascii.hexlify(digest))
+
+   elif self.echoCount < self.COUNT:
+      if self.sentCount < self.COUNT:
+         self.sendOne()
+
+   else:
+      elapsed = max(now - self.started, 0.000001)
+      self.throughput = {"messages": self.echoCount,
+                         "octets": self.sentOctets,
+                         "seconds": elapsed,
+                         "messagesPerSec": self.echoCount / elapsed,
+                         "octetsPerSec": self.sentOctets / elapsed}
+      self.behavior = Case.OK
+      self.result = "Ok, received all echo'ed messages in time ({0:.0f} messages/sec, {1:.0f} octets/sec).".format(self.throughput["messagesPerSec"], self.throughput["octetsPerSec"])
+      self.trafficStats = copy.deepcopy(self.p.trafficStats) if self.DEFLATE else None
+      self.p.enableWirelog(True)
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+
+
+
+##
+## Cases 14.x.x
+##
+Case14_X_X = []
+Case14_X_X_CaseSubCategories = {}
+
+j = 1
+for td, deflate in PAYLOADS:
+
+   isBinary = td["binary"]
+
+   Case14_X_X_CaseSubCategories['14.%d' % j] = "%s messages, %s" % ("Binary" if isBinary else "Text", "permessage-deflate" if deflate else "no compression")
+
+   i = 1
+   for s in MSG_SIZES:
+      for w in WINDOWS:
+         cc = "Case14_%d_%d" % (j, i)
+         DESCRIPTION = """Send %d %s messages of payload size %d (from %s), with up to %d messages in flight (sent, but not yet echo'ed), to measure implementation throughput.%s""" % (s[1], "binary" if isBinary else "text", s[0], td["file"], w, " Use default permessage-deflate offer." if deflate else "")
+         EXPECTATION = """Receive echo'ed messages (with payload as sent). Timeout case after %d secs.""" % (s[2])
+         C = type(cc,
+                   (object, Case, ),
+                   {"LEN": s[0],
+                    "COUNT": s[1],
+                    "WAITSECS": s[2],
+                    "WINDOW": w,
+                    "OPT_IN": True,
+                    "DEFLATE": deflate,
+                    "TESTDATA": td,
+                    "DESCRIPTION": """%s""" % DESCRIPTION,
+                    "EXPECTATION": """%s""" % EXPECTATION,
+                    "__init__": __init__,
+                    "init": init,
+                    "onOpen": onOpen,
+                    "onMessage": onMessage,
+                    "sendOne": sendOne,
+                    })
+         Case14_X_X.append(C)
+         i += 1
+   j += 1
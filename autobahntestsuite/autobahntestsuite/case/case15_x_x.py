@@ -0,0 +1,253 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ['Case15_X_X',
+           'Case15_X_X_CaseSubCategories',
+           ]
+
+from zope.interface import implements
+from twisted.internet import interfaces
+
+from case import Case
+from autobahntestsuite.util import monotonic
+
+
+## frame payload sizes
+##
+FRAME_SIZES = [16, 256, 4096, 65536, 1048576]
+
+## seconds to stream frames for
+##
+DURATION = 5
+
+## seconds to wait for the testee to catch up after streaming
+##
+DRAIN_TIMEOUT = 60
+
+## octets streamed at most in sink-only cases - the testee might buffer
+## the (never ended) message
+##
+SINK_MAX_OCTETS = 256 * 2**20
+
+## list of (binary, echo)
+##
+MODES = [(False, True),
+         (True, True),
+         (False, False),
+         (True, False)]
+
+
+class StreamProducer:
+   """
+   Push producer calling a send function as long as the transport accepts
+   data, which keeps track of how often and how long it was paused.
+   """
+
+   implements(interfaces.IPushProducer)
+
+   def __init__(self, send):
+      self.send = send
+      self.paused = False
+      self.stopped = False
+      self.pauses = 0
+      self.pausedSeconds = 0.
+      self.pausedSince = None
+
+   def pauseProducing(self):
+      if not self.paused:
+         self.paused = True
+         self.pauses += 1
+         self.pausedSince = monotonic()
+
+   def resumeProducing(self):
+      if self.stopped:
+         return
+      if self.pausedSince is not None:
+         self.pausedSeconds += monotonic() - self.pausedSince
+         self.pausedSince = None
+      self.paused = False
+      while not self.paused and not self.stopped:
+         self.send()
+
+   def stopProducing(self):
+      if self.pausedSince is not None:
+         self.pausedSeconds += monotonic() - self.pausedSince
+         self.pausedSince = None
+      self.stopped = True
+
+
+def __init__(self, protocol):
+   Case.__init__(self, protocol)
+
+
+def init(self):
+   self.reportTime = True
+   self.producer = StreamProducer(self.sendOne)
+
+
+def onOpen(self):
+   self.p.enableWirelog(False)
+   self.behavior = Case.FAILED
+   self.expectedClose = {"closedByMe": True, "closeCode": [self.p.CLOSE_STATUS_CODE_NORMAL], "requireClean": True}
+   self.result = "Case did not finish within %d seconds." % (DURATION + DRAIN_TIMEOUT)
+   self.p.closeAfter(DURATION + DRAIN_TIMEOUT)
+
+   ## the close handshake reply of a sink-only case is only sent after the
+   ## testee caught up, so allow for that
+   ##
+   if not self.ECHO:
+      self.p.closeHandshakeTimeout = max(self.p.closeHandshakeTimeout, DRAIN_TIMEOUT)
+
+   self.sentFrames = 0
+   self.sentOctets = 0
+   self.echoFrames = 0
+   self.echoOctets = 0
+   self.p.registerProducer(self.producer, True)
+   self.started = monotonic()
+   self.streaming = True
+
+   if not self.ECHO:
+      self.p.beginMessage(isBinary = self.BINARY)
+   self.producer.resumeProducing()
+   self.p.continueLater(DURATION, self.stopStreaming)
+
+
+def sendOne(self):
+   if self.ECHO:
+      self.p.sendMessage(self.PAYLOAD, self.BINARY)
+   else:
+      self.p.sendMessageFrame(self.PAYLOAD)
+   self.sentFrames += 1
+   self.sentOctets += len(self.PAYLOAD)
+   if not self.ECHO and self.sentOctets + len(self.PAYLOAD) > SINK_MAX_OCTETS:
+      self.stopStreaming()
+
+
+def stopStreaming(self):
+   if not self.streaming:
+      return
+   self.streaming = False
+   self.producer.stopProducing()
+   self.p.transport.unregisterProducer()
+
+   ## the message streamed by a sink-only case is never ended, and the testee
+   ## has processed all frames when it replies to the close
+   ##
+   if not self.ECHO:
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+   elif self.echoFrames == self.sentFrames:
+      self.finish()
+
+
+def finish(self):
+   elapsed = max(monotonic() - self.started, 0.000001)
+   self.throughput = {"frames": self.sentFrames,
+                      "octets": self.sentOctets,
+                      "seconds": elapsed,
+                      "framesPerSec": self.sentFrames / elapsed,
+                      "octetsPerSec": self.sentOctets / elapsed,
+                      "pauses": self.producer.pauses,
+                      "pausedSeconds": self.producer.pausedSeconds}
+   self.behavior = Case.OK
+   self.result = "Ok, testee processed %d frames (%d octets) in %.3f seconds (%.3f MB/s), producer paused %d times (%.3f seconds)." % \
+                 (self.sentFrames, self.sentOctets, elapsed, self.throughput["octetsPerSec"] / 1000000., self.producer.pauses, self.producer.pausedSeconds)
+   self.p.enableWirelog(True)
+   if self.ECHO:
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+
+
+def onMessage(self, msg, binary):
+   if not self.ECHO or binary != self.BINARY or msg != self.PAYLOAD:
+      self.behavior = Case.FAILED
+      self.result = "Echo'ed message type or payload differs from what I sent (got binary = %s, payload length = %s)." % (binary, len(msg))
+      self.producer.stopProducing()
+      self.p.enableWirelog(True)
+      self.p.sendClose(self.p.CLOSE_STATUS_CODE_NORMAL)
+   else:
+      self.echoFrames += 1
+      self.echoOctets += len(msg)
+      if not self.streaming and self.echoFrames == self.sentFrames:
+         self.finish()
+
+
+def onClose(self, wasClean, code, reason):
+   if not self.ECHO and self.behavior == Case.FAILED and self.p.remoteCloseCode is not None:
+
+      ## the testee might limit message size, and close the connection
+      ## before processing all frames
+      ##
+      if self.streaming and self.p.remoteCloseCode == self.p.CLOSE_STATUS_CODE_MESSAGE_TOO_BIG:
+         self.streaming = False
+         self.producer.stopProducing()
+         self.finish()
+         self.behavior = Case.INFORMATIONAL
+         self.result = "Testee closed the connection with code %d (message too big) after %d frames (%d octets) in %.3f seconds (%.3f MB/s)." % \
+                       (self.p.remoteCloseCode, self.sentFrames, self.sentOctets, self.throughput["seconds"], self.throughput["octetsPerSec"] / 1000000.)
+         self.expectedClose = {"closedByMe": False, "closeCode": [self.p.CLOSE_STATUS_CODE_MESSAGE_TOO_BIG], "requireClean": True}
+
+      elif not self.streaming:
+         self.finish()
+
+
+def onConnectionLost(self, failedByMe):
+   self.producer.stopProducing()
+   Case.onConnectionLost(self, failedByMe)
+
+
+
+##
+## Cases 15.x.x
+##
+Case15_X_X = []
+Case15_X_X_CaseSubCategories = {}
+
+j = 1
+for binary, echo in MODES:
+
+   Case15_X_X_CaseSubCategories['15.%d' % j] = "%s frames, %s" % ("Binary" if binary else "Text", "echo'ed messages" if echo else "sink-only (single message)")
+
+   i = 1
+   for size in FRAME_SIZES:
+      cc = "Case15_%d_%d" % (j, i)
+      if echo:
+         DESCRIPTION = """Stream %s messages of payload size %d for %d seconds, as fast as the testee accepts them, to measure sustained implementation throughput.""" % ("binary" if binary else "text", size, DURATION)
+         EXPECTATION = """Receive echo'ed messages (with payload as sent). Report octets and frames echo'ed per second, and how long sending was paused by flow control."""
+      else:
+         DESCRIPTION = """Stream frames of payload size %d of a single %s message for %d seconds (or up to %d octets), as fast as the testee accepts them, then close the connection (without ending the message), to measure sustained implementation throughput.""" % (size, "binary" if binary else "text", DURATION, SINK_MAX_OCTETS)
+         EXPECTATION = """Clean close with normal code, after processing all frames. Report octets and frames processed per second, and how long sending was paused by flow control. A testee closing with code 1009 (message too big) is informational."""
+      C = type(cc,
+                (object, Case, ),
+                {"PAYLOAD": ("\xfe" if binary else "*") * size,
+                 "BINARY": binary,
+                 "ECHO": echo,
+                 "OPT_IN": True,
+                 "DESCRIPTION": """%s""" % DESCRIPTION,
+                 "EXPECTATION": """%s""" % EXPECTATION,
+                 "__init__": __init__,
+                 "init": init,
+                 "onOpen": onOpen,
+                 "onMessage": onMessage,
+                 "onClose": onClose,
+                 "onConnectionLost": onConnectionLost,
+                 "sendOne": sendOne,
+                 "stopStreaming": stopStreaming,
+                 "finish": finish,
+                 })
+      Case15_X_X.append(C)
+      i += 1
+   j += 1
@@ -24,9 +24,10 @@ class Case7_1_6(Case):
 
    EXPECTATION = """Case outcome depends on implementation defined close behavior. Message and close frame are sent back to back. If the close frame is processed before the text message write is complete (as can happen in asynchronous processing models) the close frame is processed first and the text message may not be received or may only be partially received."""
    
+   DATALEN = 256 * 2**10
+
    def init(self):
       self.suppressClose = True
-      self.DATALEN = 256 * 2**10
       self.PAYLOAD = "BAsd7&jh23"
 
    def onConnectionLost(self, failedByMe):
@@ -24,8 +24,9 @@ class Case9_1_1(Case):
 
    EXPECTATION = """Receive echo'ed text message (with payload as sent)."""
 
+   DATALEN = 64 * 2**10
+
    def init(self):
-      self.DATALEN = 64 * 2**10
       self.PAYLOAD = "BAsd7&jh23"
       self.WAITSECS = 10
       self.reportTime = True
@@ -24,8 +24,9 @@ class Case9_1_2(Case9_1_1):
 
    EXPECTATION = """Receive echo'ed text message (with payload as sent)."""
 
+   DATALEN = 256 * 2**10
+
    def init(self):
-      self.DATALEN = 256 * 2**10
       self.PAYLOAD = "BAsd7&jh23"
       self.WAITSECS = 10
       self.reportTime = True
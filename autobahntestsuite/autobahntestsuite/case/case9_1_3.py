@@ -24,8 +24,9 @@ class Case9_1_3(Case9_1_1):
 
    EXPECTATION = """Receive echo'ed text message (with payload as sent)."""
 
+   DATALEN = 1 * 2**20
+
    def init(self):
-      self.DATALEN = 1 * 2**20
       self.PAYLOAD = "BAsd7&jh23"
       self.WAITSECS = 100
       self.reportTime = True
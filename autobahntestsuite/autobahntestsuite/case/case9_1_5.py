@@ -24,8 +24,9 @@ class Case9_1_5(Case9_1_1):
 
    EXPECTATION = """Receive echo'ed text message (with payload as sent)."""
 
+   DATALEN = 8 * 2**20
+
    def init(self):
-      self.DATALEN = 8 * 2**20
       self.PAYLOAD = "BAsd7&jh23"
       self.WAITSECS = 100
       self.reportTime = True
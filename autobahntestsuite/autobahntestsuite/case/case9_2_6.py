@@ -24,8 +24,9 @@ class Case9_2_6(Case9_2_1):
 
    EXPECTATION = """Receive echo'ed binary message (with payload as sent)."""
 
+   DATALEN = 16 * 2**20
+
    def init(self):
-      self.DATALEN = 16 * 2**20
       self.PAYLOAD = "\x00\xfe\x23\xfa\xf0"
       self.WAITSECS = 100
       self.reportTime = True
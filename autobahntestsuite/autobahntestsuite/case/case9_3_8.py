@@ -24,8 +24,9 @@ class Case9_3_8(Case9_3_1):
 
    EXPECTATION = """Receive echo'ed text message (with payload as sent)."""
 
+   DATALEN = 4 * 2**20
+
    def init(self):
-      self.DATALEN = 4 * 2**20
       self.FRAGSIZE = 1 * 2**20
       self.PAYLOAD = "*" * self.DATALEN
       self.WAITSECS = 100
@@ -24,8 +24,9 @@ class Case9_4_6(Case9_4_1):
 
    EXPECTATION = """Receive echo'ed binary message (with payload as sent)."""
 
+   DATALEN = 4 * 2**20
+
    def init(self):
-      self.DATALEN = 4 * 2**20
       self.FRAGSIZE = 64 * 2**10
       self.PAYLOAD = "*" * self.DATALEN
       self.WAITSECS = 100
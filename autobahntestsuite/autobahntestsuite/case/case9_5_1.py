@@ -27,8 +27,9 @@ class Case9_5_1(Case):
    def setChopSize(self):
       self.chopsize = 64
 
+   DATALEN = 1 * 2**20
+
    def init(self):
-      self.DATALEN = 1 * 2**20
       self.PAYLOAD = "BAsd7&jh23"
       self.WAITSECS = 1000
       self.reportTime = True
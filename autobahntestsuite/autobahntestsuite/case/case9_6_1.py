@@ -27,8 +27,9 @@ class Case9_6_1(Case):
    def setChopSize(self):
       self.chopsize = 64
 
+   DATALEN = 1 * 2**20
+
    def init(self):
-      self.DATALEN = 1 * 2**20
       self.PAYLOAD = "\x00\xfe\x23\xfa\xf0"
       self.WAITSECS = 1000
       self.reportTime = True
@@ -86,9 +86,11 @@ class CaseSet:
       return ' '.join(klass.DESCRIPTION.split('<')[0].split())
 
 
-   def resolveCasePatternList(self, patterns):
+   def resolveCasePatternList(self, patterns, optIn = True):
       """
       Return list of test cases that match against a list of case patterns.
+      Unless optIn is set, wildcard patterns only match opt-in cases when
+      naming their category (as "14.*").
       """
       specCases = []
       for c in patterns:
@@ -97,6 +99,8 @@ class CaseSet:
             p = re.compile(s)
             t = []
             for x in self.CasesIndices.keys():
+               if not optIn and getattr(self.CasesById[x], "OPT_IN", False) and not c.startswith(x.split('.')[0] + '.'):
+                  continue
                if p.match(x):
                   t.append(self.caseIdtoIdTuple(x))
             for h in sorted(t):
@@ -110,7 +114,7 @@ class CaseSet:
       """
       Return list of test cases that match against case patterns, minus exclude patterns.
       """
-      specCases = self.resolveCasePatternList(spec["cases"])
+      specCases = self.resolveCasePatternList(spec["cases"], optIn = False)
       if spec.has_key("exclude-cases"):
          excludeCases = self.resolveCasePatternList(spec["exclude-cases"])
       else:
@@ -120,6 +124,21 @@ class CaseSet:
       return cases
 
 
+   def shardCases(self, caseIds, costs, count):
+      """
+      Split a list of test cases into (at most) count shards of about equal
+      total cost, assigning the most expensive cases first, each to the shard
+      with the lowest total cost so far. Cases within a shard keep case order.
+      """
+      shards = [[] for i in xrange(count)]
+      totals = [0] * count
+      for caseId in sorted(caseIds, key = lambda x: costs[x], reverse = True):
+         i = totals.index(min(totals))
+         shards[i].append(caseId)
+         totals[i] += costs[caseId]
+      return [[self.caseIdTupletoId(y) for y in sorted([self.caseIdtoIdTuple(x) for x in shard])] for shard in shards if len(shard) > 0]
+
+
    def parseExcludeAgentCases(self, spec):
       """
       Parses "exclude-agent-cases" from the spec into a list of pairs
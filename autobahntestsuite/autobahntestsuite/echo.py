@@ -18,6 +18,11 @@
 
 __all__ = ['startClient', 'startServer']
 
+import pkg_resources
+
+from twisted.internet import reactor, ssl
+from twisted.web.server import Site
+from twisted.web.static import File
 
 from autobahn.twisted.websocket import connectWS, \
                                        listenWS, \
@@ -26,9 +31,19 @@ from autobahn.twisted.websocket import connectWS, \
                                        WebSocketServerFactory, \
                                        WebSocketServerProtocol
 
+from autobahntestsuite.metrics import WebSocketMetrics, MetricsResource
+
 
 class EchoServerProtocol(WebSocketServerProtocol):
 
+   def connectionMade(self):
+      WebSocketServerProtocol.connectionMade(self)
+      self.factory.metrics.connectionMade(self)
+
+   def connectionLost(self, reason):
+      self.factory.metrics.connectionLost(self)
+      WebSocketServerProtocol.connectionLost(self, reason)
+
    def onMessage(self, payload, isBinary):
       self.sendMessage(payload, isBinary)
 
@@ -41,6 +56,10 @@ class EchoServerFactory(WebSocketServerFactory):
    def __init__(self, url, debug = False):
       WebSocketServerFactory.__init__(self, url, debug = debug, debugCodePaths = debug)
 
+      ## metrics served at /metrics on the web port
+      ##
+      self.metrics = WebSocketMetrics()
+
 
 
 class EchoClientProtocol(WebSocketClientProtocol):
@@ -66,7 +85,7 @@ def startClient(wsuri, debug = False):
 
 
 
-def startServer(wsuri, sslKey = None, sslCert = None, debug = False):
+def startServer(wsuri, webport = None, sslKey = None, sslCert = None, debug = False):
    factory = EchoServerFactory(wsuri, debug)
    if sslKey and sslCert:
       sslContext = ssl.DefaultOpenSSLContextFactory(sslKey, sslCert)
@@ -74,4 +93,10 @@ def startServer(wsuri, sslKey = None, sslCert = None, debug = False):
       sslContext = None
    listenWS(factory, sslContext)
 
+   if webport:
+      webdir = File(pkg_resources.resource_filename("autobahntestsuite", "web/echoserver"))
+      webdir.putChild('metrics', MetricsResource(factory.metrics))
+      web = Site(webdir)
+      reactor.listenTCP(webport, web)
+
    return True
@@ -19,10 +19,13 @@
 __all__ = ['startClient', 'startServer', 'WS_COMPRESSION_TESTDATA']
 
 
-import os, json, binascii, time, textwrap, pkg_resources
+import os, sys, json, shutil, binascii, time, textwrap, multiprocessing, pkg_resources
 
 from twisted.python import log, usage
-from twisted.internet import reactor, ssl
+from twisted.internet import reactor, ssl, protocol
+from twisted.internet.defer import DeferredList, succeed, maybeDeferred
+from twisted.internet.threads import deferToThread
+from twisted.internet.task import LoopingCall
 from twisted.web.server import Site
 from twisted.web.static import File
 
@@ -31,7 +34,7 @@ import autobahn
 import autobahntestsuite
 
 from autobahn.websocket.protocol import WebSocketProtocol
-from autobahn.twisted.websocket import connectWS, listenWS
+from autobahn.twisted.websocket import listenWS
 from autobahn.twisted.websocket import WebSocketServerFactory, \
                                        WebSocketServerProtocol, \
                                        WebSocketClientFactory, \
@@ -44,36 +47,40 @@ from case import Case, \
                  CaseSetname, \
                  CaseBasename
 
+from case.case import EventPayload
 from caseset import CaseSet
+from wirelog import WireLog, asciiLogData
+from bundle import ReportBundle
+from metrics import WebSocketMetrics, CounterMetric, HistogramMetric, MetricsResource
+from util import monotonic, WorkerProcess
+from profiler import caseStarted, caseEnded, profilerArgs
 
 from autobahn.util import utcnow
 
 from report import CSS_COMMON, \
                    CSS_DETAIL_REPORT, \
                    CSS_MASTER_REPORT, \
-                   JS_MASTER_REPORT
+                   JS_MASTER_REPORT, \
+                   JS_CASE_DETAIL, \
+                   HTML_BUNDLE_VIEWER, \
+                   HTML_MATRIX_VIEWER
 
 
-def binLogData(data, maxlen = 64):
-   ellipses = " ..."
-   if len(data) > maxlen - len(ellipses):
-      dd = binascii.b2a_hex(data[:maxlen]) + ellipses
-   else:
-      dd = binascii.b2a_hex(data)
-   return dd
+class Utf8Writer:
+   """
+   File wrapper writing unicode strings encoded as UTF-8.
+   """
 
+   def __init__(self, f):
+      self.f = f
 
+   def write(self, s):
+      if type(s) == unicode:
+         s = s.encode('utf8')
+      self.f.write(s)
 
-def asciiLogData(data, maxlen = 64, replace = False):
-   ellipses = " ..."
-   try:
-      if len(data) > maxlen - len(ellipses):
-         dd = data[:maxlen] + ellipses
-      else:
-         dd = data
-      return dd.decode('utf8', errors = 'replace' if replace else 'strict')
-   except:
-      return '0x' + binLogData(data, maxlen)
+   def close(self):
+      self.f.close()
 
 
 
@@ -82,11 +89,29 @@ class FuzzingProtocol:
    Common mixin-base class for fuzzing server and client protocols.
    """
 
-   MAX_WIRE_LOG_DATA = 256
+   ## connection events timed for case timings, in order
+   ##
+   TIMING_EVENTS = ["connecting",
+                    "connected",
+                    "upgradeRequest",
+                    "upgradeResponse",
+                    "open",
+                    "firstFrame",
+                    "closeSent",
+                    "closeReceived",
+                    "closed"]
+
+   ## case timing phases, as (phase, from event, to event)
+   ##
+   TIMING_PHASES = [("tcpConnect", "connecting", "connected"),
+                    ("openingHandshake", "connected", "open"),
+                    ("firstFrame", "open", "firstFrame"),
+                    ("closingHandshake", "closeFirst", "closeLast"),
+                    ("tcpClose", "closeLast", "closed")]
 
    def connectionMade(self):
 
-      attrs = ['case', 'runCase', 'caseAgent', 'caseStarted', 'connectionWasOpen', 'shutdownOnComplete']
+      attrs = ['case', 'runCase', 'caseAgent', 'caseStarted', 'connectionWasOpen', 'shutdownOnComplete', 'connectingAt']
 
       for attr in attrs:
          if not hasattr(self, attr):
@@ -100,10 +125,19 @@ class FuzzingProtocol:
       self.caseStart = 0
       self.caseEnd = 0
 
-      ## wire log
+      ## event -> monotonic time of connection events
+      ##
+      self.timings = {"connected": monotonic()}
+      if self.connectingAt is not None:
+         self.timings["connecting"] = self.connectingAt
+
+      ## wire log, optionally bounded via spec
       ##
       self.createWirelog = True
-      self.wirelog = []
+      wirelogLimits = self.factory.spec.get("wirelog", {})
+      self.wirelog = WireLog(head = wirelogLimits.get("head", None),
+                             tail = wirelogLimits.get("tail", None),
+                             maxBytes = wirelogLimits.get("bytes", None))
 
       ## stats for octets and frames
       ##
@@ -119,6 +153,7 @@ class FuzzingProtocol:
    def connectionLost(self, reason):
       if self.runCase:
 
+         self.timeEvent("closed")
          self.runCase.onConnectionLost(self.failedByMe)
          self.caseEnd = time.time()
 
@@ -160,15 +195,28 @@ class FuzzingProtocol:
                        "txFrameStats": self.txFrameStats,
                        "httpRequest": self.http_request_data if hasattr(self, 'http_request_data') else '?',
                        "httpResponse": self.http_response_data if hasattr(self, 'http_response_data') else '?',
-                       "trafficStats": self.runCase.trafficStats.__json__() if self.runCase.trafficStats else None}
+                       "trafficStats": self.runCase.trafficStats.__json__() if self.runCase.trafficStats else None,
+                       "rtt": self.runCase.rtt.__json__() if self.runCase.rtt else None,
+                       "throughput": self.runCase.throughput,
+                       "timings": self.caseTimings()}
+
+         ## long payloads (received ones are stored as EventPayload) are logged
+         ## with their length and digest, so equal ones show as such
+         ##
+         def logPayload(payload):
+            if not isinstance(payload, EventPayload):
+               if len(payload) <= Case.RECEIVED_PAYLOAD_LEN:
+                  return asciiLogData(payload)
+               payload = EventPayload(payload, Case.RECEIVED_PAYLOAD_LEN)
+            return payload.logData()
 
          def cleanBin(e_old):
             e_new = []
             for t in e_old:
                if t[0] == 'message':
-                  e_new.append((t[0], asciiLogData(t[1]), t[2]))
+                  e_new.append((t[0], logPayload(t[1]), t[2]))
                elif t[0] in ['ping', 'pong']:
-                  e_new.append((t[0], asciiLogData(t[1])))
+                  e_new.append((t[0], logPayload(t[1])))
                elif t[0] == 'timeout':
                   e_new.append(t)
                else:
@@ -185,6 +233,40 @@ class FuzzingProtocol:
          ## now log the case results
          ##
          self.factory.logCase(caseResult)
+         caseEnded(self)
+
+
+   def timeEvent(self, event):
+      if event not in self.timings:
+         self.timings[event] = monotonic()
+
+
+   def caseTimings(self):
+      """
+      Get case timings: connection events (in ms since connecting, or since
+      connected when not known) and phase durations (in ms, or None when a
+      phase did not happen).
+      """
+      timings = dict(self.timings)
+      base = timings.get("connecting", timings["connected"])
+      events = {}
+      for event in FuzzingProtocol.TIMING_EVENTS:
+         events[event] = round(1000. * (timings[event] - base), 3) if event in timings else None
+
+      closes = [timings[e] for e in ["closeSent", "closeReceived"] if e in timings]
+      if len(closes) == 2:
+         timings["closeFirst"] = min(closes)
+      if closes:
+         timings["closeLast"] = max(closes)
+
+      phases = {}
+      for phase, start, end in FuzzingProtocol.TIMING_PHASES:
+         if start in timings and end in timings:
+            phases[phase] = round(1000. * (timings[end] - timings[start]), 3)
+         else:
+            phases[phase] = None
+
+      return {"events": events, "phases": phases}
 
 
    def enableWirelog(self, enable):
@@ -198,7 +280,7 @@ class FuzzingProtocol:
          l = len(data)
          self.rxOctetStats[l] = self.rxOctetStats.get(l, 0) + 1
       if self.createWirelog:
-         self.wirelog.append(("RO", (len(data), binLogData(data))))
+         self.wirelog.appendRxOctets(data)
 
 
    def logTxOctets(self, data, sync):
@@ -206,36 +288,27 @@ class FuzzingProtocol:
          l = len(data)
          self.txOctetStats[l] = self.txOctetStats.get(l, 0) + 1
       if self.createWirelog:
-         self.wirelog.append(("TO", (len(data), binLogData(data)), sync))
+         self.wirelog.appendTxOctets(data, sync)
 
 
    def logRxFrame(self, frameHeader, payload):
+      if frameHeader.opcode == 8:
+         self.timeEvent("closeReceived")
+      elif frameHeader.opcode < 8 and "firstFrame" not in self.timings:
+         self.timings["firstFrame"] = monotonic()
       if self.createStats:
          self.rxFrameStats[frameHeader.opcode] = self.rxFrameStats.get(frameHeader.opcode, 0) + 1
       if self.createWirelog:
-         p = ''.join(payload)
-         self.wirelog.append(("RF",
-                              (len(p), asciiLogData(p)),
-                              frameHeader.opcode,
-                              frameHeader.fin,
-                              frameHeader.rsv,
-                              frameHeader.mask is not None,
-                              binascii.b2a_hex(frameHeader.mask) if frameHeader.mask else None))
+         self.wirelog.appendRxFrame(frameHeader, payload)
 
 
    def logTxFrame(self, frameHeader, payload, repeatLength, chopsize, sync):
+      if frameHeader.opcode == 8:
+         self.timeEvent("closeSent")
       if self.createStats:
          self.txFrameStats[frameHeader.opcode] = self.txFrameStats.get(frameHeader.opcode, 0) + 1
       if self.createWirelog:
-         self.wirelog.append(("TF",
-                              (len(payload), asciiLogData(payload)),
-                              frameHeader.opcode,
-                              frameHeader.fin,
-                              frameHeader.rsv,
-                              binascii.b2a_hex(frameHeader.mask) if frameHeader.mask else None,
-                              repeatLength,
-                              chopsize,
-                              sync))
+         self.wirelog.appendTxFrame(frameHeader, payload, repeatLength, chopsize, sync)
 
 
    def executeContinueLater(self, fun, tag):
@@ -280,6 +353,7 @@ class FuzzingProtocol:
    def onOpen(self):
 
       self.connectionWasOpen = True
+      self.timeEvent("open")
 
       if self.runCase:
 
@@ -291,16 +365,23 @@ class FuzzingProtocol:
             return
          else:
             self.caseStart = time.time()
+            caseStarted(self, cc_id)
             self.runCase.onOpen()
 
       elif self.path == "/updateReports":
-         self.factory.createReports()
-         self.sendClose()
-         if self.shutdownOnComplete:
-            print "Report generation complete; shutting down server."
-            reactor.stop()
-         else:
-            print "Report generation complete."
+         def reportsCreated(_):
+            self.sendClose()
+            if self.shutdownOnComplete:
+               print "Report generation complete; shutting down server."
+               reactor.stop()
+            else:
+               print "Report generation complete."
+
+         ## test connections continue to be served while reports are created
+         ##
+         d = self.factory.createReports()
+         d.addErrback(log.err)
+         d.addCallback(reportsCreated)
 
       elif self.path == "/getCaseCount":
          self.sendMessage(json.dumps(len(self.factory.specCases)))
@@ -315,6 +396,9 @@ class FuzzingProtocol:
 
          self.factory.addResultListener(self.caseAgent, self.factory.CaseSet.caseClasstoId(self.Case), sendResults)
 
+      elif self.path == "/watch":
+         self.factory.addWatcher(self)
+
       elif self.path == "/getCaseInfo":
          self.sendMessage(json.dumps({
             'id': self.factory.CaseSet.caseClasstoId(self.Case),
@@ -350,6 +434,9 @@ class FuzzingProtocol:
       if self.runCase:
          self.runCase.onMessage(msg, binary)
 
+      elif self.path == "/watch":
+         pass
+
       else:
 
          if binary:
@@ -415,36 +502,174 @@ class FuzzingFactory:
 
    MAX_CASE_PICKLE_LEN = 1000
 
-   def __init__(self, outdir):
+   ## throughput keys rendered in case detail reports, as (key, header, format)
+   ##
+   THROUGHPUT_KEYS = [("messages", "Messages", "%d"),
+                      ("frames", "Frames", "%d"),
+                      ("octets", "Octets", "%d"),
+                      ("seconds", "Seconds", "%.3f"),
+                      ("messagesPerSec", "Messages/sec", "%.0f"),
+                      ("framesPerSec", "Frames/sec", "%.0f"),
+                      ("octetsPerSec", "Octets/sec", "%.0f"),
+                      ("pauses", "Producer Pauses", "%d"),
+                      ("pausedSeconds", "Producer Paused Seconds", "%.3f")]
+
+   ## timing events and phases rendered in case detail reports, as (key, header)
+   ##
+   TIMING_EVENT_HEADERS = [("connecting", "Connecting"),
+                           ("connected", "TCP Connected"),
+                           ("upgradeRequest", "Upgrade Request"),
+                           ("upgradeResponse", "Upgrade Response"),
+                           ("open", "Open"),
+                           ("firstFrame", "First Frame Received"),
+                           ("closeSent", "Close Sent"),
+                           ("closeReceived", "Close Received"),
+                           ("closed", "TCP Closed")]
+   TIMING_PHASE_HEADERS = [("tcpConnect", "TCP Connect"),
+                           ("openingHandshake", "Opening Handshake"),
+                           ("firstFrame", "First Frame"),
+                           ("closingHandshake", "Closing Handshake"),
+                           ("tcpClose", "TCP Close")]
+
+   ## timing phases averaged per agent in the master report
+   ##
+   MASTER_TIMING_PHASES = ["openingHandshake", "closingHandshake", "tcpClose"]
+
+   ## number of case detail reports rendered per report process task
+   ##
+   REPORT_CHUNK_SIZE = 20
+
+   ## file name of report bundle in output directory
+   ##
+   REPORT_BUNDLE = "report.zip"
+
+   ## file name of result matrix in output directory
+   ##
+   REPORT_MATRIX = "matrix.json"
+
+   ## behaviors coded as small ints in the result matrix (others get
+   ## appended when occurring)
+   ##
+   MATRIX_BEHAVIORS = [Case.OK,
+                       Case.NON_STRICT,
+                       Case.FAILED,
+                       Case.NO_CLOSE,
+                       Case.INFORMATIONAL,
+                       Case.UNIMPLEMENTED,
+                       Case.WRONG_CODE,
+                       Case.UNCLEAN,
+                       Case.FAILED_BY_CLIENT]
+
+   def __init__(self, outdir, reportFormat = "classic"):
       self.repeatAgentRowPerSubcategory = True
       self.outdir = outdir
       self.agents = {}
       self.cases = {}
       self.resultListeners = {}
+      self.reportPool = None
+      self.reportFormat = reportFormat
+
+      ## (agentId, caseId) pairs logged since the last report pass
+      ##
+      self.dirtyCases = set()
+
+      ## with report format "bundle", all case results go into a single file
+      ##
+      if reportFormat == "bundle":
+         if not os.path.exists(self.outdir):
+            os.makedirs(self.outdir)
+         self.bundle = ReportBundle(os.path.join(self.outdir, FuzzingFactory.REPORT_BUNDLE), 'w')
+      elif reportFormat in ["classic", "matrix"]:
+         self.bundle = None
+      else:
+         raise Exception("invalid report format %s" % reportFormat)
+
+   def startReportPool(self, processes = None):
+      """
+      Start the process pool case detail reports are rendered in. This should
+      be done before any connections are made, since the processes forked
+      would otherwise keep the connections' sockets open.
+      """
+      self.reportPool = multiprocessing.Pool(processes)
+      reactor.addSystemEventTrigger('before', 'shutdown', self.stopReportPool)
+
+   def stopReportPool(self):
+      """
+      Close the report process pool, and wait for its processes to exit. This
+      is done when the reactor shuts down.
+
+      :returns: Deferred -- Fires when the processes have exited.
+      """
+      if not self.reportPool:
+         return succeed(None)
+      pool, self.reportPool = self.reportPool, None
+      pool.close()
+      return deferToThread(pool.join)
 
    def logCase(self, caseResults):
       """
       Called from FuzzingProtocol instances when case has been finished to store case results.
+      The case results are written to the case detail report JSON file right away, and only
+      a summary is kept in memory.
+      """
+
+      agent = caseResults["agent"]
+      case = caseResults["id"]
+
+      ## string types in expected/received outcomes are lost in JSON
+      ##
+      caseResults = dict(caseResults)
+      caseResults["outcomeTypes"] = self.outcomeTypes(caseResults)
+
+      ## create output directory when non-existent
+      ##
+      if not os.path.exists(self.outdir):
+         os.makedirs(self.outdir)
+
+      if self.bundle:
+         self.bundle.addCase(self.makeAgentCaseReportFilename(agent, case, ext = 'json'), caseResults)
+         self.indexCase(caseResults)
+      else:
+         self.createAgentCaseReportJSON(caseResults, self.outdir)
+         self.indexCase(caseResults)
+         if self.reportFormat == "classic":
+            self.dirtyCases.add((agent, case))
+
+      if (agent, case) in self.resultListeners:
+         callback = self.resultListeners.pop((agent, case))
+         callback(caseResults)
+
+   def indexCase(self, caseResults):
+      """
+      Store summary of case results for the master report.
       """
 
       agent = caseResults["agent"]
       case = caseResults["id"]
 
+      summary = {}
+      for k in ["behavior", "behaviorClose", "remoteCloseCode", "duration", "reportTime", "reportCompressionRatio"]:
+         summary[k] = caseResults[k]
+      if caseResults["trafficStats"] is not None:
+         summary["trafficStats"] = {"incomingCompressionRatio": caseResults["trafficStats"]["incomingCompressionRatio"],
+                                    "outgoingCompressionRatio": caseResults["trafficStats"]["outgoingCompressionRatio"]}
+      else:
+         summary["trafficStats"] = None
+      summary["throughput"] = caseResults.get("throughput", None)
+      timings = caseResults.get("timings", None)
+      summary["timings"] = timings["phases"] if timings is not None else None
+
       ## index by agent->case
       ##
       if not self.agents.has_key(agent):
          self.agents[agent] = {}
-      self.agents[agent][case] = caseResults
+      self.agents[agent][case] = summary
 
       ## index by case->agent
       ##
       if not self.cases.has_key(case):
          self.cases[case] = {}
-      self.cases[case][agent] = caseResults
-
-      if (agent, case) in self.resultListeners:
-         callback = self.resultListeners.pop((agent, case))
-         callback(caseResults)
+      self.cases[case][agent] = summary
 
    def addResultListener(self, agent, caseId, resultsCallback):
       if agent in self.agents and caseId in self.agents[agent]:
@@ -456,6 +681,15 @@ class FuzzingFactory:
    def createReports(self, produceHtml = True, produceJson = True):
       """
       Create reports from all data stored for test cases which have been executed.
+      Case detail report JSON files have already been written when cases were logged.
+      Case detail report HTML files are rendered for cases logged since the last
+      report pass only, in the report process pool (when started), and the master
+      report is written when those are done. With report format "matrix", no case
+      detail report HTML files are created at all. Unless produceJson is set, the
+      case detail report JSON files are removed once rendered to HTML (they are
+      kept with report format "matrix", since its viewer reads those).
+
+      :returns: Deferred -- Fires when the reports have been created.
       """
 
       ## create output directory when non-existent
@@ -463,22 +697,64 @@ class FuzzingFactory:
       if not os.path.exists(self.outdir):
          os.makedirs(self.outdir)
 
+      ## report bundle: write master index into bundle, and a viewer page
+      ##
+      if self.bundle:
+         self.bundle.setIndex(self.createMasterReport())
+         self.bundle.flush()
+         f = open(os.path.join(self.outdir, "index.html"), 'w')
+         f.write(HTML_BUNDLE_VIEWER % {"css": CSS_COMMON + CSS_MASTER_REPORT + CSS_DETAIL_REPORT, "js": JS_CASE_DETAIL, "bundle": FuzzingFactory.REPORT_BUNDLE})
+         f.close()
+         return succeed(None)
+
+      ## create case detail reports for cases logged so far
+      ##
+      d = succeed(None)
+      if produceHtml and self.reportFormat == "classic":
+         agentCases = sorted(self.dirtyCases)
+         self.dirtyCases = set()
+         tasks = [(self.outdir, agentCases[i:i + FuzzingFactory.REPORT_CHUNK_SIZE]) for i in xrange(0, len(agentCases), FuzzingFactory.REPORT_CHUNK_SIZE)]
+         if self.reportPool:
+            d = deferToThread(self.reportPool.map, createAgentCaseReportsHTML, tasks)
+         else:
+            d = maybeDeferred(map, createAgentCaseReportsHTML, tasks)
+
+         ## cases stay dirty when their reports could not be created
+         ##
+         def reportsFailed(failure):
+            self.dirtyCases.update(agentCases)
+            return failure
+
+         d.addErrback(reportsFailed)
+
+         ## without JSON reports, case detail report JSON files are only kept
+         ## until the case detail report HTML files have been created
+         ##
+         if not produceJson:
+            def removeJson(_):
+               for agentId, caseId in agentCases:
+                  os.remove(os.path.join(self.outdir, self.makeAgentCaseReportFilename(agentId, caseId, ext = 'json')))
+
+            d.addCallback(removeJson)
+
       ## create master report
       ##
+      d.addCallback(lambda _: self.createMasterReports(produceHtml, produceJson))
+      return d
+
+
+   def createMasterReports(self, produceHtml = True, produceJson = True):
+      """
+      Create master reports (HTML, or result matrix and viewer, and JSON).
+      """
       if produceHtml:
-         self.createMasterReportHTML(self.outdir)
+         if self.reportFormat == "matrix":
+            self.createMasterReportMatrix(self.outdir)
+         else:
+            self.createMasterReportHTML(self.outdir)
       if produceJson:
          self.createMasterReportJSON(self.outdir)
 
-      ## create case detail reports
-      ##
-      for agentId in self.agents:
-         for caseId in self.agents[agentId]:
-            if produceHtml:
-               self.createAgentCaseReportHTML(agentId, caseId, self.outdir)
-            if produceJson:
-               self.createAgentCaseReportJSON(agentId, caseId, self.outdir)
-
 
    def cleanForFilename(self, str):
       """
@@ -514,6 +790,20 @@ class FuzzingFactory:
       :type outdir: str
       :returns: str -- Name of created file.
       """
+      res = self.createMasterReport()
+
+      report_filename = "index.json"
+      f = open(os.path.join(outdir, report_filename), 'w')
+      f.write(json.dumps(res, sort_keys = True, indent = 3, separators = (',', ': ')))
+      f.close()
+
+
+   def createMasterReport(self):
+      """
+      Create report master summary.
+
+      :returns: dict -- Summary of results by agent and case.
+      """
       res = {}
       for agentId in self.agents:
          if not res.has_key(agentId):
@@ -529,10 +819,87 @@ class FuzzingFactory:
             c["reportfile"] = report_filename
             res[agentId][caseId] = c
 
-      report_filename = "index.json"
+      return res
+
+
+   def createAgentLatencies(self):
+      """
+      Get mean durations of timing phases (in ms) of the cases run per agent.
+
+      :returns: dict -- Agent -> dict with number of cases, and mean (or None) per phase.
+      """
+      latencies = {}
+      for agentId, cases in self.agents.items():
+         res = {"cases": len(cases)}
+         for phase in FuzzingFactory.MASTER_TIMING_PHASES:
+            values = [c["timings"][phase] for c in cases.values() if c.get("timings") and c["timings"][phase] is not None]
+            res[phase] = sum(values) / len(values) if values else None
+         latencies[agentId] = res
+      return latencies
+
+
+   def createCaseList(self):
+      """
+      Create list of all case IDs, ordered by case ID tuple.
+      """
+      cl = []
+      for c in Cases:
+         t = self.CaseSet.caseClasstoIdTuple(c)
+         cl.append((t, self.CaseSet.caseIdTupletoId(t)))
+      return [c[1] for c in sorted(cl)]
+
+
+   def createMasterReportMatrix(self, outdir):
+      """
+      Create report master result matrix JSON file, and the HTML page to view it.
+      The matrix has a row for each case with a cell for each agent, which is
+      null for missing results, or [behavior, behaviorClose, remoteCloseCode, duration]
+      with behaviors coded as index into the list of behaviors. Mean latencies
+      of timing phases are given per agent.
+
+      :param outdir: Directory where to create files.
+      :type outdir: str
+      :returns: str -- Name of created HTML file.
+      """
+      agentList = sorted(self.agents.keys())
+      caseList = self.createCaseList()
+      behaviors = list(FuzzingFactory.MATRIX_BEHAVIORS)
+      latencies = self.createAgentLatencies()
+
+      def code(behavior):
+         if behavior not in behaviors:
+            behaviors.append(behavior)
+         return behaviors.index(behavior)
+
+      results = []
+      for caseId in caseList:
+         row = []
+         for agentId in agentList:
+            case = self.agents[agentId].get(caseId, None)
+            if case is not None:
+               row.append([code(case["behavior"]), code(case["behaviorClose"]), case["remoteCloseCode"], case["duration"]])
+            else:
+               row.append(None)
+         results.append(row)
+
+      matrix = {"agents": agentList,
+                "files": [self.cleanForFilename(agentId) for agentId in agentList],
+                "categories": CaseCategories,
+                "subcategories": CaseSubCategories,
+                "cases": caseList,
+                "behaviors": behaviors,
+                "results": results,
+                "latencies": [latencies[agentId] for agentId in agentList]}
+
+      f = open(os.path.join(outdir, FuzzingFactory.REPORT_MATRIX), 'w')
+      f.write(json.dumps(matrix, separators = (',', ':')))
+      f.close()
+
+      report_filename = "index.html"
       f = open(os.path.join(outdir, report_filename), 'w')
-      f.write(json.dumps(res, sort_keys = True, indent = 3, separators = (',', ': ')))
+      f.write(HTML_MATRIX_VIEWER % {"css": CSS_COMMON + CSS_MASTER_REPORT + CSS_DETAIL_REPORT, "js": JS_CASE_DETAIL, "matrix": FuzzingFactory.REPORT_MATRIX})
       f.close()
+      return report_filename
 
 
    def createMasterReportHTML(self, outdir):
@@ -605,6 +972,21 @@ class FuzzingFactory:
       """)
       f.write('      </div>\n')
 
+      ## write mean latencies per agent
+      ##
+      latencies = self.createAgentLatencies()
+      if latencies:
+         f.write('      <table id="agent_latencies">\n')
+         f.write('         <tr class="case_category_row"><td class="case_category">Mean Latencies</td><td class="agent">Cases</td>%s</tr>\n' % \
+                 ''.join(['<td class="agent">%s</td>' % h for k, h in FuzzingFactory.TIMING_PHASE_HEADERS if k in FuzzingFactory.MASTER_TIMING_PHASES]))
+         for agentId in sorted(latencies.keys()):
+            f.write('         <tr><td class="case">%s</td><td class="latency">%d</td>' % (agentId, latencies[agentId]["cases"]))
+            for k in FuzzingFactory.MASTER_TIMING_PHASES:
+               mean = latencies[agentId][k]
+               f.write('<td class="latency">%s</td>' % ("%.3f ms" % mean if mean is not None else "-"))
+            f.write('</tr>\n')
+         f.write('      </table>\n')
+
       ## write big agent/case report table
       ##
       f.write('      <table id="agent_case_results">\n')
@@ -615,14 +997,7 @@ class FuzzingFactory:
 
       ## create list ordered list of case Ids
       ##
-      cl = []
-      for c in Cases:
-         t = self.CaseSet.caseClasstoIdTuple(c)
-         cl.append((t, self.CaseSet.caseIdTupletoId(t)))
-      cl = sorted(cl)
-      caseList = []
-      for c in cl:
-         caseList.append(c[1])
+      caseList = self.createCaseList()
 
       lastCaseCategory = None
       lastCaseSubCategory = None
@@ -709,6 +1084,12 @@ class FuzzingFactory:
                   if case["reportTime"]:
                      detail += "%d ms" % case["duration"]
 
+                  if case.get("throughput", None) is not None:
+                     if "messagesPerSec" in case["throughput"]:
+                        detail += "<br/>%d msg/s" % case["throughput"]["messagesPerSec"]
+                     else:
+                        detail += "<br/>%.1f MB/s" % (case["throughput"]["octetsPerSec"] / 1000000.)
+
                   if case["reportCompressionRatio"] and case["trafficStats"] is not None:
                      crIn = case["trafficStats"]["incomingCompressionRatio"]
                      crOut = case["trafficStats"]["outgoingCompressionRatio"]
@@ -755,36 +1136,98 @@ class FuzzingFactory:
       return report_filename
 
 
-   def createAgentCaseReportJSON(self, agentId, caseId, outdir):
+   def createAgentCaseReportJSON(self, case, outdir):
       """
-      Create case detail report JSON file.
+      Create case detail report JSON file. The file is written under a temporary
+      name first and then renamed, so a report file is never seen half-written.
 
-      :param agentId: ID of agent for which to generate report.
-      :type agentId: str
-      :param caseId: ID of case for which to generate report.
-      :type caseId: str
+      :param case: Case results to write.
+      :type case: dict
       :param outdir: Directory where to create file.
       :type outdir: str
       :returns: str -- Name of created file.
       """
 
-      if not self.agents.has_key(agentId):
-         raise Exception("no test data stored for agent %s" % agentId)
+      ## decode binary wire log into log rows
+      ##
+      if isinstance(case["wirelog"], WireLog):
+         case = dict(case)
+         case["wirelog"] = case["wirelog"].decode()
 
-      if not self.agents[agentId].has_key(caseId):
-         raise Exception("no test data stored for case %s with agent %s" % (caseId, agentId))
+      report_filename = self.makeAgentCaseReportFilename(case["agent"], case["id"], ext = 'json')
+      tmp_filename = os.path.join(outdir, report_filename + ".tmp")
+      f = open(tmp_filename, 'w')
+      f.write(json.dumps(case, sort_keys = True, indent = 3, separators = (',', ': ')))
+      f.close()
+      os.rename(tmp_filename, os.path.join(outdir, report_filename))
+      return report_filename
 
-      ## get case to generate report for
-      ##
-      case = self.agents[agentId][caseId]
 
-      ## open report file in create / write-truncate mode
-      ##
+   def loadAgentCaseReportJSON(self, agentId, caseId, outdir):
+      """
+      Read back case results from case detail report JSON file.
+
+      :param agentId: ID of agent for which to load results.
+      :type agentId: str
+      :param caseId: ID of case for which to load results.
+      :type caseId: str
+      :param outdir: Directory where file was created.
+      :type outdir: str
+      :returns: dict -- Case results.
+      """
+
       report_filename = self.makeAgentCaseReportFilename(agentId, caseId, ext = 'json')
-      f = open(os.path.join(outdir, report_filename), 'w')
-      f.write(json.dumps(case, sort_keys = True, indent = 3, separators = (',', ': ')))
+      if not os.path.exists(os.path.join(outdir, report_filename)):
+         raise Exception("no test data stored for case %s with agent %s" % (caseId, agentId))
+
+      f = open(os.path.join(outdir, report_filename))
+      case = json.loads(f.read())
       f.close()
 
+      ## JSON object keys are strings, but octet/frame stats are keyed by integers
+      ##
+      for k in ["rxOctetStats", "rxFrameStats", "txOctetStats", "txFrameStats"]:
+         case[k] = dict([(int(x), y) for x, y in case[k].items()])
+
+      return self.restoreOutcomes(case)
+
+
+   def outcomeTypes(self, case):
+      """
+      Get the types of the elements of expected/received outcomes of case results,
+      as a string per outcome with a character per element: "s" for str, "u" for
+      unicode and "-" for anything else.
+
+      :param case: Case results.
+      :type case: dict
+      :returns: dict -- Types of expected (by behavior) and received outcomes.
+      """
+      def types(e):
+         return ''.join(['s' if type(x) == str else 'u' if type(x) == unicode else '-' for x in e])
+
+      return {"expected": dict([(k, [types(e) for e in v]) for k, v in case["expected"].items()]),
+              "received": [types(e) for e in case["received"]]}
+
+
+   def restoreOutcomes(self, case):
+      """
+      Restore expected/received outcomes of case results read from JSON as they
+      were logged, using the types recorded in "outcomeTypes", since those are
+      rendered as Python literals in the case detail report.
+
+      :param case: Case results, as read from JSON.
+      :type case: dict
+      :returns: dict -- Case results.
+      """
+      types = case.get("outcomeTypes", {"expected": {}, "received": []})
+
+      def restore(events, types):
+         return [tuple([str(x) if types[i:i + 1] and types[i][j:j + 1] == 's' else x for j, x in enumerate(e)]) for i, e in enumerate(events)]
+
+      case["expected"] = dict([(str(k), restore(v, types["expected"].get(k, []))) for k, v in case["expected"].items()])
+      case["received"] = restore(case["received"], types["received"])
+      return case
+
 
    def createAgentCaseReportHTML(self, agentId, caseId, outdir):
       """
@@ -799,20 +1242,14 @@ class FuzzingFactory:
       :returns: str -- Name of created file.
       """
 
-      if not self.agents.has_key(agentId):
-         raise Exception("no test data stored for agent %s" % agentId)
-
-      if not self.agents[agentId].has_key(caseId):
-         raise Exception("no test data stored for case %s with agent %s" % (caseId, agentId))
-
       ## get case to generate report for
       ##
-      case = self.agents[agentId][caseId]
+      case = self.loadAgentCaseReportJSON(agentId, caseId, outdir)
 
       ## open report file in create / write-truncate mode
       ##
       report_filename = self.makeAgentCaseReportFilename(agentId, caseId, ext = 'html')
-      f = open(os.path.join(outdir, report_filename), 'w')
+      f = Utf8Writer(open(os.path.join(outdir, report_filename), 'w'))
 
       ## write HTML
       ##
@@ -897,6 +1334,57 @@ class FuzzingFactory:
       f.write("      <br/><hr/>\n")
 
 
+      ## Timings
+      ##
+      timings = case.get("timings", None)
+      if timings is not None:
+         f.write('      <h2>Timings</h2>\n')
+         for title, headers, values in [("Phases", FuzzingFactory.TIMING_PHASE_HEADERS, timings["phases"]),
+                                        ("Events (since connecting)", FuzzingFactory.TIMING_EVENT_HEADERS, timings["events"])]:
+            f.write('      <h3>%s</h3>\n' % title)
+            f.write('      <table>\n')
+            f.write('         <tr class="stats_header">%s</tr>\n' % ''.join(['<td>%s</td>' % h for k, h in headers]))
+            f.write('         <tr class="stats_row">%s</tr>\n' % ''.join(['<td>%s</td>' % ("%.3f ms" % values[k] if values.get(k) is not None else "-") for k, h in headers]))
+            f.write('      </table>\n')
+         f.write("      <br/><hr/>\n")
+
+
+      ## Throughput
+      ##
+      throughput = case.get("throughput", None)
+      if throughput is not None:
+         f.write('      <h2>Throughput</h2>\n')
+         f.write('      <table>\n')
+         keys = [k for k in FuzzingFactory.THROUGHPUT_KEYS if k[0] in throughput]
+         f.write('         <tr class="stats_header">%s</tr>\n' % ''.join(['<td>%s</td>' % k[1] for k in keys]))
+         f.write('         <tr class="stats_row">%s</tr>\n' % ''.join([('<td>' + k[2] + '</td>') % throughput[k[0]] for k in keys]))
+         f.write('      </table>\n')
+         f.write("      <br/><hr/>\n")
+
+
+      ## Round Trip Times
+      ##
+      rtt = case.get("rtt", None)
+      if rtt is not None and rtt["count"] > 0:
+         f.write('      <h2>Round Trip Times</h2>\n')
+         f.write('      <table>\n')
+         f.write('         <tr class="stats_header"><td>Count</td><td>Min</td><td>p50</td><td>p90</td><td>p99</td><td>p99.9</td><td>Max</td></tr>\n')
+         f.write('         <tr class="stats_row"><td>%d</td>' % rtt["count"])
+         for k in ["min", "p50", "p90", "p99", "p999", "max"]:
+            f.write('<td>%.3f ms</td>' % (rtt[k] / 1000.))
+         f.write('</tr>\n')
+         f.write('      </table>\n')
+         f.write('      <h3>Round Trip Time Histogram</h3>\n')
+         f.write('      <table>\n')
+         f.write('         <tr class="stats_header"><td>From</td><td>Count</td><td>Cumulative</td></tr>\n')
+         total = 0
+         for low, count in rtt["histogram"]:
+            total += count
+            f.write('         <tr class="stats_row"><td>%.3f ms</td><td>%d</td><td>%.1f%%</td></tr>\n' % (low / 1000., count, 100. * total / rtt["count"]))
+         f.write('      </table>\n')
+         f.write("      <br/><hr/>\n")
+
+
       ## Wire Statistics
       ##
       f.write('      <h2>Wire Statistics</h2>\n')
@@ -968,7 +1456,7 @@ class FuzzingFactory:
             else:
                css_class = "wirelog_tx_frame"
 
-         elif t[0] in ["CT", "CTE", "KL", "KLE", "TI", "TIE", "WLM"]:
+         elif t[0] in ["CT", "CTE", "KL", "KLE", "TI", "TIE", "WLM", "ELIDED"]:
             pass
 
          else:
@@ -996,7 +1484,7 @@ class FuzzingFactory:
                else:
                   raise Exception("logic error")
                for ll in lines:
-                  f.write('         <pre class="%s">%s%s</pre>\n' % (css_class, (2+4+len(prefix))*" ", ll.encode('utf8')))
+                  f.write('         <pre class="%s">%s%s</pre>\n' % (css_class, (2+4+len(prefix))*" ", ll))
 
          elif t[0] == "WLM":
             if t[1]:
@@ -1004,6 +1492,10 @@ class FuzzingFactory:
             else:
                f.write('         <pre class="wirelog_delay">%03d WIRELOG DISABLED</pre>\n' % (i))
 
+         elif t[0] == "ELIDED":
+            f.write('         <pre class="wirelog_delay">%03d %d ROWS ELIDED</pre>\n' % (i, t[1]))
+            i += t[1] - 1
+
          elif t[0] == "CT":
             f.write('         <pre class="wirelog_delay">%03d DELAY %f sec for TAG %s</pre>\n' % (i, t[1], t[2]))
 
@@ -1046,18 +1538,49 @@ class FuzzingFactory:
 
 
 
+def createAgentCaseReportsHTML(task):
+   """
+   Create case detail report HTML files for a list of agent/case pairs. This
+   runs in the processes of a report pool.
+
+   :param task: Output directory and list of (agentId, caseId) pairs.
+   :type task: tuple
+   """
+   outdir, agentCases = task
+   factory = FuzzingFactory(outdir)
+   for agentId, caseId in agentCases:
+      factory.createAgentCaseReportHTML(agentId, caseId, outdir)
+
+
+
 class FuzzingServerProtocol(FuzzingProtocol, WebSocketServerProtocol):
 
    def connectionMade(self):
       WebSocketServerProtocol.connectionMade(self)
       FuzzingProtocol.connectionMade(self)
+      self.factory.metrics.connectionMade(self)
 
 
    def connectionLost(self, reason):
+      self.factory.metrics.connectionLost(self)
+      self.factory.runningCases.discard(self)
+      self.factory.removeWatcher(self)
       WebSocketServerProtocol.connectionLost(self, reason)
       FuzzingProtocol.connectionLost(self, reason)
 
 
+   def processHandshake(self):
+      ## upgrade request (started to arrive), before it is parsed
+      self.timeEvent("upgradeRequest")
+      WebSocketServerProtocol.processHandshake(self)
+
+
+   def succeedHandshake(self, res):
+      ## upgrade response is sent (and onOpen fired) right away
+      self.timeEvent("upgradeResponse")
+      WebSocketServerProtocol.succeedHandshake(self, res)
+
+
    def onConnect(self, connectionRequest):
       if self.debug:
          log.msg("connection received from %s speaking WebSocket protocol %d - upgrade request for host '%s', path '%s', params %s, origin '%s', protocols %s, headers %s" % (connectionRequest.peer, connectionRequest.version, connectionRequest.host, connectionRequest.path, str(connectionRequest.params), connectionRequest.origin, str(connectionRequest.protocols), str(connectionRequest.headers)))
@@ -1114,6 +1637,8 @@ class FuzzingServerProtocol(FuzzingProtocol, WebSocketServerProtocol):
          if not self.caseAgent:
             raise Exception("need agent to run case")
          self.caseStarted = utcnow()
+         self.factory.runningCases.add(self)
+         self.factory.casesStarted.inc(1, self.factory.CaseSet.caseClasstoId(self.Case).split('.')[0])
          print "Running test case ID %s for agent %s from peer %s" % (self.factory.CaseSet.caseClasstoId(self.Case), self.caseAgent, connectionRequest.peer)
 
       elif connectionRequest.path == "/updateReports":
@@ -1134,6 +1659,9 @@ class FuzzingServerProtocol(FuzzingProtocol, WebSocketServerProtocol):
       elif connectionRequest.path == "/getCaseCount":
          pass
 
+      elif connectionRequest.path == "/watch":
+         print "Watching progress, requested by peer %s" % connectionRequest.peer
+
       else:
          print "Entering direct command mode for peer %s" % connectionRequest.peer
 
@@ -1147,10 +1675,15 @@ class FuzzingServerFactory(FuzzingFactory, WebSocketServerFactory):
 
    protocol = FuzzingServerProtocol
 
+   ## upper bounds of buckets of metrics histograms (in seconds)
+   ##
+   CASE_DURATION_BUCKETS = [0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300]
+   REPORT_DURATION_BUCKETS = [0.1, 1, 5, 10, 30, 60, 300, 600]
+
    def __init__(self, spec, debug = False):
 
       WebSocketServerFactory.__init__(self, debug = debug, debugCodePaths = debug)
-      FuzzingFactory.__init__(self, spec.get("outdir", "./reports/clients/"))
+      FuzzingFactory.__init__(self, spec.get("outdir", "./reports/clients/"), spec.get("report-format", "classic"))
 
       # needed for wire log / stats
       self.logOctets = True
@@ -1177,6 +1710,104 @@ class FuzzingServerFactory(FuzzingFactory, WebSocketServerFactory):
       print "Ok, will run %d test cases for any clients connecting" % len(self.specCases)
       print "Cases = %s" % str(self.specCases)
 
+      ## protocols currently running a test case, and protocols watching
+      ## progress (connected to /watch)
+      ##
+      self.runningCases = set()
+      self.watchers = set()
+
+      ## aggregate counters are pushed to watchers periodically, the counters
+      ## per agent are kept up to date as cases are logged
+      ##
+      self.watchInterval = self.spec.get("watch-interval", 1)
+      self.watchAgents = {}
+      self.watchCounters = LoopingCall(self.sendWatchCounters)
+
+      ## metrics served at /metrics on the web port
+      ##
+      self.metrics = WebSocketMetrics()
+      self.casesStarted = self.metrics.add(CounterMetric("wstest_cases_started_total", "Test cases started, by case category.", ["category"]))
+      self.casesCompleted = self.metrics.add(CounterMetric("wstest_cases_completed_total", "Test cases completed, by case category and behavior.", ["category", "behavior"]))
+      self.caseDuration = self.metrics.add(HistogramMetric("wstest_case_duration_seconds", "Test case durations, by case category.", FuzzingServerFactory.CASE_DURATION_BUCKETS, ["category"]))
+      self.reportDuration = self.metrics.add(HistogramMetric("wstest_report_generation_seconds", "Report generation times.", FuzzingServerFactory.REPORT_DURATION_BUCKETS))
+
+      self.startReportPool(self.spec.get("report-processes", None))
+
+   def logCase(self, caseResults):
+      self.countCase(caseResults)
+      FuzzingFactory.logCase(self, caseResults)
+      category = caseResults["id"].split('.')[0]
+      self.casesCompleted.inc(1, category, caseResults["behavior"])
+      self.caseDuration.observe(caseResults["duration"] / 1000., category)
+      if self.watchers:
+         self.sendWatchEvent({"type": "case",
+                              "agent": caseResults["agent"],
+                              "id": caseResults["id"],
+                              "behavior": caseResults["behavior"],
+                              "behaviorClose": caseResults["behaviorClose"],
+                              "duration": caseResults["duration"],
+                              "remoteCloseCode": caseResults["remoteCloseCode"]})
+
+   def createReports(self, produceHtml = True, produceJson = True):
+      started = monotonic()
+      d = FuzzingFactory.createReports(self, produceHtml, produceJson)
+      def reportsCreated(res):
+         self.reportDuration.observe(monotonic() - started)
+         return res
+      d.addCallback(reportsCreated)
+      return d
+
+   def addWatcher(self, proto):
+      """
+      Start pushing progress events to protocol (connected to /watch).
+      """
+      self.watchers.add(proto)
+      proto.sendMessage(json.dumps(self.getWatchCounters(), separators = (',', ':')))
+      if self.watchInterval and not self.watchCounters.running:
+         self.watchCounters.start(self.watchInterval, now = False)
+
+   def removeWatcher(self, proto):
+      self.watchers.discard(proto)
+      if not self.watchers and self.watchCounters.running:
+         self.watchCounters.stop()
+
+   def countCase(self, caseResults):
+      """
+      Update the counters of cases done per agent and behavior for a case
+      about to be logged. A case run again replaces its earlier result.
+      """
+      agent = caseResults["agent"]
+      counters = self.watchAgents.setdefault(agent, {"done": 0, "behaviors": {}})
+      behaviors = counters["behaviors"]
+
+      previous = self.agents.get(agent, {}).get(caseResults["id"], None)
+      if previous is None:
+         counters["done"] += 1
+      else:
+         behaviors[previous["behavior"]] -= 1
+         if behaviors[previous["behavior"]] == 0:
+            del behaviors[previous["behavior"]]
+
+      behaviors[caseResults["behavior"]] = behaviors.get(caseResults["behavior"], 0) + 1
+
+   def getWatchCounters(self):
+      """
+      Get aggregate counters: test cases per agent, cases running, and cases
+      done per agent and behavior.
+      """
+      return {"type": "counters",
+              "cases": len(self.specCases),
+              "running": len(self.runningCases),
+              "agents": self.watchAgents}
+
+   def sendWatchCounters(self):
+      self.sendWatchEvent(self.getWatchCounters())
+
+   def sendWatchEvent(self, event):
+      msg = json.dumps(event, separators = (',', ':'))
+      for proto in list(self.watchers):
+         proto.sendMessage(msg)
+
 
 
 class FuzzingClientProtocol(FuzzingProtocol, WebSocketClientProtocol):
@@ -1187,7 +1818,13 @@ class FuzzingClientProtocol(FuzzingProtocol, WebSocketClientProtocol):
       self.caseStarted = utcnow()
 
 
+   def startHandshake(self):
+      self.timeEvent("upgradeRequest")
+      WebSocketClientProtocol.startHandshake(self)
+
+
    def onConnect(self, response):
+      self.timeEvent("upgradeResponse")
       if not self.caseAgent:
          self.caseAgent = response.headers.get('server', 'UnknownServer')
       print "Running test case ID %s for agent %s from peer %s" % (self.factory.CaseSet.caseClasstoId(self.Case), self.caseAgent, self.peer)
@@ -1199,84 +1836,88 @@ class FuzzingClientProtocol(FuzzingProtocol, WebSocketClientProtocol):
 
 
 
-class FuzzingClientFactory(FuzzingFactory, WebSocketClientFactory):
+class FuzzingClientFactory(WebSocketClientFactory):
+   """
+   Fuzzing client protocol factory running the test cases against one server
+   of a fuzzing client spec. Case results are logged to the FuzzingClient
+   the factory belongs to.
+   """
 
    protocol = FuzzingClientProtocol
 
-   def __init__(self, spec, debug = False):
+   def __init__(self, client, server, debug = False):
 
       WebSocketClientFactory.__init__(self, debug = debug, debugCodePaths = debug)
-      FuzzingFactory.__init__(self, spec.get("outdir", "./reports/servers/"))
 
       # needed for wire log / stats
       self.logOctets = True
       self.logFrames = True
 
-      self.spec = spec
+      self.client = client
+      self.server = server
 
-      self.CaseSet = CaseSet(CaseSetname, CaseBasename, Cases, CaseCategories, CaseSubCategories)
+      self.spec = client.spec
+      self.CaseSet = client.CaseSet
+      self.specCases = client.specCases
+      self.specExcludeAgentCases = client.specExcludeAgentCases
 
-      self.specCases = self.CaseSet.parseSpecCases(self.spec)
-      self.specExcludeAgentCases = self.CaseSet.parseExcludeAgentCases(self.spec)
-      print "Autobahn Fuzzing WebSocket Client (Autobahn Testsuite Version %s / Autobahn Version %s)" % (autobahntestsuite.version, autobahn.version)
-      print "Ok, will run %d test cases against %d servers" % (len(self.specCases), len(spec["servers"]))
-      print "Cases = %s" % str(self.specCases)
-      print "Servers = %s" % str([x["url"] for x in spec["servers"]])
+      ## agent (=server) string for reports
+      ##
+      self.agent = server.get("agent")
+
+      ## Hostname to send in TLS handshake for SNI support
+      ##
+      hostname = server.get("hostname")
+      if hostname:
+         self.contextFactory = ssl.optionsForClientTLS(hostname)
+      else:
+         self.contextFactory = ssl.ClientContextFactory()
 
-      self.currServer = -1
-      if self.nextServer():
-         if self.nextCase():
-            connectWS(self, contextFactory=self.contextFactory)
+      ## WebSocket session parameters
+      ##
+      self.setSessionParameters(url = server["url"],
+                                origin = server.get("origin", None),
+                                protocols = server.get("protocols", []),
+                                useragent = "AutobahnTestSuite/%s-%s" % (autobahntestsuite.version, autobahn.version))
 
+      ## WebSocket protocol options
+      ##
+      self.setProtocolOptions(failByDrop = False) # spec conformance
+      self.setProtocolOptions(**self.spec.get("options", {})) # set spec global options
+      self.setProtocolOptions(**server.get("options", {})) # set server specific options
 
-   def buildProtocol(self, addr):
+      ## connector -> (case index, time connecting) of connections started, but
+      ## not yet connected, and the number of cases currently running against
+      ## this server
+      ##
+      self.currSpecCase = -1
+      self.pendingCases = {}
+      self.runningCases = 0
+      self.done = False
+
+      ## exclusive cases run alone on all servers of the client, or on this
+      ## server only
+      ##
+      if client.exclusiveScope == "client":
+         self.gate = client.gate
+      else:
+         self.gate = ExclusiveGate()
+
+
+   def buildCaseProtocol(self, connector):
       proto = FuzzingClientProtocol()
       proto.factory = self
 
       proto.caseAgent = self.agent
-      proto.case = self.currentCaseIndex
-      proto.Case = Cases[self.currentCaseIndex - 1]
+      proto.case, proto.connectingAt = self.pendingCases.pop(connector)
+      proto.Case = Cases[proto.case - 1]
       proto.runCase = proto.Case(proto)
 
       return proto
 
 
-   def nextServer(self):
-      self.currSpecCase = -1
-      self.currServer += 1
-      if self.currServer < len(self.spec["servers"]):
-         ## run tests for next server
-         ##
-         server = self.spec["servers"][self.currServer]
-
-         ## agent (=server) string for reports
-         ##
-         self.agent = server.get("agent")
-
-         ## Hostname to send in TLS handshake for SNI support
-         ##
-         hostname = server.get("hostname")
-         if hostname:
-            self.contextFactory = ssl.optionsForClientTLS(hostname)
-         else:
-            self.contextFactory = ssl.ClientContextFactory()
-
-         ## WebSocket session parameters
-         ##
-         self.setSessionParameters(url = server["url"],
-                                   origin = server.get("origin", None),
-                                   protocols = server.get("protocols", []),
-                                   useragent = "AutobahnTestSuite/%s-%s" % (autobahntestsuite.version, autobahn.version))
-
-         ## WebSocket protocol options
-         ##
-         self.resetProtocolOptions() # reset to defaults
-         self.setProtocolOptions(failByDrop = False) # spec conformance
-         self.setProtocolOptions(**self.spec.get("options", {})) # set spec global options
-         self.setProtocolOptions(**server.get("options", {})) # set server specific options
-         return True
-      else:
-         return False
+   def logCase(self, caseResults):
+      self.client.logCase(caseResults)
 
 
    def nextCase(self):
@@ -1289,32 +1930,378 @@ class FuzzingClientFactory(FuzzingFactory, WebSocketClientFactory):
          return False
 
 
-   def clientConnectionLost(self, connector, reason):
-      if self.nextCase():
-         connector.connect()
+   def runCases(self):
+      """
+      Start connections for the next test cases until the configured concurrency
+      is reached. Exclusive cases are only started when no other case is running
+      (against any server sharing the gate), and nothing else is started while
+      they run, or wait to run.
+      """
+      client = self.client
+      gate = self.gate
+      while self.runningCases < client.concurrency and not gate.exclusive:
+         if self.currSpecCase + 1 >= len(self.specCases):
+            break
+         exclusive = self.specCases[self.currSpecCase + 1] in client.specExclusiveCases
+         if exclusive and gate.running > 0:
+            gate.waiting.add(self)
+            break
+         if not exclusive and gate.waiting:
+            break
+         gate.waiting.discard(self)
+         self.nextCase()
+         self.runningCases += 1
+         gate.running += 1
+         gate.exclusive = exclusive
+         self.connectCase((self.currentCaseIndex, monotonic()))
+
+      if self.runningCases == 0 and self.currSpecCase + 1 >= len(self.specCases):
+         self.done = True
+
+
+   def connectCase(self, case):
+      """
+      Start the connection for a test case (as (case index, time connecting)).
+      """
+      factory = FuzzingClientCaseFactory(self, case)
+      if self.proxy is not None:
+         reactor.connectTCP(self.proxy['host'], self.proxy['port'], factory)
+      elif self.isSecure:
+         reactor.connectSSL(self.host, self.port, factory, self.contextFactory)
       else:
-         if self.nextServer():
-            if self.nextCase():
-               connectWS(self)
-         else:
-            self.createReports()
-            reactor.stop()
+         reactor.connectTCP(self.host, self.port, factory)
+
+
+   def caseFinished(self):
+      self.runningCases -= 1
+      self.gate.running -= 1
+      if self.gate.running == 0:
+         self.gate.exclusive = False
+      self.client.runCases()
+
+
+   def clientConnectionLost(self, connector, reason):
+      self.caseFinished()
 
 
    def clientConnectionFailed(self, connector, reason):
-      print "Connection to %s failed (%s)" % (self.spec["servers"][self.currServer]["url"], reason.getErrorMessage())
-      if self.nextServer():
-         if self.nextCase():
-            connectWS(self)
+      print "Connection to %s failed (%s)" % (self.server["url"], reason.getErrorMessage())
+
+      ## the connection never got a protocol: drop its case, and go on with
+      ## the next cases
+      ##
+      case, _ = self.pendingCases.pop(connector)
+      print "Dropping test case ID %s for agent %s" % (self.CaseSet.caseClasstoId(Cases[case - 1]), self.agent or self.server["url"])
+      self.caseFinished()
+
+
+
+class ExclusiveGate:
+   """
+   Cases running on the servers sharing the gate, whether the one running is
+   exclusive, and the FuzzingClientFactory instances waiting to run one.
+   """
+
+   def __init__(self):
+      self.running = 0
+      self.exclusive = False
+      self.waiting = set()
+
+
+
+class FuzzingClientCaseFactory(protocol.ClientFactory):
+   """
+   Factory for the connection of one test case. The case is pending on the
+   FuzzingClientFactory of the server by connector until the connection is
+   made (or fails), and the protocol is built by that factory.
+   """
+
+   noisy = False
+
+   def __init__(self, factory, case):
+      self.factory = factory
+      self.case = case
+
+
+   def startedConnecting(self, connector):
+      self.connector = connector
+      self.factory.pendingCases[connector] = self.case
+
+
+   def buildProtocol(self, addr):
+      return self.factory.buildCaseProtocol(self.connector)
+
+
+   def clientConnectionFailed(self, connector, reason):
+      self.factory.clientConnectionFailed(connector, reason)
+
+
+   def clientConnectionLost(self, connector, reason):
+      self.factory.clientConnectionLost(connector, reason)
+
+
+
+class FuzzingClient(FuzzingFactory):
+   """
+   Fuzzing client running the test cases against all servers of a spec in
+   parallel, using one FuzzingClientFactory per server. A single report for all
+   servers is created when every server is done.
+   """
+
+   ## cases which are timing sensitive, and hence never run concurrently with
+   ## other cases (can be overridden via "exclusive-cases" in the spec)
+   ##
+   EXCLUSIVE_CASES = ["9.*", "14.*", "15.*"]
+
+   def __init__(self, spec, debug = False):
+
+      FuzzingFactory.__init__(self, spec.get("outdir", "./reports/servers/"), spec.get("report-format", "classic"))
+
+      self.spec = spec
+
+      self.CaseSet = CaseSet(CaseSetname, CaseBasename, Cases, CaseCategories, CaseSubCategories)
+
+      self.specCases = self.CaseSet.parseSpecCases(self.spec)
+      self.specExcludeAgentCases = self.CaseSet.parseExcludeAgentCases(self.spec)
+      self.specExclusiveCases = set(self.CaseSet.resolveCasePatternList(self.spec.get("exclusive-cases", FuzzingClient.EXCLUSIVE_CASES)))
+
+      ## exclusive cases run alone on all servers ("client"), or only on the
+      ## server they run against ("server")
+      ##
+      self.exclusiveScope = self.spec.get("exclusive-scope", "client")
+      if self.exclusiveScope not in ["client", "server"]:
+         raise Exception("invalid exclusive-scope %s" % self.exclusiveScope)
+      self.gate = ExclusiveGate()
+
+      ## number of test cases run concurrently against a server
+      ##
+      self.concurrency = int(self.spec.get("concurrency", 1))
+      if self.concurrency < 1:
+         raise Exception("invalid concurrency %s" % self.spec["concurrency"])
+
+      print "Autobahn Fuzzing WebSocket Client (Autobahn Testsuite Version %s / Autobahn Version %s)" % (autobahntestsuite.version, autobahn.version)
+      print "Ok, will run %d test cases against %d servers (concurrency %d)" % (len(self.specCases), len(spec["servers"]), self.concurrency)
+      print "Cases = %s" % str(self.specCases)
+      print "Servers = %s" % str([x["url"] for x in spec["servers"]])
+
+      self.startReportPool(self.spec.get("report-processes", None))
+
+      self.factories = [FuzzingClientFactory(self, server, debug) for server in spec["servers"]]
+      self.runCases()
+
+
+   def runCases(self):
+      """
+      Start the next test cases against all servers, and create the reports
+      when done with all servers.
+      """
+      for factory in self.factories:
+         if not factory.done:
+            factory.runCases()
+
+      if len(self.factories) > 0 and all([factory.done for factory in self.factories]):
+         d = self.createReports()
+         d.addErrback(log.err)
+         ## when no case is to be run at all, we get here before the reactor runs
+         ##
+         d.addCallback(lambda _: reactor.callWhenRunning(reactor.stop))
+
+
+def caseCost(Case):
+   """
+   Rough estimate of the relative cost of running a test case, from the amount
+   of data a case class declares it sends: COUNT messages of LEN octets (as
+   9.7.x/9.8.x, 12.x and 13.x), or a single message of DATALEN octets (as
+   9.1.x to 9.6.x). Cases cost in proportion to the number of octets sent, all
+   other cases have unit cost.
+   """
+   if hasattr(Case, "COUNT"):
+      count, length = Case.COUNT, getattr(Case, "LEN", 0)
+   elif hasattr(Case, "DATALEN"):
+      count, length = 1, Case.DATALEN
+   else:
+      count, length = 0, 0
+   return 1 + count * (1 + length / 1024.)
+
+
+
+class FuzzingClientWorkers(FuzzingFactory):
+   """
+   Fuzzing client spreading the test cases of a spec over multiple worker
+   processes, each running a FuzzingClient on its share of the cases. The case
+   reports created by the workers are merged into one master report.
+   """
+
+   def __init__(self, spec, workers, debug = False):
+
+      FuzzingFactory.__init__(self, spec.get("outdir", "./reports/servers/"), spec.get("report-format", "classic"))
+
+      self.spec = spec
+      self.workers = workers
+      self.debug = debug
+
+      self.CaseSet = CaseSet(CaseSetname, CaseBasename, Cases, CaseCategories, CaseSubCategories)
+      self.specCases = self.CaseSet.parseSpecCases(self.spec)
+
+
+   def caseCosts(self):
+      """
+      Expected cost of each case to run. When a previous report in the output
+      directory has durations for all cases, use those, else estimate.
+      """
+      try:
+         index = json.loads(open(os.path.join(self.outdir, "index.json")).read())
+      except:
+         index = {}
+
+      durations = {}
+      for agentId in index:
+         for caseId in index[agentId]:
+            durations[caseId] = max(durations.get(caseId, 0), index[agentId][caseId]["duration"])
+
+      if all([caseId in durations for caseId in self.specCases]):
+         return dict([(caseId, 1 + durations[caseId]) for caseId in self.specCases])
       else:
-         self.createReports()
-         reactor.stop()
+         return dict([(caseId, caseCost(self.CaseSet.CasesById[caseId])) for caseId in self.specCases])
+
+
+   def run(self):
+      shards = self.CaseSet.shardCases(self.specCases, self.caseCosts(), self.workers)
+
+      print "Autobahn Fuzzing WebSocket Client (Autobahn Testsuite Version %s / Autobahn Version %s)" % (autobahntestsuite.version, autobahn.version)
+      print "Ok, will run %d test cases against %d servers in %d worker processes" % (len(self.specCases), len(self.spec["servers"]), len(shards))
+
+      self.workdirs = []
+      dl = []
+      for i in xrange(len(shards)):
+
+         ## each worker gets a spec for its cases, and its own output directory
+         ##
+         workdir = os.path.join(self.outdir, "worker%d" % (i + 1))
+         if not os.path.exists(workdir):
+            os.makedirs(workdir)
+         self.workdirs.append(workdir)
+
+         spec = dict(self.spec)
+         spec["outdir"] = workdir
+         spec["cases"] = shards[i]
+         spec["exclude-cases"] = []
+
+         spec_filename = os.path.join(workdir, "fuzzingclient.json")
+         f = open(spec_filename, 'w')
+         f.write(json.dumps(spec, indent = 3))
+         f.close()
+
+         args = [sys.executable, "-m", "autobahntestsuite.wstest", "-m", "fuzzingclient", "-s", spec_filename]
+         if self.debug:
+            args.append("-d")
+         args.extend(profilerArgs(".worker%d" % (i + 1)))
+
+         worker = WorkerProcess(i + 1)
+         reactor.spawnProcess(worker, sys.executable, args, env = os.environ)
+         dl.append(worker.d)
+
+      d = DeferredList(dl)
+      d.addCallback(self.merge)
+      return d
+
+
+   def merge(self, results):
+      """
+      Collect the case reports of all workers in the output directory and
+      create the master report.
+      """
+      for (success, exitCode), workdir in zip(results, self.workdirs):
+         if exitCode != 0:
+            print "Worker with output directory %s exited with code %s" % (workdir, exitCode)
+
+         ## case records from a worker's report bundle go into our bundle
+         ##
+         if self.bundle:
+            try:
+               bundle = ReportBundle(os.path.join(workdir, FuzzingFactory.REPORT_BUNDLE))
+               index = bundle.getIndex()
+            except:
+               print "No results from worker with output directory %s" % workdir
+               continue
+
+            for agentId in index:
+               for caseId in index[agentId]:
+                  self.logCase(self.restoreOutcomes(bundle.getCase(index[agentId][caseId]["reportfile"])))
+
+            bundle.close()
+            shutil.rmtree(workdir)
+            continue
+
+         try:
+            index = json.loads(open(os.path.join(workdir, "index.json")).read())
+         except:
+            print "No results from worker with output directory %s" % workdir
+            continue
+
+         for agentId in index:
+            for caseId in index[agentId]:
+               ## a worker which crashed might not have written all reports
+               ##
+               report_filename = self.makeAgentCaseReportFilename(agentId, caseId, ext = 'json')
+               if not os.path.exists(os.path.join(workdir, report_filename)):
+                  print "No results for case %s with agent %s from worker with output directory %s" % (caseId, agentId, workdir)
+                  continue
+
+               for ext in ['json', 'html'] if self.reportFormat == "classic" else ['json']:
+                  report_filename = self.makeAgentCaseReportFilename(agentId, caseId, ext = ext)
+                  source = os.path.join(workdir, report_filename)
+                  target = os.path.join(self.outdir, report_filename)
+                  if os.path.exists(target):
+                     os.remove(target)
+                  if os.path.exists(source):
+                     os.rename(source, target)
+                  elif ext == 'html':
+                     self.dirtyCases.add((agentId, caseId))
+               self.indexCase(json.loads(open(os.path.join(self.outdir, index[agentId][caseId]["reportfile"])).read()))
+
+         shutil.rmtree(workdir)
+
+      ## case detail report HTML files missing from a worker are created here
+      ##
+      if self.bundle or self.dirtyCases:
+         return self.createReports()
+
+      self.createMasterReports()
+
+
+
+def exportBundle(filename, outdir):
+   """
+   Export a report bundle to the classic report directory layout.
+
+   :param filename: Report bundle file name.
+   :type filename: str
+   :param outdir: Directory where to create the reports.
+   :type outdir: str
+   """
+   bundle = ReportBundle(filename)
+   index = bundle.getIndex()
+
+   factory = FuzzingFactory(outdir)
+   factory.CaseSet = CaseSet(CaseSetname, CaseBasename, Cases, CaseCategories, CaseSubCategories)
+   for agentId in index:
+      for caseId in index[agentId]:
+         factory.logCase(factory.restoreOutcomes(bundle.getCase(index[agentId][caseId]["reportfile"])))
+   bundle.close()
+
+   factory.createReports()
+   print "Exported %d case reports from %s to %s" % (sum([len(index[x]) for x in index]), filename, outdir)
+
+
 
+def startClient(spec, debug = False, workers = 1):
+   if workers > 1:
+      return FuzzingClientWorkers(spec, workers, debug).run()
 
-def startClient(spec, debug = False):
-   factory = FuzzingClientFactory(spec, debug)
+   client = FuzzingClient(spec, debug)
    # no connectWS done here, since this is done within
-   # FuzzingClientFactory automatically to orchestrate tests
+   # FuzzingClient automatically to orchestrate tests
    return True
 
 
@@ -1341,6 +2328,7 @@ def startServer(spec, webport, sslKey = None, sslCert = None, debug = False):
                                                     "web/fuzzingserver"))
       curdir = File('.')
       webdir.putChild('cwd', curdir)
+      webdir.putChild('metrics', MetricsResource(factory.metrics))
       web = Site(webdir)
       if factory.isSecure:
          reactor.listenSSL(webport, web, sslContext)
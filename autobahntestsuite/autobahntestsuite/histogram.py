@@ -0,0 +1,144 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ("Histogram",)
+
+
+class Histogram:
+   """
+   Histogram of non-negative integer values (e.g. round trip times in
+   microseconds) with fixed buckets (HDR-style): values below SUB_BUCKETS
+   get a bucket each, and each power of 2 range above is split into
+   SUB_BUCKETS / 2 buckets. So values are recorded with a relative error of
+   at most 2 / SUB_BUCKETS, in a number of buckets logarithmic in the
+   largest value. Minimum and maximum are kept exactly.
+   """
+
+   SUB_BUCKETS_BITS = 7
+   SUB_BUCKETS = 1 << SUB_BUCKETS_BITS
+
+   ## percentiles reported in summary, as (key, percentile)
+   ##
+   PERCENTILES = [("p50", 50.), ("p90", 90.), ("p99", 99.), ("p999", 99.9)]
+
+   def __init__(self, unit = "us"):
+      """
+      :param unit: Unit of recorded values.
+      :type unit: str
+      """
+      self.unit = unit
+      self.counts = []
+      self.count = 0
+      self.min = None
+      self.max = None
+
+
+   def bucket(self, value):
+      """
+      Get index of bucket for value.
+      """
+      if value < Histogram.SUB_BUCKETS:
+         return value
+      shift = value.bit_length() - Histogram.SUB_BUCKETS_BITS
+      return Histogram.SUB_BUCKETS + (shift - 1) * (Histogram.SUB_BUCKETS // 2) + (value >> shift) - Histogram.SUB_BUCKETS // 2
+
+
+   def bucketRange(self, index):
+      """
+      Get (lowest, highest) value of bucket.
+      """
+      if index < Histogram.SUB_BUCKETS:
+         return index, index
+      shift = (index - Histogram.SUB_BUCKETS) // (Histogram.SUB_BUCKETS // 2) + 1
+      low = ((index - Histogram.SUB_BUCKETS) % (Histogram.SUB_BUCKETS // 2) + Histogram.SUB_BUCKETS // 2) << shift
+      return low, low + (1 << shift) - 1
+
+
+   def record(self, value):
+      """
+      Record value.
+
+      :param value: Value to record (negative values are recorded as 0).
+      :type value: int
+      """
+      value = max(0, int(value))
+      index = self.bucket(value)
+      if index >= len(self.counts):
+         self.counts.extend([0] * (index + 1 - len(self.counts)))
+      self.counts[index] += 1
+      self.count += 1
+      if self.min is None or value < self.min:
+         self.min = value
+      if self.max is None or value > self.max:
+         self.max = value
+
+
+   def merge(self, data):
+      """
+      Merge values of a histogram summary (as returned by __json__) into this
+      histogram, e.g. to aggregate histograms of multiple processes.
+
+      :param data: Histogram summary.
+      :type data: dict
+      """
+      for low, count in data["histogram"]:
+         index = self.bucket(low)
+         if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+         self.counts[index] += count
+         self.count += count
+      if data["count"]:
+         if self.min is None or data["min"] < self.min:
+            self.min = data["min"]
+         if self.max is None or data["max"] > self.max:
+            self.max = data["max"]
+
+
+   def percentile(self, percentile):
+      """
+      Get value at percentile: the highest value of the bucket holding it (but
+      not more than the maximum value recorded).
+
+      :param percentile: Percentile (0-100).
+      :type percentile: float
+      :returns: int -- Value, or None when no values were recorded.
+      """
+      if self.count == 0:
+         return None
+      rank = max(1, int(round(percentile / 100. * self.count)))
+      total = 0
+      for index, count in enumerate(self.counts):
+         total += count
+         if total >= rank:
+            return min(self.bucketRange(index)[1], self.max)
+      return self.max
+
+
+   def __json__(self):
+      """
+      Get summary (count, min, percentiles, max) and the non-empty buckets
+      (as [lowest value, count]).
+      """
+      res = {"unit": self.unit,
+             "count": self.count,
+             "min": self.min,
+             "max": self.max,
+             "histogram": [[self.bucketRange(i)[0], c] for i, c in enumerate(self.counts) if c > 0]}
+      for key, percentile in Histogram.PERCENTILES:
+         res[key] = self.percentile(percentile)
+      return res
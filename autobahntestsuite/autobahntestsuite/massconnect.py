@@ -19,43 +19,147 @@
 __all__ = ['startClient']
 
 
-import time, sys
+import os, sys, json, csv, random, shutil, tempfile
 
 from twisted.internet import defer, reactor
-from twisted.internet.defer import Deferred, returnValue, inlineCallbacks
+from twisted.internet.task import LoopingCall
+from twisted.internet.defer import Deferred, DeferredList, returnValue, inlineCallbacks
 
 from autobahn.twisted.websocket import connectWS, \
                                        WebSocketClientFactory, \
                                        WebSocketClientProtocol
 
+from histogram import Histogram
+from util import monotonic, WorkerProcess
+from profiler import profilerArgs
+
+
+def residentMemory():
+   """
+   Get resident memory of this process in bytes (None when unknown).
+   """
+   try:
+      pages = int(open("/proc/self/statm").read().split()[1])
+      return pages * os.sysconf("SC_PAGE_SIZE")
+   except:
+      return None
+
 
 class MassConnectProtocol(WebSocketClientProtocol):
 
-   didHandshake = False
+   def connectionMade(self):
+      self.tcpConnectedAt = monotonic()
+      self.didHandshake = False
+      self.probesPending = None
+      self.factory.connected[self.transport.connector] = self
+      WebSocketClientProtocol.connectionMade(self)
 
    def onOpen(self):
       ## WebSocket opening handshake complete => log
-      self.factory.test.onConnected()
-      self.factory.test.protos.append(self)
       self.didHandshake = True
+      self.factory.test.onConnected(self)
+
+   def onPong(self, payload):
+      self.factory.test.onProbeReply(self, payload)
+
+   def onMessage(self, payload, isBinary):
+      self.factory.test.onProbeReply(self, payload)
 
 
 class MassConnectFactory(WebSocketClientFactory):
+   """
+   Factory shared by all connections to a server. Connection attempts are
+   tracked per connector, which is reused when a connection is retried.
+   """
 
    protocol = MassConnectProtocol
 
+   def __init__(self, test, uri, retrydelay):
+      WebSocketClientFactory.__init__(self, uri)
+      self.test = test
+      self.retrydelay = retrydelay
+
+      ## connector -> (time connection attempt started, retries), of
+      ## connections not open yet
+      ##
+      self.attempts = {}
+
+      ## connector -> protocol, of connections made
+      ##
+      self.connected = {}
+
+   def connect(self, bindAddress = None):
+      started = monotonic()
+      connector = connectWS(self, bindAddress = bindAddress)
+      self.attempts[connector] = (started, 0)
+
+   def reconnect(self, connector):
+      self.attempts[connector] = (monotonic(), self.attempts[connector][1])
+      connector.connect()
+
+   def retry(self, connector):
+      ## connections that were open are reopened, not retried
+      if connector in self.attempts:
+         self.attempts[connector] = (None, self.attempts[connector][1] + 1)
+      else:
+         self.attempts[connector] = (None, 0)
+      reactor.callLater(float(self.retrydelay)/1000., self.reconnect, connector)
+
+   def opened(self, proto):
+      """
+      Get (time connection attempt started, retries) of the connection
+      opened by protocol, and stop tracking its attempts.
+      """
+      return self.attempts.pop(proto.transport.connector)
+
    def clientConnectionFailed(self, connector, reason):
       if self.test.onFailed():
-         reactor.callLater(float(self.retrydelay)/1000., connector.connect)
+         self.retry(connector)
+      else:
+         self.attempts.pop(connector, None)
 
    def clientConnectionLost(self, connector, reason):
-      if self.test.onLost():
-         reactor.callLater(float(self.retrydelay)/1000., connector.connect)
+      proto = self.connected.pop(connector, None)
+      if self.test.onLost(proto):
+         self.retry(connector)
+      else:
+         self.attempts.pop(connector, None)
 
 
 class MassConnect:
 
-   def __init__(self, name, uri, connections, batchsize, batchdelay, retrydelay):
+   ## latencies measured per connection, from the start of the connection
+   ## attempt that succeeded, as (key, description)
+   ##
+   LATENCIES = [("tcpConnect", "TCP connect"),
+                ("openingHandshake", "WebSocket opening handshake after TCP connect"),
+                ("connect", "TCP connect and WebSocket opening handshake")]
+
+   ## defaults for the hold phase after ramp up
+   ##
+   HOLD_DEFAULTS = {"duration": 0,
+                    "connections": 100,
+                    "rate": 1,
+                    "probe": "ping",
+                    "timeout": 5000}
+
+   PROBES = ["ping", "echo"]
+
+   ## defaults for the churn phase after ramp up (and hold phase)
+   ##
+   CHURN_DEFAULTS = {"duration": 0,
+                     "rate": 0.1}
+
+   ## interval (in s) connections are closed at in the churn phase
+   ##
+   CHURN_INTERVAL = 0.1
+
+   ## maximum time (in s) to wait for connections being reopened at the end
+   ## of the churn phase
+   ##
+   CHURN_DRAIN_TIMEOUT = 10
+
+   def __init__(self, name, uri, connections, batchsize, batchdelay, retrydelay, hold = None, sourceAddresses = None, churn = None):
       self.name = name
       self.uri = uri
       self.batchsize = batchsize
@@ -66,43 +170,371 @@ class MassConnect:
       self.targetCnt = connections
       self.currentCnt = 0
       self.actual = 0
-      self.protos = []
+      self.protos = set()
+
+      ## latency histograms (in us)
+      ##
+      self.latencies = dict([(key, Histogram()) for key, _ in MassConnect.LATENCIES])
+
+      ## retries per connection -> number of connections
+      ##
+      self.retries = {}
+
+      ## connections opened per second since start
+      ##
+      self.timeline = []
+      self.result = None
+
+      ## hold phase: all connections are kept open for a duration (in s),
+      ## while some connections send probes (WebSocket pings, or messages
+      ## echoed by the server) at a rate (per second), recording round trip
+      ## times. Probes not answered within a timeout (in ms) count as failed.
+      ##
+      self.hold = dict(MassConnect.HOLD_DEFAULTS)
+      self.hold.update(hold or {})
+      if self.hold["probe"] not in MassConnect.PROBES:
+         raise Exception("invalid massconnect probe %s" % self.hold["probe"])
+      self.holding = False
+
+      ## churn phase: for a duration (in s), a fraction of the connections
+      ## is closed per second (rate), and closed connections are reopened
+      ## after retrydelay, recording connect latencies
+      ##
+      self.churn = dict(MassConnect.CHURN_DEFAULTS)
+      self.churn.update(churn or {})
+      self.churning = False
+      self.churnClosed = set()
+      self.draining = False
+      self.closing = False
+
+      ## local addresses to connect from (round robin over connections)
+      ##
+      self.sourceAddresses = sourceAddresses or []
+
+      self.factory = MassConnectFactory(self, self.uri, self.retrydelay)
+      self.memoryBefore = None
 
    def run(self):
       self.d = Deferred()
-      self.started = time.clock()
+      self.memoryBefore = residentMemory()
+      self.started = monotonic()
       self.connectBunch()
       return self.d
 
    def onFailed(self):
+      if self.churning:
+         self.churnFailed += 1
+         self.churnSecond['failed'] += 1
+         return True
+      if self.draining or self.closing:
+         return False
       self.failed += 1
       sys.stdout.write("!")
       return True
 
-   def onLost(self):
+   def onLost(self, proto):
+      if self.holding:
+         self.holdLost += 1
+         self.protos.discard(proto)
+         if proto in self.probes:
+            self.stopProbing(proto)
+         return False
+      if self.churning:
+         if proto in self.churnClosed:
+            ## closed by us
+            self.churnClosed.remove(proto)
+         else:
+            self.churnLost += 1
+            self.churnSecond['lost'] += 1
+            self.protos.discard(proto)
+         ## reopen to keep the number of connections
+         return True
+      if self.draining:
+         self.churnClosed.discard(proto)
+         self.protos.discard(proto)
+         return False
+      if self.closing:
+         ## closed by us after target was reached
+         self.protos.discard(proto)
+         self.churnClosed.discard(proto)
+         if not self.protos and not self.d.called:
+            self.d.callback(self.result)
+         return False
       self.lost += 1
-      #sys.stdout.write("*")
-      return False
+      sys.stdout.write("*")
+      ## reopen connections lost after they were open, they no longer count
+      ## towards the target
+      if proto is not None and proto in self.protos:
+         self.protos.discard(proto)
+         self.actual -= 1
+      ## retry connections lost before they were open
       return True
 
-   def onConnected(self):
+   def recordLatencies(self, latencies, proto, now):
+      """
+      Record latencies of connection opened by protocol, and get the number
+      of retries it took.
+      """
+      start, retries = proto.factory.opened(proto)
+      tcp = proto.tcpConnectedAt
+      for key, value in [("tcpConnect", tcp - start), ("openingHandshake", now - tcp), ("connect", now - start)]:
+         latencies[key].record(value * 1000000.)
+      return retries
+
+   def onConnected(self, proto):
+      now = monotonic()
+      if self.churning:
+         self.onChurnConnected(proto, now)
+         return
+      if self.draining or self.closing:
+         ## connection reopened after end of churn phase
+         proto.factory.opened(proto)
+         self.protos.add(proto)
+         if self.closing:
+            proto.sendClose()
+         return
+
+      retries = self.recordLatencies(self.latencies, proto, now)
+      self.retries[retries] = self.retries.get(retries, 0) + 1
+
+      second = int(now - self.started)
+      if second >= len(self.timeline):
+         self.timeline.extend([0] * (second + 1 - len(self.timeline)))
+      self.timeline[second] += 1
+
+      self.protos.add(proto)
       self.actual += 1
       if self.actual % self.batchsize == 0:
          sys.stdout.write(".")
       if self.actual == self.targetCnt:
-         self.ended = time.clock()
+         self.ended = now
          duration = self.ended - self.started
-         print " connected %d clients to %s at %s in %s seconds (retries %d = failed %d + lost %d)" % (self.currentCnt, self.name, self.uri, duration, self.failed + self.lost, self.failed, self.lost)
-         result = {'name': self.name,
-                   'uri': self.uri,
-                   'connections': self.targetCnt,
-                   'retries': self.failed + self.lost,
-                   'lost': self.lost,
-                   'failed': self.failed,
-                   'duration': duration}
-         for p in self.protos:
+         connect = self.latencies["connect"]
+         print " connected %d clients to %s at %s in %.3f seconds (%.1f connections/sec, retries %d = failed %d + lost %d)" % (self.currentCnt, self.name, self.uri, duration, self.actual / duration, self.failed + self.lost, self.failed, self.lost)
+         print " connect latency (ms): p50 %.3f, p90 %.3f, p99 %.3f, max %.3f" % tuple([connect.percentile(p) / 1000. for p in [50., 90., 99.]] + [connect.max / 1000.])
+         memory = None
+         memoryAfter = residentMemory()
+         if memoryAfter is not None and self.memoryBefore is not None:
+            memory = {'before': self.memoryBefore,
+                      'after': memoryAfter,
+                      'perConnection': float(memoryAfter - self.memoryBefore) / self.actual}
+            print " memory: %.0f bytes per connection (resident %.1f MB)" % (memory['perConnection'], memoryAfter / 1048576.)
+         self.result = {'name': self.name,
+                        'uri': self.uri,
+                        'connections': self.targetCnt,
+                        'retries': self.failed + self.lost,
+                        'lost': self.lost,
+                        'failed': self.failed,
+                        'duration': duration,
+                        'rate': self.actual / duration,
+                        'timeline': self.timeline,
+                        'retriesPerConnection': sorted(self.retries.items()),
+                        'memory': memory,
+                        'latencies': dict([(key, h.__json__()) for key, h in self.latencies.items()])}
+         if self.hold["duration"] > 0:
+            self.startHold()
+         elif self.churn["duration"] > 0:
+            self.startChurn()
+         else:
+            self.closeAll()
+
+   def closeAll(self):
+      self.closing = True
+      self.protos.update(self.churnClosed)
+      if not self.protos:
+         self.d.callback(self.result)
+      for p in list(self.protos):
+         if p not in self.churnClosed:
             p.sendClose()
-         #self.d.callback(result)
+
+   def startHold(self):
+      self.holding = True
+      self.holdStarted = monotonic()
+      self.holdLost = 0
+      self.probesSent = 0
+      self.probesFailed = 0
+      self.rtt = Histogram()
+      self.holdTimeline = []
+      self.startSecond()
+
+      self.probes = {}
+      interval = 1. / self.hold["rate"]
+      for p in random.sample(list(self.protos), min(self.hold["connections"], len(self.protos))):
+         ## pending probes: payload -> time sent
+         p.probesPending = {}
+         lc = LoopingCall(self.sendProbe, p)
+         ## spread the probes of the connections over the interval
+         self.probes[p] = (lc, reactor.callLater(random.random() * interval, lc.start, interval))
+      self.probeCount = len(self.probes)
+
+      self.second = LoopingCall(self.endSecond)
+      self.second.start(1, now = False)
+      reactor.callLater(self.hold["duration"], self.endHold)
+
+   def sendProbe(self, proto):
+      now = monotonic()
+      payload = "%.9f" % now
+      proto.probesPending[payload] = now
+      self.probesSent += 1
+      self.secondSent += 1
+      if self.hold["probe"] == "ping":
+         proto.sendPing(payload)
+      else:
+         proto.sendMessage(payload)
+
+   def onProbeReply(self, proto, payload):
+      if not proto.probesPending:
+         return
+      sent = proto.probesPending.pop(payload, None)
+      if sent is not None:
+         rtt = (monotonic() - sent) * 1000000.
+         self.rtt.record(rtt)
+         self.secondRtt.record(rtt)
+
+   def stopProbing(self, proto):
+      lc, start = self.probes.pop(proto)
+      if lc.running:
+         lc.stop()
+      elif start.active():
+         start.cancel()
+
+   def expireProbes(self, timeout):
+      now = monotonic()
+      for p in self.probes:
+         for payload, sent in p.probesPending.items():
+            if now - sent >= timeout:
+               del p.probesPending[payload]
+               self.probesFailed += 1
+               self.secondFailed += 1
+
+   def startSecond(self):
+      self.secondSent = 0
+      self.secondFailed = 0
+      self.secondRtt = Histogram()
+
+   def endSecond(self):
+      self.expireProbes(float(self.hold["timeout"]) / 1000.)
+      self.holdTimeline.append({'open': len(self.protos),
+                                'sent': self.secondSent,
+                                'replies': self.secondRtt.count,
+                                'failed': self.secondFailed,
+                                'p50': self.secondRtt.percentile(50.),
+                                'p99': self.secondRtt.percentile(99.),
+                                'max': self.secondRtt.max})
+      self.startSecond()
+
+   def endHold(self):
+      self.second.stop()
+      ## probes still in flight (within timeout) at the end are not counted
+      self.expireProbes(float(self.hold["timeout"]) / 1000.)
+      for p in self.probes.keys():
+         self.stopProbing(p)
+      self.holding = False
+
+      rtt = self.rtt
+      print " held %d clients to %s for %s seconds (%d open at end, lost %d): probes sent %d, failed %d" % (self.targetCnt, self.name, self.hold["duration"], len(self.protos), self.holdLost, self.probesSent, self.probesFailed)
+      if rtt.count:
+         print " probe round trip time (ms): p50 %.3f, p90 %.3f, p99 %.3f, max %.3f" % tuple([rtt.percentile(p) / 1000. for p in [50., 90., 99.]] + [rtt.max / 1000.])
+      self.result['hold'] = {'duration': monotonic() - self.holdStarted,
+                             'probe': self.hold['probe'],
+                             'probeConnections': self.probeCount,
+                             'probeRate': self.hold['rate'],
+                             'probesSent': self.probesSent,
+                             'probesFailed': self.probesFailed,
+                             'lost': self.holdLost,
+                             'open': len(self.protos),
+                             'rtt': rtt.__json__(),
+                             'timeline': self.holdTimeline}
+      if self.churn["duration"] > 0:
+         self.startChurn()
+      else:
+         self.closeAll()
+
+   def startChurn(self):
+      self.churning = True
+      self.churnStarted = monotonic()
+      self.churnLatencies = dict([(key, Histogram()) for key, _ in MassConnect.LATENCIES])
+      self.churnHandshakes = 0
+      self.churnFailed = 0
+      self.churnLost = 0
+      self.churnTimeline = []
+      self.startChurnSecond()
+
+      ## connections closed by us, not lost yet
+      self.churnClosed = set()
+      self.churnCredit = 0.
+      self.churnClosedCount = 0
+
+      self.churnTick = LoopingCall(self.closeChurn)
+      self.churnTick.start(MassConnect.CHURN_INTERVAL, now = False)
+      self.second = LoopingCall(self.endChurnSecond)
+      self.second.start(1, now = False)
+      reactor.callLater(self.churn["duration"], self.endChurn)
+
+   def closeChurn(self):
+      self.churnCredit += self.churn["rate"] * self.targetCnt * MassConnect.CHURN_INTERVAL
+      n = min(int(self.churnCredit), len(self.protos))
+      self.churnCredit -= n
+      for i in xrange(n):
+         ## arbitrary connection
+         p = self.protos.pop()
+         self.churnClosed.add(p)
+         p.sendClose()
+      self.churnClosedCount += n
+      self.churnSecond['closed'] += n
+
+   def onChurnConnected(self, proto, now):
+      self.recordLatencies(self.churnLatencies, proto, now)
+      self.churnSecondLatency.record((now - proto.tcpConnectedAt) * 1000000.)
+      self.protos.add(proto)
+      self.churnHandshakes += 1
+      self.churnSecond['handshakes'] += 1
+
+   def startChurnSecond(self):
+      self.churnSecond = {'closed': 0, 'handshakes': 0, 'failed': 0, 'lost': 0}
+      self.churnSecondLatency = Histogram()
+
+   def endChurnSecond(self):
+      entry = self.churnSecond
+      entry['open'] = len(self.protos)
+      entry['p50'] = self.churnSecondLatency.percentile(50.)
+      entry['p99'] = self.churnSecondLatency.percentile(99.)
+      entry['max'] = self.churnSecondLatency.max
+      self.churnTimeline.append(entry)
+      self.startChurnSecond()
+
+   def endChurn(self):
+      self.churnTick.stop()
+      self.second.stop()
+      self.churning = False
+      duration = monotonic() - self.churnStarted
+
+      handshake = self.churnLatencies["openingHandshake"]
+      print " churned %d clients to %s for %s seconds (%d open at end): closed %d, reopened %d (%.1f handshakes/sec), failed %d, lost %d" % (self.targetCnt, self.name, self.churn["duration"], len(self.protos), self.churnClosedCount, self.churnHandshakes, self.churnHandshakes / duration, self.churnFailed, self.churnLost)
+      if handshake.count:
+         print " opening handshake latency under churn (ms): p50 %.3f, p90 %.3f, p99 %.3f, max %.3f" % tuple([handshake.percentile(p) / 1000. for p in [50., 90., 99.]] + [handshake.max / 1000.])
+      self.result['churn'] = {'duration': duration,
+                              'rate': self.churn['rate'],
+                              'closed': self.churnClosedCount,
+                              'handshakes': self.churnHandshakes,
+                              'handshakesPerSecond': self.churnHandshakes / duration,
+                              'failed': self.churnFailed,
+                              'lost': self.churnLost,
+                              'open': len(self.protos),
+                              'latencies': dict([(key, h.__json__()) for key, h in self.churnLatencies.items()]),
+                              'timeline': self.churnTimeline}
+
+      ## wait for connections being reopened, so all get closed
+      self.drainStarted = monotonic()
+      self.draining = True
+      self.drain = LoopingCall(self.checkDrained)
+      self.drain.start(MassConnect.CHURN_INTERVAL)
+
+   def checkDrained(self):
+      if not self.factory.attempts or monotonic() - self.drainStarted > MassConnect.CHURN_DRAIN_TIMEOUT:
+         self.drain.stop()
+         self.draining = False
+         self.closeAll()
 
    def connectBunch(self):
       if self.currentCnt + self.batchsize < self.targetCnt:
@@ -112,18 +544,19 @@ class MassConnect:
          c = self.targetCnt - self.currentCnt
          redo = False
       for i in xrange(0, c):
-         factory = MassConnectFactory(self.uri)
-         factory.test = self
-         factory.retrydelay = self.retrydelay
-         connectWS(factory)
+         if self.sourceAddresses:
+            self.factory.connect((self.sourceAddresses[self.currentCnt % len(self.sourceAddresses)], 0))
+         else:
+            self.factory.connect()
          self.currentCnt += 1
       if redo:
          reactor.callLater(float(self.batchdelay)/1000., self.connectBunch)
 
 
 class MassConnectTest:
-   def __init__(self, spec):
+   def __init__(self, spec, outfile = None):
       self.spec = spec
+      self.outfile = outfile
 
    @inlineCallbacks
    def run(self):
@@ -135,13 +568,278 @@ class MassConnectTest:
                          self.spec['options']['connections'],
                          self.spec['options']['batchsize'],
                          self.spec['options']['batchdelay'],
-                         self.spec['options']['retrydelay'])
+                         self.spec['options']['retrydelay'],
+                         self.spec['options'].get('hold'),
+                         self.spec['options'].get('sourceaddresses'),
+                         self.spec['options'].get('churn'))
          r = yield t.run()
          res.append(r)
+      if self.outfile:
+         writeResults(res, self.outfile)
       returnValue(res)
 
 
-def startClient(spec, debug = False):
-   test = MassConnectTest(spec)
+def shares(total, parts):
+   """
+   Split total into a list of parts integer shares, as equal as possible.
+   """
+   return [total // parts + (1 if i < total % parts else 0) for i in xrange(parts)]
+
+
+def mergeTimelines(timelines, merge):
+   """
+   Merge lists of per second entries of multiple workers, entry by entry.
+   """
+   res = []
+   for timeline in timelines:
+      for i, entry in enumerate(timeline):
+         if i < len(res):
+            res[i] = merge(res[i], entry)
+         else:
+            res.append(entry)
+   return res
+
+
+def mergeHistograms(summaries):
+   h = Histogram()
+   for summary in summaries:
+      h.merge(summary)
+   return h.__json__()
+
+
+def mergeResults(results):
+   """
+   Merge massconnect results of multiple workers for the same server into
+   one result. Workers are started at the same time, so duration is the
+   longest of the workers, and per second timelines are added up.
+   """
+   r0 = results[0]
+   res = {'name': r0['name'],
+          'uri': r0['uri'],
+          'workers': len(results),
+          'duration': max([r['duration'] for r in results])}
+   for key in ['connections', 'retries', 'lost', 'failed']:
+      res[key] = sum([r[key] for r in results])
+   res['rate'] = res['connections'] / res['duration']
+
+   ## memory per connection over all workers
+   memory = [r['memory'] for r in results if r.get('memory')]
+   if len(memory) == len(results):
+      res['memory'] = {'before': sum([m['before'] for m in memory]),
+                       'after': sum([m['after'] for m in memory])}
+      res['memory']['perConnection'] = float(res['memory']['after'] - res['memory']['before']) / res['connections']
+   else:
+      res['memory'] = None
+   res['timeline'] = mergeTimelines([r['timeline'] for r in results], lambda a, b: a + b)
+
+   retries = {}
+   for r in results:
+      for n, count in r['retriesPerConnection']:
+         retries[n] = retries.get(n, 0) + count
+   res['retriesPerConnection'] = sorted(retries.items())
+
+   res['latencies'] = {}
+   for key, _ in MassConnect.LATENCIES:
+      res['latencies'][key] = mergeHistograms([r['latencies'][key] for r in results])
+
+   holds = [r['hold'] for r in results if r.get('hold')]
+   if holds:
+      ## per second round trip time percentiles can't be merged, only maximum
+      def mergeSecond(a, b):
+         return {'open': a['open'] + b['open'],
+                 'sent': a['sent'] + b['sent'],
+                 'replies': a['replies'] + b['replies'],
+                 'failed': a['failed'] + b['failed'],
+                 'max': max(a['max'], b['max'])}
+      hold = {'duration': max([h['duration'] for h in holds]),
+              'probe': holds[0]['probe'],
+              'probeRate': holds[0]['probeRate'],
+              'rtt': mergeHistograms([h['rtt'] for h in holds]),
+              'timeline': mergeTimelines([h['timeline'] for h in holds], mergeSecond)}
+      for key in ['probeConnections', 'probesSent', 'probesFailed', 'lost', 'open']:
+         hold[key] = sum([h[key] for h in holds])
+      res['hold'] = hold
+
+   churns = [r['churn'] for r in results if r.get('churn')]
+   if churns:
+      def mergeSecond(a, b):
+         res = dict([(key, a[key] + b[key]) for key in ['open', 'closed', 'handshakes', 'failed', 'lost']])
+         res['max'] = max(a['max'], b['max'])
+         return res
+      churn = {'duration': max([c['duration'] for c in churns]),
+               'rate': churns[0]['rate'],
+               'latencies': {},
+               'timeline': mergeTimelines([c['timeline'] for c in churns], mergeSecond)}
+      for key in ['closed', 'handshakes', 'handshakesPerSecond', 'failed', 'lost', 'open']:
+         churn[key] = sum([c[key] for c in churns])
+      for key, _ in MassConnect.LATENCIES:
+         churn['latencies'][key] = mergeHistograms([c['latencies'][key] for c in churns])
+      res['churn'] = churn
+   return res
+
+
+def raiseFileLimit():
+   """
+   Raise the soft limit on open files of this process to the hard limit,
+   since every connection needs a file descriptor.
+   """
+   try:
+      import resource
+   except ImportError:
+      return
+   soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+   if soft != hard:
+      try:
+         resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+      except (ValueError, resource.error):
+         pass
+
+
+class MassConnectWorkers:
+   """
+   Massconnect spreading the connections to each server over multiple
+   worker processes, each running massconnect on its share of the
+   connections (and of the batch size, so the overall ramp up is as
+   configured). The source addresses given are spread over the workers.
+   The results of the workers are merged into one result per server.
+   """
+
+   def __init__(self, spec, workers, debug = False, outfile = None):
+      self.spec = spec
+      self.workers = min(workers, spec['options']['connections'])
+      self.debug = debug
+      self.outfile = outfile
+
+   def run(self):
+      print "Ok, will run massconnect against %d servers in %d worker processes" % (len(self.spec['servers']), self.workers)
+
+      options = self.spec['options']
+      connections = shares(options['connections'], self.workers)
+      batchsizes = shares(options['batchsize'], self.workers)
+      hold = dict(MassConnect.HOLD_DEFAULTS)
+      hold.update(options.get('hold') or {})
+      probeConnections = shares(hold['connections'], self.workers)
+      addresses = options.get('sourceaddresses') or []
+
+      ## each worker gets a spec for its share, and writes results to a file
+      ##
+      self.workdir = tempfile.mkdtemp(prefix = "massconnect")
+      self.resultFiles = []
+      dl = []
+      for i in xrange(self.workers):
+         spec = dict(self.spec)
+         spec['options'] = dict(options)
+         spec['options']['connections'] = connections[i]
+         spec['options']['batchsize'] = max(1, batchsizes[i])
+         spec['options']['hold'] = dict(hold)
+         spec['options']['hold']['connections'] = probeConnections[i]
+         if addresses:
+            spec['options']['sourceaddresses'] = addresses[i::self.workers] or [addresses[i % len(addresses)]]
+
+         spec_filename = os.path.join(self.workdir, "worker%d.json" % (i + 1))
+         f = open(spec_filename, 'w')
+         f.write(json.dumps(spec, indent = 3))
+         f.close()
+         result_filename = os.path.join(self.workdir, "worker%d.result.json" % (i + 1))
+         self.resultFiles.append(result_filename)
+
+         args = [sys.executable, "-m", "autobahntestsuite.wstest", "-m", "massconnect", "-s", spec_filename, "-o", result_filename]
+         if self.debug:
+            args.append("-d")
+         args.extend(profilerArgs(".worker%d" % (i + 1)))
+
+         worker = WorkerProcess(i + 1)
+         reactor.spawnProcess(worker, sys.executable, args, env = os.environ)
+         dl.append(worker.d)
+
+      d = DeferredList(dl)
+      d.addCallback(self.merge)
+      return d
+
+   def merge(self, _):
+      workerResults = []
+      for filename in self.resultFiles:
+         try:
+            workerResults.append(json.loads(open(filename).read()))
+         except Exception, e:
+            print "No results from worker with result file %s (%s)" % (filename, e)
+      shutil.rmtree(self.workdir, ignore_errors = True)
+
+      res = []
+      for i in xrange(len(self.spec['servers'])):
+         results = [r[i] for r in workerResults if len(r) > i]
+         if not results:
+            continue
+         r = mergeResults(results)
+         connect = r['latencies']['connect']
+         print "%d workers connected %d clients to %s at %s in %.3f seconds (%.1f connections/sec, retries %d = failed %d + lost %d)" % (len(results), r['connections'], r['name'], r['uri'], r['duration'], r['rate'], r['retries'], r['failed'], r['lost'])
+         print " connect latency (ms): p50 %.3f, p90 %.3f, p99 %.3f, max %.3f" % tuple([connect[p] / 1000. for p in ['p50', 'p90', 'p99', 'max']])
+         if r['memory']:
+            print " memory: %.0f bytes per connection" % r['memory']['perConnection']
+         if r.get('hold'):
+            hold = r['hold']
+            print " held clients for %.1f seconds (%d open at end, lost %d): probes sent %d, failed %d" % (hold['duration'], hold['open'], hold['lost'], hold['probesSent'], hold['probesFailed'])
+         if r.get('churn'):
+            churn = r['churn']
+            print " churned clients for %.1f seconds (%d open at end): closed %d, reopened %d (%.1f handshakes/sec), failed %d, lost %d" % (churn['duration'], churn['open'], churn['closed'], churn['handshakes'], churn['handshakesPerSecond'], churn['failed'], churn['lost'])
+         res.append(r)
+      if self.outfile:
+         writeResults(res, self.outfile)
+      return res
+
+
+def writeResults(results, filename):
+   """
+   Write massconnect results to file: as CSV with a row per server when the
+   filename ends with .csv, else as JSON.
+   """
+   f = open(filename, 'wb')
+   if filename.lower().endswith(".csv"):
+      w = csv.writer(f)
+      fields = ['name', 'uri', 'connections', 'duration', 'rate', 'retries', 'failed', 'lost']
+      header = list(fields) + ['bytesPerConnection']
+      holdFields = ['probesSent', 'probesFailed', 'lost', 'open']
+      percentiles = ['min'] + [p for p, _ in Histogram.PERCENTILES] + ['max']
+      for key, _ in MassConnect.LATENCIES:
+         for p in percentiles:
+            header.append("%s_%s_us" % (key, p))
+      header.extend(["hold_%s" % k for k in holdFields])
+      header.extend(["hold_rtt_%s_us" % p for p in percentiles])
+      churnFields = ['handshakesPerSecond', 'closed', 'handshakes', 'failed', 'lost']
+      header.extend(["churn_%s" % k for k in churnFields])
+      header.extend(["churn_openingHandshake_%s_us" % p for p in percentiles])
+      w.writerow(header)
+      for r in results:
+         row = [r[k] for k in fields]
+         row.append(r['memory'] and r['memory']['perConnection'])
+         for key, _ in MassConnect.LATENCIES:
+            l = r['latencies'][key]
+            for p in percentiles:
+               row.append(l[p])
+         hold = r.get('hold')
+         if hold:
+            row.extend([hold[k] for k in holdFields])
+            row.extend([hold['rtt'][p] for p in percentiles])
+         else:
+            row.extend([None] * (len(holdFields) + len(percentiles)))
+         churn = r.get('churn')
+         if churn:
+            row.extend([churn[k] for k in churnFields])
+            row.extend([churn['latencies']['openingHandshake'][p] for p in percentiles])
+         else:
+            row.extend([None] * (len(churnFields) + len(percentiles)))
+         w.writerow(row)
+   else:
+      json.dump(results, f, indent = 3, sort_keys = True)
+   f.close()
+   print "massconnect results written to %s" % filename
+
+
+def startClient(spec, debug = False, outfile = None, workers = 1):
+   raiseFileLimit()
+   if workers > 1:
+      return MassConnectWorkers(spec, workers, debug, outfile).run()
+
+   test = MassConnectTest(spec, outfile)
    d = test.run()
    return d
@@ -0,0 +1,230 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ("CounterMetric",
+           "GaugeMetric",
+           "HistogramMetric",
+           "Metrics",
+           "WebSocketMetrics",
+           "MetricsResource",)
+
+from twisted.web.resource import Resource
+
+
+def formatValue(value):
+   if isinstance(value, float):
+      if value == float("inf"):
+         return "+Inf"
+      return repr(value)
+   return str(value)
+
+
+def formatLabels(names, values, extra = None):
+   labels = zip(names, values)
+   if extra:
+      labels.append(extra)
+   if not labels:
+      return ""
+   esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+   return "{" + ",".join(['%s="%s"' % (n, esc(v)) for n, v in labels]) + "}"
+
+
+
+class CounterMetric:
+   """
+   Counter, optionally with labels. Values are kept per tuple of label
+   values, or are collected from a function when rendered.
+   """
+
+   TYPE = "counter"
+
+   def __init__(self, name, help, labelNames = (), collect = None):
+      """
+      :param name: Metric name.
+      :type name: str
+      :param help: Metric description.
+      :type help: str
+      :param labelNames: Label names.
+      :type labelNames: tuple
+      :param collect: Function returning the current value (for metrics without labels).
+      :type collect: callable
+      """
+      self.name = name
+      self.help = help
+      self.labelNames = tuple(labelNames)
+      self.collect = collect
+      self.values = {}
+
+   def inc(self, amount = 1, *labelValues):
+      self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+   def samples(self):
+      """
+      Get list of (name, labels, value) samples.
+      """
+      if self.collect:
+         return [(self.name, "", self.collect())]
+      if not self.values and not self.labelNames:
+         return [(self.name, "", 0)]
+      return [(self.name, formatLabels(self.labelNames, k), v) for k, v in sorted(self.values.items())]
+
+
+
+class GaugeMetric(CounterMetric):
+   """
+   Gauge, optionally with labels.
+   """
+
+   TYPE = "gauge"
+
+   def set(self, value, *labelValues):
+      self.values[labelValues] = value
+
+
+
+class HistogramMetric:
+   """
+   Histogram with fixed upper bucket bounds (cumulative when rendered),
+   optionally with labels.
+   """
+
+   TYPE = "histogram"
+
+   def __init__(self, name, help, buckets, labelNames = ()):
+      self.name = name
+      self.help = help
+      self.buckets = sorted(buckets)
+      self.labelNames = tuple(labelNames)
+
+      ## label values -> [count per bucket (non-cumulative, +Inf last), sum]
+      ##
+      self.values = {}
+
+   def observe(self, value, *labelValues):
+      v = self.values.get(labelValues)
+      if v is None:
+         v = [[0] * (len(self.buckets) + 1), 0]
+         self.values[labelValues] = v
+      i = 0
+      for bound in self.buckets:
+         if value <= bound:
+            break
+         i += 1
+      v[0][i] += 1
+      v[1] += value
+
+   def samples(self):
+      res = []
+      for labelValues, (counts, total) in sorted(self.values.items()):
+         acc = 0
+         for bound, count in zip(self.buckets + [float("inf")], counts):
+            acc += count
+            res.append((self.name + "_bucket", formatLabels(self.labelNames, labelValues, ("le", formatValue(float(bound)))), acc))
+         res.append((self.name + "_sum", formatLabels(self.labelNames, labelValues), total))
+         res.append((self.name + "_count", formatLabels(self.labelNames, labelValues), acc))
+      return res
+
+
+
+class Metrics:
+   """
+   Registry of metrics, rendered in the Prometheus text exposition format.
+   """
+
+   def __init__(self):
+      self.metrics = []
+
+   def add(self, metric):
+      self.metrics.append(metric)
+      return metric
+
+   def render(self):
+      lines = []
+      for metric in self.metrics:
+         lines.append("# HELP %s %s" % (metric.name, metric.help))
+         lines.append("# TYPE %s %s" % (metric.name, metric.TYPE))
+         for name, labels, value in metric.samples():
+            lines.append("%s%s %s" % (name, labels, formatValue(value)))
+      return "\n".join(lines) + "\n"
+
+
+
+class WebSocketMetrics(Metrics):
+   """
+   Registry tracking the WebSocket connections of a factory: active
+   connections, and octets received and sent on the wire. Octets are taken
+   from the traffic stats of connections when closed, or when rendered for
+   active connections, so nothing is done per message.
+   """
+
+   def __init__(self, prefix = "wstest"):
+      Metrics.__init__(self)
+      self.connections = set()
+      self.closedRxOctets = 0
+      self.closedTxOctets = 0
+      self.closedConnections = 0
+      self.add(GaugeMetric(prefix + "_connections_active", "WebSocket connections currently open.", collect = lambda: len(self.connections)))
+      self.add(CounterMetric(prefix + "_connections_total", "WebSocket connections made.", collect = lambda: len(self.connections) + self.closedConnections))
+      self.add(CounterMetric(prefix + "_received_bytes_total", "Octets received on WebSocket connections.", collect = lambda: self.octets()[0]))
+      self.add(CounterMetric(prefix + "_sent_bytes_total", "Octets sent on WebSocket connections.", collect = lambda: self.octets()[1]))
+
+   def connectionMade(self, proto):
+      self.connections.add(proto)
+
+   def connectionLost(self, proto):
+      if proto in self.connections:
+         self.connections.remove(proto)
+         self.closedConnections += 1
+         rx, tx = self.connectionOctets(proto)
+         self.closedRxOctets += rx
+         self.closedTxOctets += tx
+
+   def connectionOctets(self, proto):
+      stats = getattr(proto, "trafficStats", None)
+      if stats is None:
+         return 0, 0
+      return (stats.incomingOctetsWireLevel + stats.preopenIncomingOctetsWireLevel,
+              stats.outgoingOctetsWireLevel + stats.preopenOutgoingOctetsWireLevel)
+
+   def octets(self):
+      """
+      Get (received, sent) octets of all connections.
+      """
+      rx, tx = self.closedRxOctets, self.closedTxOctets
+      for proto in self.connections:
+         r, t = self.connectionOctets(proto)
+         rx += r
+         tx += t
+      return rx, tx
+
+
+
+class MetricsResource(Resource):
+   """
+   Web resource rendering a metrics registry (e.g. mounted at /metrics).
+   """
+
+   isLeaf = True
+
+   def __init__(self, metrics):
+      Resource.__init__(self)
+      self.metrics = metrics
+
+   def render_GET(self, request):
+      request.setHeader("content-type", "text/plain; version=0.0.4; charset=utf-8")
+      return self.metrics.render()
@@ -0,0 +1,208 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ("Profiler",
+           "startProfiler",
+           "stopProfiler",
+           "caseStarted",
+           "caseEnded",
+           "profilerArgs",)
+
+import os, signal, cProfile, pstats
+
+
+## profiler running in this process (if any)
+##
+activeProfiler = None
+
+
+class Profiler:
+   """
+   Profiler for the reactor thread, with time attributed to the test cases
+   running.
+
+   In mode "cprofile", a cProfile profile is kept per test case id (and one
+   for time outside of test cases), switched when test cases start and end.
+   The profile of the whole run is written (in pstats format) to the given
+   file, and per case profiles to a directory next to it. Attribution is
+   exact only when test cases run one at a time.
+
+   In mode "sampling", the stack of the reactor thread is sampled at
+   intervals of CPU time, and collapsed stacks (one line per stack with its
+   sample count, as used by flame graph tools) are written to the given
+   file. The root of each stack is the id of the test case whose protocol
+   is on the stack, so test cases running concurrently are told apart.
+   """
+
+   MODES = ["cprofile", "sampling"]
+
+   ## seconds of CPU time between samples
+   ##
+   SAMPLING_INTERVAL = 0.005
+
+   ## key for time outside of test cases
+   ##
+   NO_CASE = "-"
+
+   def __init__(self, filename, mode = "cprofile"):
+      if mode not in Profiler.MODES:
+         raise Exception("invalid profiler mode %s" % mode)
+      self.filename = filename
+      self.mode = mode
+
+      ## id(protocol) -> case id, of test cases running
+      ##
+      self.cases = {}
+
+      ## case id -> cProfile.Profile
+      ##
+      self.profiles = {}
+      self.current = None
+
+      ## collapsed stack -> sample count
+      ##
+      self.stacks = {}
+
+
+   def start(self):
+      if self.mode == "cprofile":
+         self.switch(Profiler.NO_CASE)
+      else:
+         signal.signal(signal.SIGPROF, self.sample)
+         ## system calls must not fail with EINTR when sampled
+         signal.siginterrupt(signal.SIGPROF, False)
+         signal.setitimer(signal.ITIMER_PROF, Profiler.SAMPLING_INTERVAL, Profiler.SAMPLING_INTERVAL)
+
+
+   def stop(self):
+      """
+      Stop profiling and write profiler output.
+      """
+      if self.mode == "cprofile":
+         self.current.disable()
+         self.current = None
+         self.writeProfiles()
+      else:
+         signal.setitimer(signal.ITIMER_PROF, 0, 0)
+         signal.signal(signal.SIGPROF, signal.SIG_DFL)
+         self.writeStacks()
+
+
+   def caseStarted(self, proto, caseId):
+      self.cases[id(proto)] = caseId
+      if self.mode == "cprofile":
+         self.switch(caseId)
+
+
+   def caseEnded(self, proto):
+      self.cases.pop(id(proto), None)
+      if self.mode == "cprofile":
+         if self.cases:
+            self.switch(self.cases.values()[0])
+         else:
+            self.switch(Profiler.NO_CASE)
+
+
+   def switch(self, key):
+      if self.current is not None:
+         self.current.disable()
+      if not self.profiles.has_key(key):
+         self.profiles[key] = cProfile.Profile()
+      self.current = self.profiles[key]
+      self.current.enable()
+
+
+   def sample(self, signum, frame):
+      case = Profiler.NO_CASE
+      stack = []
+      while frame is not None:
+         code = frame.f_code
+         stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+         if case == Profiler.NO_CASE and self.cases and code.co_argcount > 0 and code.co_varnames[0] == "self":
+            case = self.cases.get(id(frame.f_locals.get("self")), Profiler.NO_CASE)
+         frame = frame.f_back
+      stack.append(case)
+      stack.reverse()
+      key = ";".join(stack)
+      self.stacks[key] = self.stacks.get(key, 0) + 1
+
+
+   def writeProfiles(self):
+      stats = None
+      casedir = self.filename + ".cases"
+      for key, profile in sorted(self.profiles.items()):
+         profile.create_stats()
+         if not profile.stats:
+            continue
+         if stats is None:
+            stats = pstats.Stats(profile)
+         else:
+            stats.add(profile)
+         if key != Profiler.NO_CASE:
+            if not os.path.exists(casedir):
+               os.makedirs(casedir)
+            profile.dump_stats(os.path.join(casedir, "%s.pstats" % key))
+      if stats is not None:
+         stats.dump_stats(self.filename)
+         print "Profile written to %s (per test case profiles to %s)" % (self.filename, casedir)
+
+
+   def writeStacks(self):
+      f = open(self.filename, 'w')
+      for key, count in sorted(self.stacks.items()):
+         f.write("%s %d\n" % (key, count))
+      f.close()
+      print "Profile samples (collapsed stacks) written to %s" % self.filename
+
+
+
+def startProfiler(filename, mode = "cprofile"):
+   global activeProfiler
+   activeProfiler = Profiler(filename, mode)
+   activeProfiler.start()
+   return activeProfiler
+
+
+def stopProfiler():
+   global activeProfiler
+   if activeProfiler is not None:
+      activeProfiler.stop()
+      activeProfiler = None
+
+
+def caseStarted(proto, caseId):
+   """
+   Attribute profile of the reactor thread to test case run by protocol.
+   """
+   if activeProfiler is not None:
+      activeProfiler.caseStarted(proto, caseId)
+
+
+def caseEnded(proto):
+   if activeProfiler is not None:
+      activeProfiler.caseEnded(proto)
+
+
+def profilerArgs(suffix):
+   """
+   Get wstest command line arguments to profile a child process like this
+   one, writing to profiler output file name with suffix.
+   """
+   if activeProfiler is None:
+      return []
+   return ["--profile", activeProfiler.filename + suffix, "--profiler", activeProfiler.mode]
@@ -24,6 +24,9 @@ __all__ = ("CSS_COMMON",
            "CSS_MASTER_REPORT",
            "CSS_DETAIL_REPORT",
            "JS_MASTER_REPORT",
+           "JS_CASE_DETAIL",
+           "HTML_BUNDLE_VIEWER",
+           "HTML_MATRIX_VIEWER",
            "HtmlReport")
 
 ## TODO: Move the constants to jinja2 template files
@@ -169,6 +172,17 @@ table#agent_case_results {
    margin-bottom: 40px;
 }
 
+table#agent_latencies {
+   margin-left: 20px;
+   margin-right: 20px;
+   margin-bottom: 40px;
+}
+
+td.latency {
+   background-color: #666;
+   text-align: right;
+}
+
 td.outcome_desc {
    width: 100%;
    color: #333;
@@ -415,6 +429,449 @@ function toggleClose() {
 }
 """
 
+## JavaScript for rendering case detail records (case detail report JSON)
+## in report viewer pages
+##
+JS_CASE_DETAIL = """
+function esc(s) {
+   return String(s).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+
+var CLASSES = {"OK": "case_ok", "NON-STRICT": "case_non_strict", "INFORMATIONAL": "case_info",
+               "UNIMPLEMENTED": "case_unimplemented", "NO_CLOSE": "case_no_close"};
+
+var TIMING_PHASES = ["tcpConnect", "openingHandshake", "firstFrame", "closingHandshake", "tcpClose"];
+var TIMING_EVENTS = ["connecting", "connected", "upgradeRequest", "upgradeResponse", "open", "firstFrame", "closeSent", "closeReceived", "closed"];
+
+function renderCase(c) {
+   var h = '<br/><hr/><p class="case ' + (CLASSES[c.behavior] || "case_failed") + '">' + esc(c.agent) + ' - <b>Case ' + esc(c.id) + '</b> : ' + esc(c.behavior) + ' - <b>' + c.duration + '</b> ms @ ' + esc(c.started) + '</p>';
+   h += '<p class="case_text_block case_desc"><b>Case Description</b><br/><br/>' + c.description + '</p>';
+   h += '<p class="case_text_block case_expect"><b>Case Expectation</b><br/><br/>' + c.expectation + '</p>';
+   h += '<p class="case_text_block case_outcome"><b>Case Outcome</b><br/><br/>' + esc(c.result) + '<br/><br/><i>Expected:</i><br/><span class="case_pickle">' + esc(JSON.stringify(c.expected)) + '</span><br/><br/><i>Observed:</i><br/><span class="case_pickle">' + esc(JSON.stringify(c.received)) + '</span></p>';
+   h += '<p class="case_text_block case_closing_beh"><b>Case Closing Behavior</b><br/><br/>' + esc(c.resultClose) + ' (' + esc(c.behaviorClose) + ')</p>';
+   if (c.throughput) {
+      var keys = Object.keys(c.throughput).sort();
+      h += '<h2>Throughput</h2><table><tr class="stats_header">';
+      keys.forEach(function (k) { h += '<td>' + esc(k) + '</td>'; });
+      h += '</tr><tr class="stats_row">';
+      keys.forEach(function (k) { h += '<td>' + (c.throughput[k] % 1 ? c.throughput[k].toFixed(3) : c.throughput[k]) + '</td>'; });
+      h += '</tr></table>';
+   }
+   if (c.timings) {
+      h += '<h2>Timings</h2>';
+      [["Phases", TIMING_PHASES, c.timings.phases], ["Events (since connecting)", TIMING_EVENTS, c.timings.events]].forEach(function (t) {
+         h += '<h3>' + t[0] + '</h3><table><tr class="stats_header">';
+         t[1].forEach(function (k) { h += '<td>' + esc(k) + '</td>'; });
+         h += '</tr><tr class="stats_row">';
+         t[1].forEach(function (k) { h += '<td>' + (t[2][k] == null ? '-' : t[2][k].toFixed(3) + ' ms') + '</td>'; });
+         h += '</tr></table>';
+      });
+   }
+   if (c.rtt && c.rtt.count > 0) {
+      h += '<h2>Round Trip Times</h2><table><tr class="stats_header"><td>Count</td><td>Min</td><td>p50</td><td>p90</td><td>p99</td><td>p99.9</td><td>Max</td></tr><tr class="stats_row"><td>' + c.rtt.count + '</td>';
+      ["min", "p50", "p90", "p99", "p999", "max"].forEach(function (k) { h += '<td>' + (c.rtt[k] / 1000).toFixed(3) + ' ms</td>'; });
+      h += '</tr></table>';
+   }
+   h += '<h2>Opening Handshake</h2><pre class="http_dump">' + esc(c.httpRequest) + '</pre><pre class="http_dump">' + esc(c.httpResponse) + '</pre>';
+   h += '<h2>Wire Log</h2><div id="wirelog">';
+   for (var i = 0; i < c.wirelog.length; ++i) {
+      h += '<pre class="wirelog_delay">' + esc(JSON.stringify(c.wirelog[i])) + '</pre>';
+   }
+   h += '</div>';
+   return h;
+}
+"""
+
+## HTML page for viewing report bundles. This reads the central directory
+## of the bundle ZIP file (ZIP64 included), and loads (and inflates) case
+## detail records on demand, using HTTP range requests. When the server
+## does not support those, the whole bundle is loaded once.
+##
+## Template vars:
+##    css => str => CSS_COMMON + CSS_MASTER_REPORT + CSS_DETAIL_REPORT
+##    js => str => JS_CASE_DETAIL
+##    bundle => str => bundle file name
+##
+HTML_BUNDLE_VIEWER = """<!DOCTYPE html>
+<html>
+   <head>
+      <meta charset="utf-8" />
+      <style lang="css">%(css)s</style>
+   </head>
+   <body>
+      <div id="master_report_header" class="block">
+         <p id="intro">Autobahn WebSocket Testsuite Report (bundle <b>%(bundle)s</b>).
+         This page needs to be served via HTTP, e.g. <i>twistd -n web --path .</i> in its directory.</p>
+      </div>
+      <table id="agent_case_results"></table>
+      <div id="case_detail"></div>
+      <script language="javascript">%(js)s</script>
+      <script language="javascript">
+
+var whole = null; // the whole bundle, when the server does not do range requests
+var entries = {};
+
+function u16(b, i) { return b[i] | (b[i + 1] << 8); }
+function u32(b, i) { return (b[i] | (b[i + 1] << 8) | (b[i + 2] << 16)) + b[i + 3] * 16777216; }
+function u64(b, i) { return u32(b, i) + u32(b, i + 4) * 4294967296; }
+
+function loadWhole() {
+   whole = fetch("%(bundle)s").then(function (r) {
+      if (!r.ok) {
+         throw new Error("could not load bundle (" + r.status + ")");
+      }
+      return r.arrayBuffer();
+   }).then(function (buf) { return new Uint8Array(buf); });
+}
+
+// octets [start, end) of the bundle
+function getRange(start, end) {
+   if (whole) {
+      return whole.then(function (b) { return b.subarray(start, end); });
+   }
+   return fetch("%(bundle)s", {headers: {"Range": "bytes=" + start + "-" + (end - 1)}}).then(function (r) {
+      if (!r.ok) {
+         throw new Error("could not load bundle (" + r.status + ")");
+      }
+      if (r.status != 206) {
+         loadWhole();
+         return getRange(start, end);
+      }
+      return r.arrayBuffer().then(function (buf) { return new Uint8Array(buf); });
+   });
+}
+
+function readEntry(name) {
+   var e = entries[name];
+   return getRange(e.offset, e.offset + 30).then(function (h) {
+      var start = e.offset + 30 + u16(h, 26) + u16(h, 28);
+      return getRange(start, start + e.size);
+   }).then(function (b) {
+      var data = new Blob([b]);
+      if (e.method == 8) {
+         return new Response(data.stream().pipeThrough(new DecompressionStream("deflate-raw"))).json();
+      }
+      return new Response(data).json();
+   });
+}
+
+function readDirectory() {
+   // end of central directory record (followed by a comment of up to 64k),
+   // preceded by the ZIP64 end of central directory locator for ZIP64
+   return fetch("%(bundle)s", {method: "HEAD"}).then(function (r) {
+      if (!r.ok) {
+         throw new Error("could not load bundle (" + r.status + ")");
+      }
+      if (r.headers.get("Accept-Ranges") != "bytes") {
+         loadWhole();
+      }
+      var size = parseInt(r.headers.get("Content-Length"), 10);
+      return getRange(Math.max(size - (65536 + 22 + 20), 0), size);
+   }).then(function (b) {
+      var eocd = b.length - 22;
+      while (eocd >= 0 && u32(b, eocd) != 0x06054b50) --eocd;
+      if (eocd < 0) {
+         throw new Error("bundle is not a ZIP file");
+      }
+      if (eocd >= 20 && u32(b, eocd - 20) == 0x07064b50) {
+         var p64 = u64(b, eocd - 12);
+         return getRange(p64, p64 + 56).then(function (r) {
+            return {count: u64(r, 32), length: u64(r, 40), offset: u64(r, 48)};
+         });
+      }
+      return {count: u16(b, eocd + 10), length: u32(b, eocd + 12), offset: u32(b, eocd + 16)};
+   }).then(function (dir) {
+      return getRange(dir.offset, dir.offset + dir.length).then(function (b) {
+         var p = 0;
+         for (var i = 0; i < dir.count; ++i) {
+            var len = u16(b, p + 28);
+            var extra = u16(b, p + 30);
+            var name = new TextDecoder().decode(b.subarray(p + 46, p + 46 + len));
+            var e = {method: u16(b, p + 10), size: u32(b, p + 20), offset: u32(b, p + 42)};
+
+            // ZIP64 extended information extra field, holding the values
+            // which do not fit the central directory header
+            var x = p + 46 + len;
+            while (x + 4 <= p + 46 + len + extra) {
+               if (u16(b, x) == 0x0001) {
+                  var v = x + 4;
+                  if (u32(b, p + 24) == 0xffffffff) { v += 8; }
+                  if (e.size == 0xffffffff) { e.size = u64(b, v); v += 8; }
+                  if (e.offset == 0xffffffff) { e.offset = u64(b, v); }
+               }
+               x += 4 + u16(b, x + 2);
+            }
+
+            entries[name] = e;
+            p += 46 + len + extra + u16(b, p + 32);
+         }
+      });
+   });
+}
+
+function caseKey(id) {
+   return id.split(".").map(function (x) { return ("0000" + x).slice(-4); }).join(".");
+}
+
+function showCase(file) {
+   readEntry(file).then(function (c) {
+      document.getElementById("case_detail").innerHTML = renderCase(c);
+      document.getElementById("case_detail").scrollIntoView();
+   });
+}
+
+function showIndex(index) {
+   var agents = Object.keys(index).sort();
+   var cases = {};
+   agents.forEach(function (a) { Object.keys(index[a]).forEach(function (c) { cases[c] = true; }); });
+   var h = '<tr class="case_category_row"><td class="case_category">Case</td>';
+   agents.forEach(function (a) { h += '<td class="agent">' + esc(a) + '</td>'; });
+   h += '</tr>';
+   Object.keys(cases).sort(function (x, y) { return caseKey(x) < caseKey(y) ? -1 : 1; }).forEach(function (c) {
+      h += '<tr class="agent_case_result_row"><td class="case">Case ' + esc(c) + '</td>';
+      agents.forEach(function (a) {
+         var r = index[a][c];
+         if (r) {
+            h += '<td class="' + (CLASSES[r.behavior] || "case_failed") + '"><a href="#" data-file="' + esc(r.reportfile) + '" onclick="showCase(this.dataset.file); return false;">' + esc(r.behavior) + '</a><br/><span class="case_duration">' + r.duration + ' ms / ' + esc(r.remoteCloseCode) + '</span></td>';
+         } else {
+            h += '<td class="case_missing">Missing</td>';
+         }
+      });
+      h += '</tr>';
+   });
+   document.getElementById("agent_case_results").innerHTML = h;
+}
+
+readDirectory().then(function () { return readEntry("index.json"); }).then(showIndex);
+
+      </script>
+   </body>
+</html>
+"""
+
+
+## HTML page for viewing the master report result matrix. Only the table
+## rows scrolled into view are rendered, and case detail records are loaded
+## from the case detail report JSON files on demand.
+##
+## Template vars:
+##    css => str => CSS_COMMON + CSS_MASTER_REPORT + CSS_DETAIL_REPORT
+##    js => str => JS_CASE_DETAIL
+##    matrix => str => result matrix file name
+##
+HTML_MATRIX_VIEWER = """<!DOCTYPE html>
+<html>
+   <head>
+      <meta charset="utf-8" />
+      <style lang="css">%(css)s</style>
+      <style lang="css">
+#matrix_view {
+   height: 75vh;
+   overflow: auto;
+   position: relative;
+}
+
+#agent_case_results {
+   table-layout: fixed;
+}
+
+#agent_case_results td {
+   height: 24px;
+   white-space: nowrap;
+   overflow: hidden;
+   text-overflow: ellipsis;
+}
+
+#agent_case_results thead td {
+   position: sticky;
+   top: 0;
+}
+
+#matrix_filter select {
+   margin-right: 20px;
+}
+      </style>
+   </head>
+   <body>
+      <div id="master_report_header" class="block">
+         <p id="intro">Autobahn WebSocket Testsuite Report (result matrix <b>%(matrix)s</b>).
+         This page needs to be served via HTTP, e.g. <i>python -m SimpleHTTPServer</i> in its directory.</p>
+         <p id="matrix_filter">
+            Category <select id="filter_category" onchange="filter();"><option value="">All</option></select>
+            Agent <select id="filter_agent" onchange="filter();"><option value="">All</option></select>
+            Outcome <select id="filter_outcome" onchange="filter();"><option value="">All</option></select>
+            <span id="filter_count"></span>
+         </p>
+      </div>
+      <table id="agent_latencies"></table>
+      <div id="matrix_view" onscroll="render();">
+         <table id="agent_case_results">
+            <thead id="matrix_head"></thead>
+            <tbody id="matrix_body"></tbody>
+         </table>
+      </div>
+      <div id="case_detail"></div>
+      <script language="javascript">%(js)s</script>
+      <script language="javascript">
+
+var ROW_HEIGHT = 26;
+
+var LABELS = {"OK": "Pass", "NON-STRICT": "Non-Strict", "NO_CLOSE": "No Close", "INFORMATIONAL": "Info", "UNIMPLEMENTED": "Unimplemented"};
+var CLOSE_CLASSES = {"OK": "case_ok", "FAILED BY CLIENT": "case_almost", "WRONG CODE": "case_non_strict", "INFORMATIONAL": "case_info"};
+
+var matrix = null;
+var rows = [];
+var columns = [];
+
+function label(cell) {
+   return cell ? (LABELS[matrix.behaviors[cell[0]]] || "Fail") : "Missing";
+}
+
+function renderCell(i, a) {
+   var cell = matrix.results[i][a];
+   if (!cell) {
+      return '<td class="case_missing">Missing</td><td class="case_missing"></td>';
+   }
+   var b = matrix.behaviors[cell[0]];
+   var bc = matrix.behaviors[cell[1]];
+   var file = matrix.files[a] + "_case_" + matrix.cases[i].replace(/\./g, "_") + ".json";
+   var h = '<td class="' + (CLASSES[b] || "case_failed") + '"><a href="#" data-file="' + esc(file) + '" onclick="showCase(this.dataset.file); return false;">' + label(cell) + '</a> <span class="case_duration">' + cell[3] + ' ms</span></td>';
+   if (bc in CLOSE_CLASSES) {
+      h += '<td class="close ' + CLOSE_CLASSES[bc] + '"><span class="close_code">' + esc(cell[2]) + '</span></td>';
+   } else {
+      h += '<td class="close case_failed"><span class="close_code">' + (bc == "UNCLEAN" ? "Unclean" : "Fail") + '</span></td>';
+   }
+   return h;
+}
+
+function render() {
+   var view = document.getElementById("matrix_view");
+   var first = Math.max(0, Math.floor(view.scrollTop / ROW_HEIGHT) - 10);
+   var last = Math.min(rows.length, first + Math.ceil(view.clientHeight / ROW_HEIGHT) + 20);
+   var h = '<tr style="height: ' + first * ROW_HEIGHT + 'px"></tr>';
+   for (var r = first; r < last; ++r) {
+      var row = rows[r];
+      if (typeof row == "string") {
+         h += '<tr class="case_subcategory_row"><td class="case_subcategory" colspan="' + (2 * columns.length + 1) + '">' + esc(row) + '</td></tr>';
+      } else {
+         h += '<tr class="agent_case_result_row"><td class="case">Case ' + esc(matrix.cases[row]) + '</td>';
+         for (var j = 0; j < columns.length; ++j) {
+            h += renderCell(row, columns[j]);
+         }
+         h += '</tr>';
+      }
+   }
+   h += '<tr style="height: ' + (rows.length - last) * ROW_HEIGHT + 'px"></tr>';
+   document.getElementById("matrix_body").innerHTML = h;
+}
+
+function filter() {
+   var category = document.getElementById("filter_category").value;
+   var agent = document.getElementById("filter_agent").value;
+   var outcome = document.getElementById("filter_outcome").value;
+
+   columns = [];
+   for (var a = 0; a < matrix.agents.length; ++a) {
+      if (agent === "" || agent == a) {
+         columns.push(a);
+      }
+   }
+
+   var h = '<tr class="case_category_row"><td class="case_category">Case</td>';
+   for (var j = 0; j < columns.length; ++j) {
+      h += '<td class="agent" colspan="2">' + esc(matrix.agents[columns[j]]) + '</td>';
+   }
+   h += '</tr>';
+   document.getElementById("matrix_head").innerHTML = h;
+
+   rows = [];
+   var count = 0;
+   var lastSubCategory = null;
+   for (var i = 0; i < matrix.cases.length; ++i) {
+      var id = matrix.cases[i].split(".");
+      if (category !== "" && id[0] != category) {
+         continue;
+      }
+      if (outcome !== "") {
+         var match = false;
+         for (var j = 0; j < columns.length; ++j) {
+            if (label(matrix.results[i][columns[j]]) == outcome) {
+               match = true;
+            }
+         }
+         if (!match) {
+            continue;
+         }
+      }
+      var sub = id[0] + "." + id[1];
+      if (sub != lastSubCategory) {
+         rows.push(id[0] + " " + (matrix.categories[id[0]] || "Misc") + " / " + sub + " " + (matrix.subcategories[sub] || ""));
+         lastSubCategory = sub;
+      }
+      rows.push(i);
+      ++count;
+   }
+   document.getElementById("filter_count").innerHTML = count + " of " + matrix.cases.length + " cases";
+   document.getElementById("matrix_view").scrollTop = 0;
+   render();
+}
+
+function addOptions(id, options) {
+   var select = document.getElementById(id);
+   for (var i = 0; i < options.length; ++i) {
+      var o = document.createElement("option");
+      o.value = options[i][0];
+      o.text = options[i][1];
+      select.appendChild(o);
+   }
+}
+
+function showCase(file) {
+   fetch(file).then(function (r) { return r.json(); }).then(function (c) {
+      document.getElementById("case_detail").innerHTML = renderCase(c);
+      document.getElementById("case_detail").scrollIntoView();
+   });
+}
+
+function renderLatencies(m) {
+   var phases = [["openingHandshake", "Opening Handshake"], ["closingHandshake", "Closing Handshake"], ["tcpClose", "TCP Close"]];
+   var h = '<tr class="case_category_row"><td class="case_category">Mean Latencies</td><td class="agent">Cases</td>';
+   phases.forEach(function (p) { h += '<td class="agent">' + p[1] + '</td>'; });
+   h += '</tr>';
+   m.agents.forEach(function (a, i) {
+      var l = m.latencies[i];
+      h += '<tr><td class="case">' + esc(a) + '</td><td class="latency">' + l.cases + '</td>';
+      phases.forEach(function (p) { h += '<td class="latency">' + (l[p[0]] == null ? '-' : l[p[0]].toFixed(3) + ' ms') + '</td>'; });
+      h += '</tr>';
+   });
+   document.getElementById("agent_latencies").innerHTML = h;
+}
+
+fetch("%(matrix)s").then(function (r) { return r.json(); }).then(function (m) {
+   matrix = m;
+   if (m.latencies) {
+      renderLatencies(m);
+   }
+   var categories = [];
+   var seen = {};
+   for (var i = 0; i < m.cases.length; ++i) {
+      var c = m.cases[i].split(".")[0];
+      if (!seen[c]) {
+         categories.push([c, c + " " + (m.categories[c] || "Misc")]);
+         seen[c] = true;
+      }
+   }
+   addOptions("filter_category", categories);
+   addOptions("filter_agent", m.agents.map(function (a, i) { return [i, a]; }));
+   addOptions("filter_outcome", ["Pass", "Non-Strict", "Fail", "No Close", "Info", "Unimplemented", "Missing"].map(function (o) { return [o, o]; }));
+   filter();
+});
+
+      </script>
+   </body>
+</html>
+"""
+
 
 REPORT_DIR_PERMISSIONS = 0770
 
@@ -124,7 +124,18 @@ SPEC_MASSCONNECT = """
       "connections": 10000,
       "batchsize": 100,
       "batchdelay": 10,
-      "retrydelay": 10
+      "retrydelay": 10,
+      "hold": {
+         "duration": 0,
+         "connections": 100,
+         "rate": 1,
+         "probe": "ping",
+         "timeout": 5000
+      },
+      "churn": {
+         "duration": 0,
+         "rate": 0.1
+      }
    },
    "servers":  [
                   {
@@ -18,8 +18,10 @@
 
 __all__ = ['startClient', 'startServer']
 
+import pkg_resources
 
-from twisted.internet import reactor
+from twisted.internet import reactor, ssl
+from twisted.internet.defer import Deferred
 from twisted.web.server import Site
 from twisted.web.static import File
 
@@ -35,15 +37,25 @@ from autobahn.twisted.websocket import WebSocketServerFactory, \
 
 from autobahn.websocket.compress import *
 
+from autobahntestsuite.metrics import WebSocketMetrics, MetricsResource
+
 
 
 class TesteeServerProtocol(WebSocketServerProtocol):
 
+   def connectionMade(self):
+      WebSocketServerProtocol.connectionMade(self)
+      self.factory.metrics.connectionMade(self)
+
+   def connectionLost(self, reason):
+      self.factory.metrics.connectionLost(self)
+      WebSocketServerProtocol.connectionLost(self, reason)
+
    def onMessage(self, payload, isBinary):
       self.sendMessage(payload, isBinary)
 
 
-class StreamingTesteeServerProtocol(WebSocketServerProtocol):
+class StreamingTesteeServerProtocol(TesteeServerProtocol):
 
    def onMessageBegin(self, isBinary):
       #print "onMessageBegin"
@@ -98,31 +110,42 @@ class TesteeServerFactory(WebSocketServerFactory):
 
       self.setProtocolOptions(perMessageCompressionAccept = accept)
 
+      ## metrics served at /metrics on the web port
+      ##
+      self.metrics = WebSocketMetrics()
+
 
 
 class TesteeClientProtocol(WebSocketClientProtocol):
 
    def onOpen(self):
-      if self.factory.endCaseId is None:
+      client = self.factory.client
+      if client.endCaseId is None:
          print "Getting case count .."
-      elif self.factory.currentCaseId <= self.factory.endCaseId:
-         print "Running test case %d/%d as user agent %s on peer %s" % (self.factory.currentCaseId, self.factory.endCaseId, self.factory.agent, self.peer)
+      elif self.factory.caseId is not None:
+         print "Running test case %d/%d as user agent %s on peer %s" % (self.factory.caseId, client.endCaseId, client.agent, self.peer)
 
    def onMessage(self, msg, binary):
-      if self.factory.endCaseId is None:
-         self.factory.endCaseId = int(msg)
-         print "Ok, will run %d cases" % self.factory.endCaseId
+      client = self.factory.client
+      if client.endCaseId is None:
+         client.endCaseId = int(msg)
+         print "Ok, will run %d cases" % client.endCaseId
       else:
          self.sendMessage(msg, binary)
 
 
 
 class TesteeClientFactory(WebSocketClientFactory):
+   """
+   Testee client factory for a single connection to the fuzzing server,
+   requesting the given resource. Concurrent connections each have their
+   own factory, since the opening handshake request is built from it.
+   """
 
    protocol = TesteeClientProtocol
 
-   def __init__(self, url, debug = False, ident = None):
-      WebSocketClientFactory.__init__(self, url, useragent = ident, debug = debug, debugCodePaths = debug)
+   def __init__(self, client, resource, done, caseId = None):
+      WebSocketClientFactory.__init__(self, client.url, useragent = client.ident, debug = client.debug, debugCodePaths = client.debug)
       self.setProtocolOptions(failByDrop = False) # spec conformance
 
       ## enable permessage-XXX compression extensions
@@ -143,38 +166,93 @@ class TesteeClientFactory(WebSocketClientFactory):
 
       self.setProtocolOptions(perMessageCompressionAccept = accept)
 
+      self.client = client
+      self.resource = resource
+      self.done = done
+      self.caseId = caseId
 
-      self.endCaseId = None
-      self.currentCaseId = 0
+   def clientConnectionLost(self, connector, reason):
+      self.done(False)
+
+   def clientConnectionFailed(self, connector, reason):
+      print "Connection to %s failed (%s)" % (self.url, reason.getErrorMessage())
+      self.done(True)
+
+
+
+class TesteeClient:
+   """
+   Testee client: gets the number of test cases from the fuzzing server, runs
+   those (keeping up to concurrency connections open at once), and then has
+   the fuzzing server update its reports.
+   """
+
+   def __init__(self, url, debug = False, ident = None, concurrency = 1):
+      self.url = url
+      self.debug = debug
+      self.ident = ident
+
+      ## number of test case connections kept open at once
+      ##
+      self.concurrency = max(1, concurrency)
 
-      self.updateReports = True
       if ident is not None:
          self.agent = ident
       else:
          self.agent = "AutobahnPython/%s" % autobahn.version
-      self.resource = "/getCaseCount"
 
-   def clientConnectionLost(self, connector, reason):
-      self.currentCaseId += 1
-      if self.currentCaseId <= self.endCaseId:
-         self.resource = "/runCase?case=%d&agent=%s" % (self.currentCaseId, self.agent)
-         connector.connect()
-      elif self.updateReports:
-         self.resource = "/updateReports?agent=%s" % self.agent
-         self.updateReports = False
-         connector.connect()
+      self.endCaseId = None
+      self.nextCaseId = 1
+      self.casesDone = 0
+
+      ## fires when done
+      ##
+      self.d = Deferred()
+
+   def connect(self, resource, done, caseId = None):
+      connectWS(TesteeClientFactory(self, resource, done, caseId))
+
+   def start(self):
+      self.connect("/getCaseCount", self.countDone)
+
+   def countDone(self, failed):
+      if failed:
+         self.d.callback(None)
       else:
-         reactor.stop()
+         if self.endCaseId is None:
+            self.endCaseId = 0
+         self.runCases()
+
+   def runCases(self):
+      """
+      Start connections for the next test cases, until the configured number
+      of connections is open, and update reports when all cases are done.
+      """
+      while self.nextCaseId <= self.endCaseId and self.nextCaseId - 1 - self.casesDone < self.concurrency:
+         caseId = self.nextCaseId
+         self.connect("/runCase?case=%d&agent=%s" % (caseId, self.agent), lambda failed, caseId = caseId: self.caseDone(caseId, failed), caseId)
+         self.nextCaseId += 1
+
+      ## update reports only after all test cases have finished
+      ##
+      if self.casesDone == self.endCaseId:
+         self.connect("/updateReports?agent=%s" % self.agent, self.reportsDone)
 
-   def clientConnectionFailed(self, connector, reason):
-      print "Connection to %s failed (%s)" % (self.url, reason.getErrorMessage())
-      reactor.stop()
+   def caseDone(self, caseId, failed):
+      if failed:
+         print "Dropping test case %d" % caseId
+      self.casesDone += 1
+      self.runCases()
+
+   def reportsDone(self, failed):
+      self.d.callback(None)
 
 
 
-def startClient(wsuri, ident = None, debug = False):
-   factory = TesteeClientFactory(wsuri, ident = ident, debug = debug)
-   connectWS(factory)
+def startClient(wsuri, ident = None, debug = False, concurrency = 1):
+   client = TesteeClient(wsuri, ident = ident, debug = debug, concurrency = concurrency)
+   client.d.addCallback(lambda _: reactor.stop())
+   client.start()
    return True
 
 
@@ -189,6 +267,7 @@ def startServer(wsuri, webport = None, sslKey = None, sslCert = None, debug = Fa
 
    if webport:
       webdir = File(pkg_resources.resource_filename("autobahntestsuite", "web/echoserver"))
+      webdir.putChild('metrics', MetricsResource(factory.metrics))
       web = Site(webdir)
       reactor.listenTCP(webport, web)
 
@@ -0,0 +1,55 @@
+import os
+from twisted.trial import unittest
+from autobahntestsuite.bundle import ReportBundle
+from autobahntestsuite.wirelog import WireLog
+
+
+class TestReportBundle(unittest.TestCase):
+    """
+    This test case checks writing and reading report bundles.
+    """
+
+    def testRoundtrip(self):
+        """
+        Case records and the index should read back after a flush, and
+        the last record written for an entry should win.
+        """
+        filename = self.mktemp()
+        wirelog = WireLog()
+        wirelog.append(("KL", 0.5))
+        bundle = ReportBundle(filename, 'w')
+        bundle.addCase("a_case_1_1_1.json", {"id": "1.1.1", "behavior": "FAILED", "wirelog": wirelog})
+        bundle.addCase("a_case_1_1_1.json", {"id": "1.1.1", "behavior": "OK", "wirelog": wirelog})
+        bundle.setIndex({"a": {"1.1.1": {"behavior": "OK"}}})
+        bundle.flush()
+        bundle.close()
+
+        bundle = ReportBundle(filename)
+        self.assertEquals(bundle.getIndex(), {"a": {"1.1.1": {"behavior": "OK"}}})
+        self.assertEquals(bundle.getCase("a_case_1_1_1.json"), {"id": "1.1.1", "behavior": "OK", "wirelog": [["KL", 0.5]]})
+        bundle.close()
+
+
+    def testCompaction(self):
+        """
+        Rewriting entries over and over should not grow the bundle without
+        bound, and the bundle should stay readable and writable.
+        """
+        filename = self.mktemp()
+        bundle = ReportBundle(filename, 'w')
+        sizes = []
+        for i in xrange(50):
+            bundle.addCase("a_case_1_1_1.json", {"id": "1.1.1", "run": i, "wirelog": [], "data": str(range(i, i + 200))})
+            bundle.setIndex({"a": {"1.1.1": {"run": i}}})
+            bundle.flush()
+            sizes.append(os.path.getsize(filename))
+        bundle.addCase("a_case_1_1_2.json", {"id": "1.1.2", "wirelog": []})
+        bundle.close()
+
+        self.assertTrue(max(sizes[10:]) < 3 * sizes[0])
+        bundle = ReportBundle(filename)
+        self.assertEquals(bundle.getIndex(), {"a": {"1.1.1": {"run": 49}}})
+        self.assertEquals(bundle.getCase("a_case_1_1_1.json")["run"], 49)
+        self.assertEquals(bundle.getCase("a_case_1_1_2.json"), {"id": "1.1.2", "wirelog": []})
+        self.assertTrue(len(bundle.zip.infolist()) < 3 * 3)
+        bundle.close()
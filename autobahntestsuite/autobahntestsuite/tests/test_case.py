@@ -0,0 +1,92 @@
+import hashlib
+from twisted.trial import unittest
+from autobahntestsuite.case import Case
+from autobahntestsuite.case.case import EventPayload
+
+
+class FakeProtocol:
+
+    def __init__(self):
+        self.closed = []
+
+    def sendClose(self, code):
+        self.closed.append(code)
+
+
+
+class TestCaseMatcher(unittest.TestCase):
+    """
+    This test case checks matching received events against expected outcomes.
+    """
+
+    def setUp(self):
+        self.p = FakeProtocol()
+        self.case = Case(self.p)
+        self.case.expectedClose = {"closedByMe": True, "closeCode": [1000], "requireClean": True}
+
+
+    def testMatch(self):
+        """
+        Received events should match an expected outcome only when complete,
+        and the closing handshake is started when all outcomes match.
+        """
+        payload = "*" * 1000
+        self.case.expected[Case.OK] = [("message", payload, False), ("pong", "ping")]
+        self.case.onMessage(payload, False)
+        self.assertEquals(self.case.matchReceived(), [])
+        self.case.onPong("ping")
+        self.assertEquals(self.case.matchReceived(), [Case.OK])
+        self.assertEquals(self.p.closed, [1000])
+        self.assertEquals(self.case.received[0], ("message", EventPayload(payload, Case.RECEIVED_PAYLOAD_LEN), False))
+        self.assertEquals(self.case.received[1], ("pong", "ping"))
+
+
+    def testMismatch(self):
+        """
+        Payloads and types should be compared exactly.
+        """
+        self.case.expected[Case.OK] = [("message", u"abc", False)]
+        self.case.expected[Case.NON_STRICT] = [("message", "abc", True)]
+        self.case.onMessage("abc", False)
+        self.assertEquals(self.case.matchReceived(), [])
+        self.assertEquals(self.p.closed, [])
+
+
+    def testDirectAppendAndChangedExpected(self):
+        """
+        Events appended to received directly and expected outcomes changed
+        after matching started should be taken into account.
+        """
+        self.case.expected[Case.OK] = [("timeout", "A")]
+        self.assertEquals(self.case.matchReceived(), [])
+        self.case.received.append(("timeout", "A"))
+        self.assertEquals(self.case.matchReceived(), [Case.OK])
+        self.case.expected[Case.OK].append(("timeout", "B"))
+        self.assertEquals(self.case.matchReceived(), [])
+        self.case.received.append(("timeout", "B"))
+        self.assertEquals(self.case.matchReceived(), [Case.OK])
+
+
+    def testPayloadKeys(self):
+        """
+        Received payloads should be kept as length, digest and prefix, and
+        compared by type, length and digest.
+        """
+        payload = "*" * 1000
+        self.case.onMessage(payload, False)
+        key = self.case.receivedKeys[0]
+        self.assertEquals((key[1].length, key[1].prefix), (1000, payload[:Case.RECEIVED_PAYLOAD_LEN]))
+        self.assertEquals(key, self.case.eventKey(("message", payload, False)))
+        self.assertNotEquals(key, self.case.eventKey(("message", payload[:-1] + "x", False)))
+        self.assertNotEquals(key, self.case.eventKey(("message", unicode(payload), False)))
+        self.assertNotEquals(EventPayload("abc", 2), ("abc",))
+
+
+    def testPayloadLogData(self):
+        """
+        Long payloads should be rendered as their prefix (a UTF-8 sequence cut
+        there replaced), length and digest.
+        """
+        payload = "a" + u"\u00e4".encode('utf8') * 100
+        self.assertEquals(EventPayload(payload, Case.RECEIVED_PAYLOAD_LEN).logData(),
+                          u"a" + u"\u00e4" * 31 + u"\ufffd ... [length 201, SHA1 %s]" % hashlib.sha1(payload).hexdigest())
@@ -0,0 +1,64 @@
+from twisted.trial import unittest
+from autobahntestsuite.caseset import CaseSet
+from autobahntestsuite.case import Cases, CaseCategories, CaseSubCategories
+
+
+class TestShardCases(unittest.TestCase):
+    """
+    This test case checks splitting test cases over workers.
+    """
+
+    def setUp(self):
+        self.caseset = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+
+
+    def testShardsBalanced(self):
+        """
+        Expensive cases should be spread over shards, and each shard
+        should keep case order.
+        """
+        costs = {"1.1.1": 1, "1.1.2": 1, "9.1.1": 10, "9.1.2": 10, "2.1": 1, "2.2": 1}
+        shards = self.caseset.shardCases(costs.keys(), costs, 2)
+        self.assertEquals(len(shards), 2)
+        self.assertEquals(sorted([sum([costs[c] for c in s]) for s in shards]), [12, 12])
+        for s in shards:
+            self.assertEquals(s, [self.caseset.caseIdTupletoId(t) for t in sorted([self.caseset.caseIdtoIdTuple(c) for c in s])])
+        self.assertEquals(sorted(shards[0] + shards[1]), sorted(costs.keys()))
+
+
+    def testFewerCasesThanShards(self):
+        """
+        No empty shards should be returned.
+        """
+        costs = {"1.1.1": 1}
+        self.assertEquals(self.caseset.shardCases(costs.keys(), costs, 4), [["1.1.1"]])
+
+
+
+class TestOptInCases(unittest.TestCase):
+    """
+    This test case checks opt-in cases are only run when asked for.
+    """
+
+    def setUp(self):
+        self.caseset = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+
+
+    def testNotInDefaultSet(self):
+        """
+        "*" should not select the throughput cases 14.x and 15.x.
+        """
+        cases = self.caseset.parseSpecCases({"cases": ["*"]})
+        self.assertIn("9.1.1", cases)
+        self.assertEquals([c for c in cases if c.split('.')[0] in ("14", "15")], [])
+
+
+    def testSelectedByCategoryOrId(self):
+        """
+        Patterns naming the category, and case ids should select opt-in cases.
+        """
+        cases = self.caseset.parseSpecCases({"cases": ["14.1.*", "15.2.3"], "exclude-cases": ["14.1.2"]})
+        self.assertEquals(cases[0], "14.1.1")
+        self.assertNotIn("14.1.2", cases)
+        self.assertIn("15.2.3", cases)
+        self.assertEquals(len(cases), len([c for c in self.caseset.CasesIndices if c.startswith("14.1.")]))
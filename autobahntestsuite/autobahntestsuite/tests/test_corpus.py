@@ -0,0 +1,53 @@
+import hashlib
+from twisted.trial import unittest
+from autobahntestsuite.case.case12_x_x import WS_COMPRESSION_TESTDATA, TestCorpus, getTestCorpus
+
+
+class TestCorpusMessages(unittest.TestCase):
+    """
+    This test case checks cutting messages from the 12.x/13.x test data.
+    """
+
+    def testTextWrapAround(self):
+        """
+        Text messages should have LEN characters, continue where the previous
+        one ended, and wrap around at the end of the data.
+        """
+        corpus = getTestCorpus(WS_COMPRESSION_TESTDATA['json_data1'])
+        text = corpus.text
+        length = 65536
+        ptr = 0
+        for i in range(5):
+            msg, digest = corpus.message(length, i)
+            end = (ptr + length) % len(text)
+            expected = text[ptr:end] if end > ptr else text[ptr:] + text[:end]
+            self.assertEquals(msg, expected.encode('utf-8'))
+            self.assertEquals(digest, hashlib.sha1(msg).digest())
+            ptr = end
+        self.assertEquals(ptr, (5 * length) % len(text))
+
+
+    def testWindowSlots(self):
+        """
+        Messages should be the same when not cached, and the windows cached
+        per message length should be bounded.
+        """
+        corpus = TestCorpus(WS_COMPRESSION_TESTDATA['html_data1'])
+        text = corpus.text
+        length = 1000
+        index = 3 * TestCorpus.WINDOW_SLOTS + 1
+        messages = [corpus.message(length, i) for i in [index, 1, index, 1]]
+        ptr = (index * length) % len(text)
+        self.assertEquals(messages[0][0], (text[ptr:] + text[:ptr])[:length].encode('utf-8'))
+        self.assertEquals(messages[1][0], text[length:2 * length].encode('utf-8'))
+        self.assertEquals(messages[2:], messages[:2])
+        self.assertEquals(len(corpus.windows[length]), TestCorpus.WINDOW_SLOTS)
+
+
+    def testShared(self):
+        """
+        Cases using the same test data should share the corpus.
+        """
+        td = WS_COMPRESSION_TESTDATA['lena512']
+        self.assertIdentical(getTestCorpus(td), getTestCorpus(dict(td)))
+        self.assertEquals(getTestCorpus(td).message(0, 3), ('', hashlib.sha1('').digest()))
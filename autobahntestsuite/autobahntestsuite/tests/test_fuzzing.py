@@ -0,0 +1,593 @@
+import json, os
+from twisted.trial import unittest
+from twisted.internet import reactor, protocol
+from twisted.internet.defer import Deferred
+from autobahn.twisted.websocket import WebSocketClientFactory, WebSocketClientProtocol, connectWS
+from autobahntestsuite import fuzzing
+from autobahntestsuite.fuzzing import FuzzingFactory, FuzzingServerFactory, FuzzingClientFactory, FuzzingClientWorkers, ExclusiveGate, exportBundle, caseCost
+from autobahntestsuite.wirelog import WireLog
+from autobahntestsuite.caseset import CaseSet
+from autobahntestsuite.case import Case, Cases, CaseCategories, CaseSubCategories
+
+
+class TestMasterReportMatrix(unittest.TestCase):
+    """
+    This test case checks the master report result matrix.
+    """
+
+    def setUp(self):
+        self.outdir = self.mktemp()
+        os.makedirs(self.outdir)
+        self.factory = FuzzingFactory(self.outdir, "matrix")
+        self.factory.CaseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+
+
+    def index(self, agent, caseId, behavior, timings = None):
+        self.factory.indexCase({"agent": agent, "id": caseId, "behavior": behavior, "behaviorClose": Case.OK,
+                                "remoteCloseCode": 1000, "duration": 5, "reportTime": False,
+                                "reportCompressionRatio": False, "trafficStats": None, "timings": timings})
+
+
+    def testMatrix(self):
+        """
+        The matrix should have a row per case and a cell per agent, with
+        behaviors coded as index into the behaviors list.
+        """
+        self.index("Agent B", "1.1.1", Case.OK)
+        self.index("Agent A", "1.1.2", "SOMETHING ELSE")
+        self.factory.createMasterReportMatrix(self.outdir)
+        matrix = json.loads(open(os.path.join(self.outdir, FuzzingFactory.REPORT_MATRIX)).read())
+
+        self.assertEquals(matrix["agents"], ["Agent A", "Agent B"])
+        self.assertEquals(matrix["files"], ["agent_a", "agent_b"])
+        self.assertEquals(len(matrix["cases"]), len(Cases))
+        self.assertEquals(matrix["cases"][:2], ["1.1.1", "1.1.2"])
+
+        b = matrix["behaviors"]
+        self.assertEquals(matrix["results"][0], [None, [b.index(Case.OK), b.index(Case.OK), 1000, 5]])
+        self.assertEquals(matrix["results"][1], [[b.index("SOMETHING ELSE"), b.index(Case.OK), 1000, 5], None])
+        self.assertEquals(matrix["results"][2], [None, None])
+
+
+    def testLatencies(self):
+        """
+        Mean latencies per agent should only count cases where a phase
+        happened, and the matrix should have them per agent.
+        """
+        def timings(opening, closing):
+            return {"events": {}, "phases": {"openingHandshake": opening, "closingHandshake": closing, "tcpClose": None}}
+
+        self.index("Agent A", "1.1.1", Case.OK, timings(1., 2.))
+        self.index("Agent A", "1.1.2", Case.OK, timings(3., None))
+        self.index("Agent B", "1.1.1", Case.OK)
+        self.factory.createMasterReportMatrix(self.outdir)
+        matrix = json.loads(open(os.path.join(self.outdir, FuzzingFactory.REPORT_MATRIX)).read())
+
+        self.assertEquals(matrix["latencies"],
+                          [{"cases": 2, "openingHandshake": 2., "closingHandshake": 2., "tcpClose": None},
+                           {"cases": 1, "openingHandshake": None, "closingHandshake": None, "tcpClose": None}])
+
+
+
+class ClientDouble(object):
+    """
+    Stands in for the FuzzingClient a FuzzingClientFactory belongs to.
+    """
+
+    def __init__(self, cases, concurrency, exclusive = [], exclusiveScope = "client"):
+        self.spec = {}
+        self.CaseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+        self.specCases = cases
+        self.specExcludeAgentCases = {}
+        self.specExclusiveCases = set(exclusive)
+        self.exclusiveScope = exclusiveScope
+        self.gate = ExclusiveGate()
+        self.concurrency = concurrency
+        self.factories = []
+        self.d = Deferred()
+
+    def runCases(self):
+        for factory in self.factories:
+            factory.runCases()
+        if all(factory.done for factory in self.factories) and not self.d.called:
+            self.d.callback(None)
+
+
+class TestClientConnectionFailed(unittest.TestCase):
+    """
+    This test case checks a failed connection only drops its own case.
+    """
+
+    def testDropsOnlyFailedCase(self):
+        """
+        With no server listening, every case should be tried (and dropped)
+        exactly once, also with cases running concurrently.
+        """
+        port = reactor.listenTCP(0, protocol.Factory(), interface = "127.0.0.1")
+        url = "ws://127.0.0.1:%d" % port.getHost().port
+        d = port.stopListening()
+
+        client = ClientDouble(["1.1.1", "1.1.2", "1.1.3"], 2)
+        factory = FuzzingClientFactory(client, {"url": url, "agent": "A"})
+        client.factories = [factory]
+        finished = []
+        caseFinished = factory.caseFinished
+        def recordFinished():
+            finished.append(factory.currSpecCase)
+            caseFinished()
+        factory.caseFinished = recordFinished
+        d.addCallback(lambda _: client.runCases())
+
+        def check(_):
+            self.assertEquals(len(finished), 3)
+            self.assertEquals(factory.currSpecCase, 2)
+            self.assertEquals(factory.pendingCases, {})
+            self.assertEquals(factory.runningCases, 0)
+        return d.addCallback(lambda _: client.d).addCallback(check)
+
+
+
+class TestExclusiveCases(unittest.TestCase):
+    """
+    This test case checks exclusive cases are run alone.
+    """
+
+    def factories(self, client):
+        client.factories = [FuzzingClientFactory(client, {"url": "ws://127.0.0.1:%d" % port}) for port in (9001, 9002)]
+        started = []
+        for factory in client.factories:
+            factory.connectCase = lambda case, factory = factory: started.append((factory, factory.currentCaseId))
+        return client.factories, started
+
+
+    def testExclusiveAcrossServers(self):
+        """
+        By default, an exclusive case should only start when nothing else runs
+        against any server, and block further cases against all servers.
+        """
+        client = ClientDouble(["1.1.1", "9.1.1", "1.1.2"], 4, ["9.1.1"])
+        factories, started = self.factories(client)
+
+        client.runCases()
+        self.assertEquals(started, [(factories[0], "1.1.1")])
+
+        factories[0].caseFinished()
+        self.assertEquals(started[1:], [(factories[0], "9.1.1")])
+        self.assertTrue(client.gate.exclusive)
+
+        factories[0].caseFinished()
+        self.assertEquals(started[2:], [(factories[0], "1.1.2"), (factories[1], "1.1.1")])
+        self.assertEquals(client.gate.waiting, set([factories[1]]))
+
+        factories[0].caseFinished()
+        factories[1].caseFinished()
+        self.assertEquals(started[4:], [(factories[1], "9.1.1")])
+
+
+    def testExclusivePerServer(self):
+        """
+        With exclusive-scope "server", an exclusive case should only start when
+        nothing else runs against its server, and block further cases against
+        that server only.
+        """
+        client = ClientDouble(["1.1.1", "9.1.1", "1.1.2"], 4, ["9.1.1"], "server")
+        factories, started = self.factories(client)
+
+        factories[0].runCases()
+        self.assertEquals(started, [(factories[0], "1.1.1")])
+
+        factories[0].caseFinished()
+        self.assertEquals(started[1:], [(factories[0], "9.1.1"), (factories[1], "1.1.1")])
+        self.assertTrue(factories[0].gate.exclusive)
+        self.assertFalse(factories[1].gate.exclusive)
+
+
+
+def caseResults(agent, caseId, expected, received):
+    """
+    Case results as logged by FuzzingProtocol.
+    """
+    return {"agent": agent, "id": caseId, "description": "Description", "expectation": "Expectation",
+            "started": "2026-01-01T00:00:00Z", "duration": 5, "reportTime": False, "reportCompressionRatio": False,
+            "behavior": Case.OK, "behaviorClose": Case.OK, "expected": expected, "expectedClose": {"closedByMe": True},
+            "received": received, "result": "Result", "resultClose": "Result close",
+            "wirelog": WireLog(), "createWirelog": True, "closedByMe": True, "failedByMe": False, "droppedByMe": True,
+            "wasClean": True, "wasNotCleanReason": None, "wasServerConnectionDropTimeout": False,
+            "wasOpenHandshakeTimeout": False, "wasCloseHandshakeTimeout": False,
+            "localCloseCode": 1000, "localCloseReason": None, "remoteCloseCode": 1000, "remoteCloseReason": None,
+            "isServer": False, "createStats": True,
+            "rxOctetStats": {10: 1}, "rxFrameStats": {1: 1}, "txOctetStats": {20: 2}, "txFrameStats": {8: 1},
+            "httpRequest": "GET / HTTP/1.1", "httpResponse": "HTTP/1.1 101 Switching Protocols",
+            "trafficStats": None, "rtt": None, "throughput": None, "timings": None}
+
+
+class TestCaseReportRoundtrip(unittest.TestCase):
+    """
+    This test case checks case results read back from case detail reports.
+    """
+
+    EXPECTED = {Case.OK: [("message", u"0x1234", False), ("timeout", "A")],
+                Case.NON_STRICT: []}
+    RECEIVED = [("message", u"\u00e4bc", False), ("message", "0xff00 ...", True), ("ping", u"0x12"), ("timeout", "A")]
+
+    def setUp(self):
+        self.outdir = self.mktemp()
+        os.makedirs(self.outdir)
+
+
+    def check(self, case):
+        self.assertEquals(case["expected"], self.EXPECTED)
+        self.assertEquals(case["received"], self.RECEIVED)
+        for events, logged in [(case["received"], self.RECEIVED)] + [(case["expected"][k], self.EXPECTED[k]) for k in self.EXPECTED]:
+            self.assertEquals([map(type, e) for e in events], [map(type, e) for e in logged])
+        self.assertEquals(case["rxOctetStats"], {10: 1})
+
+
+    def testClassic(self):
+        """
+        Outcomes should read back with the string types they were logged with.
+        """
+        factory = FuzzingFactory(self.outdir)
+        factory.logCase(caseResults("Agent", "1.1.1", self.EXPECTED, self.RECEIVED))
+        self.check(factory.loadAgentCaseReportJSON("Agent", "1.1.1", self.outdir))
+
+
+    def testBundle(self):
+        """
+        Outcomes should read back the same from a report bundle exported to
+        the classic report layout.
+        """
+        factory = FuzzingFactory(self.outdir, "bundle")
+        factory.logCase(caseResults("Agent", "1.1.1", self.EXPECTED, self.RECEIVED))
+        factory.createReports()
+        factory.bundle.close()
+
+        exportdir = self.mktemp()
+        exportBundle(os.path.join(self.outdir, FuzzingFactory.REPORT_BUNDLE), exportdir)
+        self.check(FuzzingFactory(exportdir).loadAgentCaseReportJSON("Agent", "1.1.1", exportdir))
+        self.assertTrue(os.path.exists(os.path.join(exportdir, factory.makeAgentCaseReportFilename("Agent", "1.1.1", ext = 'html'))))
+
+
+    def testProduceJson(self):
+        """
+        Without JSON reports, case detail report JSON files should be removed
+        once rendered to HTML.
+        """
+        factory = FuzzingFactory(self.outdir)
+        factory.CaseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+        factory.logCase(caseResults("Agent", "1.1.1", self.EXPECTED, self.RECEIVED))
+        d = factory.createReports(produceJson = False)
+
+        def check(_):
+            files = sorted(os.listdir(self.outdir))
+            self.assertEquals(files, ["agent_case_1_1_1.html", "index.html"])
+        return d.addCallback(check)
+
+
+
+class TestIncrementalReports(unittest.TestCase):
+    """
+    This test case checks case detail reports are only rendered for cases
+    logged since the last report pass.
+    """
+
+    def setUp(self):
+        self.outdir = self.mktemp()
+        self.factory = FuzzingFactory(self.outdir)
+        self.factory.CaseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+
+
+    def rendered(self):
+        return sorted([f for f in os.listdir(self.outdir) if f.startswith("agent_case_") and f.endswith(".html")])
+
+
+    def testNewCasesOnly(self):
+        """
+        A report pass should not render cases rendered by an earlier pass again.
+        """
+        self.factory.logCase(caseResults("Agent", "1.1.1", {}, []))
+        self.factory.createReports()
+        os.remove(os.path.join(self.outdir, "agent_case_1_1_1.html"))
+        self.factory.logCase(caseResults("Agent", "1.1.2", {}, []))
+        self.factory.createReports()
+        self.assertEquals(self.rendered(), ["agent_case_1_1_2.html"])
+
+
+    def testRenderFailed(self):
+        """
+        Cases whose reports failed to render should be rendered on the next pass.
+        """
+        def fail(task):
+            raise IOError("disk full")
+        original = fuzzing.createAgentCaseReportsHTML
+        self.patch(fuzzing, "createAgentCaseReportsHTML", fail)
+
+        for caseId in ["1.1.1", "1.1.2"]:
+            self.factory.logCase(caseResults("Agent", caseId, {}, []))
+        d = self.factory.createReports()
+        self.assertFailure(d, IOError)
+
+        def retry(_):
+            self.assertEquals(self.rendered(), [])
+            self.assertEquals(self.factory.dirtyCases, set([("Agent", "1.1.1"), ("Agent", "1.1.2")]))
+            self.assertFalse(os.path.exists(os.path.join(self.outdir, "index.html")))
+            self.patch(fuzzing, "createAgentCaseReportsHTML", original)
+            return self.factory.createReports()
+
+        def check(_):
+            self.assertEquals(self.rendered(), ["agent_case_1_1_1.html", "agent_case_1_1_2.html"])
+            self.assertEquals(self.factory.dirtyCases, set())
+        return d.addCallback(retry).addCallback(check)
+
+
+
+class TestClientWorkers(unittest.TestCase):
+    """
+    This test case checks spreading cases over worker processes.
+    """
+
+    def testCaseCost(self):
+        """
+        Cases declaring the amount of data they send should cost in proportion.
+        """
+        caseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+        cost = lambda caseId: caseCost(caseSet.CasesById[caseId])
+        self.assertEquals(cost("1.1.1"), 1)
+        self.assertEquals(cost("9.1.1"), 66)
+        self.assertEquals(cost("9.5.2"), cost("9.5.1"))
+        self.assertTrue(cost("9.1.6") > cost("9.1.1"))
+        self.assertTrue(cost("9.7.6") > cost("9.7.1"))
+
+
+    def testMergeMissingReports(self):
+        """
+        Reports missing from a worker should not fail the merge: cases without
+        a JSON report are skipped, and missing HTML reports are created.
+        """
+        outdir = self.mktemp()
+        workdir = os.path.join(outdir, "worker1")
+        os.makedirs(workdir)
+
+        worker = FuzzingFactory(workdir)
+        worker.CaseSet = CaseSet("Autobahn Fuzzing", "Case", Cases, CaseCategories, CaseSubCategories)
+        for caseId in ["1.1.1", "1.1.2"]:
+            worker.logCase(caseResults("Agent", caseId, {}, []))
+        worker.createReports()
+        os.remove(os.path.join(workdir, "agent_case_1_1_1.html"))
+        os.remove(os.path.join(workdir, "agent_case_1_1_2.json"))
+
+        workers = FuzzingClientWorkers({"outdir": outdir, "cases": ["1.1.1", "1.1.2"], "servers": []}, 1)
+        workers.workdirs = [workdir]
+        d = workers.merge([(True, 1)])
+
+        def check(_):
+            self.assertEquals(sorted(os.listdir(outdir)), ["agent_case_1_1_1.html", "agent_case_1_1_1.json", "index.html", "index.json"])
+            self.assertEquals(workers.agents["Agent"].keys(), ["1.1.1"])
+        return d.addCallback(check)
+
+
+
+class ObserverProtocol(WebSocketClientProtocol):
+    """
+    Records messages received, and fires the factory's Deferred closed when
+    the connection closed.
+    """
+
+    def onOpen(self):
+        self.factory.proto = self
+
+
+    def onMessage(self, msg, binary):
+        self.factory.messages.append(json.loads(msg))
+        if self.factory.received:
+            self.factory.received.pop(0).callback(None)
+
+
+    def onClose(self, wasClean, code, reason):
+        self.factory.closed.callback(None)
+
+
+
+class EchoProtocol(ObserverProtocol):
+
+    def onMessage(self, msg, binary):
+        self.sendMessage(msg, binary)
+
+
+
+class FuzzingServerTestCase(unittest.TestCase):
+    """
+    Runs a fuzzing server (with a report pool of one process) for a test.
+    """
+
+    SPEC = {"url": "ws://127.0.0.1:0", "cases": ["1.1.1", "1.1.2"], "report-processes": 1}
+
+    def setUp(self):
+        self.outdir = self.mktemp()
+        spec = dict(self.SPEC)
+        spec["outdir"] = self.outdir
+        self.factory = FuzzingServerFactory(spec)
+        self.port = reactor.listenTCP(0, self.factory, interface = "127.0.0.1")
+
+
+    def tearDown(self):
+        d = self.port.stopListening()
+        d.addCallback(lambda _: self.factory.stopReportPool())
+        return d
+
+
+    def connect(self, path, protocol = ObserverProtocol):
+        """
+        Connect to the fuzzing server at given path.
+
+        :returns: WebSocketClientFactory -- The factory connected with.
+        """
+        factory = WebSocketClientFactory("ws://127.0.0.1:%d%s" % (self.port.getHost().port, path))
+        factory.protocol = protocol
+        factory.messages = []
+        factory.received = []
+        factory.closed = Deferred()
+        connectWS(factory)
+        return factory
+
+
+    def received(self, factory):
+        """
+        :returns: Deferred -- Fires when the next message was received on the
+                              connection of given factory.
+        """
+        d = Deferred()
+        factory.received.append(d)
+        return d
+
+
+
+class TestUpdateReports(FuzzingServerTestCase):
+    """
+    This test case checks reports are updated on request of a testee, in the
+    report process pool of the fuzzing server.
+    """
+
+    def updateReports(self):
+        """
+        Connect to /updateReports, firing the Deferred returned when the
+        fuzzing server closed the connection.
+        """
+        return self.connect("/updateReports?agent=Agent").closed
+
+
+    def testUpdateReports(self):
+        """
+        Case detail reports should have been rendered when the connection closes.
+        """
+        self.factory.logCase(caseResults("Agent", "1.1.1", {}, []))
+        d = self.updateReports()
+
+        def check(_):
+            self.assertEquals(sorted(os.listdir(self.outdir)), ["agent_case_1_1_1.html", "agent_case_1_1_1.json", "index.html", "index.json"])
+            self.assertEquals(self.factory.dirtyCases, set())
+        return d.addCallback(check)
+
+
+    def testRenderFailed(self):
+        """
+        A case detail report failing to render should be logged, the connection
+        still be closed, and the case be left to render on the next update.
+        """
+        self.factory.logCase(caseResults("Agent", "1.1.1", {}, []))
+        os.remove(os.path.join(self.outdir, "agent_case_1_1_1.json"))
+        d = self.updateReports()
+
+        def check(_):
+            self.assertEquals(len(self.flushLoggedErrors(Exception)), 1)
+            self.assertFalse(os.path.exists(os.path.join(self.outdir, "agent_case_1_1_1.html")))
+            self.assertEquals(self.factory.dirtyCases, set([("Agent", "1.1.1")]))
+        return d.addCallback(check)
+
+
+    def testStopReportPool(self):
+        """
+        Stopping the report pool should wait for its processes to exit.
+        """
+        processes = self.factory.reportPool._pool
+        d = self.factory.stopReportPool()
+
+        def check(_):
+            self.assertEquals(self.factory.reportPool, None)
+            self.assertEquals([p.is_alive() for p in processes], [False])
+        return d.addCallback(check)
+
+
+
+class TestWatch(FuzzingServerTestCase):
+    """
+    This test case checks progress pushed to watchers of the fuzzing server.
+    """
+
+    SPEC = dict(FuzzingServerTestCase.SPEC, **{"watch-interval": 0.05})
+
+    def testCounters(self):
+        """
+        Counters should count cases done per agent and behavior, a case run
+        again replacing its earlier result.
+        """
+        for agent, caseId, behavior in [("A", "1.1.1", Case.OK), ("A", "1.1.2", Case.FAILED), ("B", "1.1.1", Case.OK), ("A", "1.1.2", Case.OK)]:
+            results = caseResults(agent, caseId, {}, [])
+            results["behavior"] = behavior
+            self.factory.logCase(results)
+
+        self.assertEquals(self.factory.getWatchCounters(),
+                          {"type": "counters", "cases": 2, "running": 0,
+                           "agents": {"A": {"done": 2, "behaviors": {Case.OK: 2}},
+                                      "B": {"done": 1, "behaviors": {Case.OK: 1}}}})
+
+
+    def testWatch(self):
+        """
+        A watcher should get counters when connecting, an event per case done,
+        and counters periodically until it disconnects.
+        """
+        watch = self.connect("/watch")
+        removed = Deferred()
+        removeWatcher = self.factory.removeWatcher
+        def watcherRemoved(proto):
+            removeWatcher(proto)
+            removed.callback(None)
+        self.patch(self.factory, "removeWatcher", watcherRemoved)
+
+        def connected(_):
+            self.assertEquals(watch.messages, [{"type": "counters", "cases": 2, "running": 0, "agents": {}}])
+            self.assertEquals(len(self.factory.watchers), 1)
+            self.assertTrue(self.factory.watchCounters.running)
+            d = self.received(watch)
+            self.factory.logCase(caseResults("Agent", "1.1.1", {}, []))
+            return d
+
+        def caseDone(_):
+            self.assertEquals((watch.messages[-1]["type"], watch.messages[-1]["id"]), ("case", "1.1.1"))
+            return self.received(watch)
+
+        def ticked(_):
+            self.assertEquals(watch.messages[-1]["agents"], {"Agent": {"done": 1, "behaviors": {Case.OK: 1}}})
+            watch.proto.sendClose()
+            return removed
+
+        def disconnected(_):
+            self.assertEquals(self.factory.watchers, set())
+            self.assertFalse(self.factory.watchCounters.running)
+
+        d = self.received(watch)
+        d.addCallback(connected)
+        d.addCallback(caseDone)
+        d.addCallback(ticked)
+        d.addCallback(disconnected)
+        return d
+
+
+
+class TestServerTimings(FuzzingServerTestCase):
+    """
+    This test case checks the timings of cases run by the fuzzing server.
+    """
+
+    def testOpeningHandshake(self):
+        """
+        The upgrade request should be timed when received, and the upgrade
+        response when sent, before the connection is open.
+        """
+        d = Deferred()
+        self.factory.addResultListener("Agent", "1.1.1", d.callback)
+        self.connect("/runCase?case=1&agent=Agent", EchoProtocol)
+
+        def check(caseResults):
+            events = caseResults["timings"]["events"]
+            self.assertEquals(events["connecting"], None)
+            self.assertEquals(events["connected"], 0.)
+            self.assertTrue(0. <= events["upgradeRequest"] <= events["upgradeResponse"] <= events["open"])
+            self.assertEquals(caseResults["behavior"], Case.OK)
+
+            ## the case would kill the connection if still open later
+            for call in reactor.getDelayedCalls():
+                if getattr(call.func, "__name__", None) == "executeKillAfter":
+                    call.cancel()
+        return d.addCallback(check)
@@ -0,0 +1,65 @@
+from twisted.trial import unittest
+from autobahntestsuite.histogram import Histogram
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    This test case checks recording values into histograms.
+    """
+
+    def setUp(self):
+        self.h = Histogram()
+
+
+    def testBuckets(self):
+        """
+        Each value should fall into a bucket whose range holds it, with
+        a relative error bounded by the bucket resolution.
+        """
+        last = -1
+        for v in range(0, 100000, 7) + [2 ** 40 + 12345]:
+            i = self.h.bucket(v)
+            low, high = self.h.bucketRange(i)
+            self.assertTrue(low <= v <= high)
+            self.assertTrue(high - low <= max(0, 2. * v / Histogram.SUB_BUCKETS))
+            self.assertTrue(i >= last)
+            last = i
+
+
+    def testPercentiles(self):
+        """
+        Percentiles should be within the bucket resolution, and minimum
+        and maximum exact.
+        """
+        for v in range(1, 10001):
+            self.h.record(v)
+        res = self.h.__json__()
+        self.assertEquals((res["count"], res["min"], res["max"]), (10000, 1, 10000))
+        for key, expected in [("p50", 5000), ("p90", 9000), ("p99", 9900), ("p999", 9990)]:
+            self.assertTrue(expected <= res[key] <= expected * (1 + 2. / Histogram.SUB_BUCKETS), key)
+        self.assertEquals(sum([c for _, c in res["histogram"]]), 10000)
+
+
+    def testEmpty(self):
+        """
+        An empty histogram should have no percentiles.
+        """
+        self.assertEquals(self.h.__json__()["p99"], None)
+
+
+    def testMerge(self):
+        """
+        Merging histogram summaries should give the histogram of all values.
+        """
+        a, b = Histogram(), Histogram()
+        for v in range(1, 5001):
+            a.record(v)
+            self.h.record(v)
+        for v in range(5001, 10001, 3):
+            b.record(v)
+            self.h.record(v)
+        merged = Histogram()
+        merged.merge(a.__json__())
+        merged.merge(b.__json__())
+        merged.merge(Histogram().__json__())
+        self.assertEquals(merged.__json__(), self.h.__json__())
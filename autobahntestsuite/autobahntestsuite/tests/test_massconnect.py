@@ -0,0 +1,253 @@
+from twisted.trial import unittest
+from twisted.internet import reactor, protocol
+from twisted.internet.defer import Deferred
+from autobahntestsuite.massconnect import MassConnect, MassConnectFactory, MassConnectProtocol, mergeResults
+from autobahntestsuite.histogram import Histogram
+from autobahntestsuite.util import monotonic
+
+
+class FakeFactory:
+
+    def opened(self, proto):
+        return proto.attempt
+
+
+class FakeProtocol:
+
+    def __init__(self, start, tcp, retries = 0, test = None):
+        self.factory = FakeFactory()
+        self.factory.test = test
+        self.attempt = (start, retries)
+        self.tcpConnectedAt = tcp
+        self.didHandshake = True
+        self.probesPending = None
+        self.closed = False
+
+    def sendClose(self):
+        self.closed = True
+        if self.factory.test:
+            reactor.callLater(0, self.factory.test.onLost, self)
+
+    def sendPing(self, payload):
+        ## answer every other ping
+        self.pings = getattr(self, "pings", 0) + 1
+        if self.pings % 2:
+            reactor.callLater(0, self.factory.test.onProbeReply, self, payload)
+
+
+class TestMassConnect(unittest.TestCase):
+    """
+    This test case checks the statistics of massconnect runs.
+    """
+
+    def testResult(self):
+        """
+        When the target is reached, the result should have the latencies of
+        all connections, and all connections should be closed.
+        """
+        t = MassConnect("Server", "ws://127.0.0.1:9000", 2, 1, 10, 10)
+        t.d = Deferred()
+        t.started = monotonic()
+        protos = [FakeProtocol(t.started - 0.003, t.started - 0.002),
+                  FakeProtocol(t.started - 0.005, t.started - 0.001, 2)]
+        results = []
+        t.d.addCallback(results.append)
+        for p in protos:
+            t.onConnected(p)
+
+        r = t.result
+        self.assertEquals(r["connections"], 2)
+        self.assertEquals(r["timeline"], [2])
+        self.assertEquals(r["retriesPerConnection"], [(0, 1), (2, 1)])
+        self.assertEquals(r["latencies"]["tcpConnect"]["count"], 2)
+        self.assertTrue(900 <= r["latencies"]["tcpConnect"]["min"] <= 1100)
+        self.assertTrue(3900 <= r["latencies"]["tcpConnect"]["max"] <= 4100)
+        self.assertTrue(r["latencies"]["connect"]["min"] >= 3000)
+        self.assertEquals([p.closed for p in protos], [True, True])
+
+        ## result is delivered when all connections are gone
+        for p in protos:
+            t.onLost(p)
+        self.assertEquals(results, [r])
+        self.assertEquals(t.lost, 0)
+
+
+    def testLostAfterOpen(self):
+        """
+        A connection lost after it was open, before the target is reached,
+        should be reopened, and the result delivered when all are closed.
+        """
+        t = MassConnect("Server", "ws://127.0.0.1:9000", 2, 1, 10, 10)
+        t.d = Deferred()
+        t.started = monotonic()
+        lost = FakeProtocol(t.started, t.started, test = t)
+        t.onConnected(lost)
+        self.assertTrue(t.onLost(lost))
+        self.assertEquals((t.protos, t.actual, t.lost), (set(), 0, 1))
+
+        protos = [FakeProtocol(t.started, t.started, test = t) for i in range(2)]
+        for p in protos:
+            t.onConnected(p)
+        self.assertEquals([p.closed for p in protos + [lost]], [True, True, False])
+
+        def check(result):
+            self.assertEquals((result["connections"], result["lost"]), (2, 1))
+            self.assertEquals(t.protos, set())
+        return t.d.addCallback(check)
+
+
+    def testHold(self):
+        """
+        In the hold phase, probes should be sent on the probe connections
+        only, and probes not answered within timeout should count as failed.
+        """
+        t = MassConnect("Server", "ws://127.0.0.1:9000", 4, 1, 10, 10,
+                        {"duration": 1.2, "connections": 2, "rate": 5, "timeout": 500})
+        t.d = Deferred()
+        t.started = monotonic()
+        protos = [FakeProtocol(t.started, t.started, test = t) for i in range(4)]
+        for p in protos:
+            t.onConnected(p)
+
+        def check(r):
+            hold = r["hold"]
+            self.assertEquals(hold["probeConnections"], 2)
+            self.assertEquals(len([p for p in protos if hasattr(p, "pings")]), 2)
+            self.assertTrue(10 <= hold["probesSent"] <= 14)
+            self.assertEquals(hold["rtt"]["count"], sum([(p.pings + 1) / 2 for p in protos if hasattr(p, "pings")]))
+            self.assertTrue(hold["probesFailed"] >= 2)
+            self.assertEquals(hold["open"], 4)
+            self.assertEquals(len(hold["timeline"]), 1)
+        return t.d.addCallback(check)
+
+
+    def testMergeResults(self):
+        """
+        Results of workers should add up, with the longest duration and
+        timelines added up per second.
+        """
+        def result(connections, duration, timeline, latency):
+            h = Histogram()
+            h.record(latency)
+            return {"name": "Server", "uri": "ws://127.0.0.1:9000", "connections": connections,
+                    "retries": 1, "lost": 0, "failed": 1, "duration": duration, "rate": connections / duration,
+                    "timeline": timeline, "retriesPerConnection": [(0, connections - 1), (1, 1)],
+                    "latencies": dict([(key, h.__json__()) for key, _ in MassConnect.LATENCIES])}
+
+        r = mergeResults([result(10, 2., [4, 6], 100), result(20, 4., [5, 5, 5, 5], 300)])
+        self.assertEquals((r["workers"], r["connections"], r["retries"], r["failed"]), (2, 30, 2, 2))
+        self.assertEquals((r["duration"], r["rate"]), (4., 7.5))
+        self.assertEquals(r["timeline"], [9, 11, 5, 5])
+        self.assertEquals(r["retriesPerConnection"], [(0, 28), (1, 2)])
+        self.assertEquals((r["latencies"]["connect"]["min"], r["latencies"]["connect"]["max"]), (100, 300))
+        self.assertFalse("hold" in r)
+
+
+    def testChurn(self):
+        """
+        In the churn phase, a fraction of the connections should be closed
+        per second and reopened, and connections lost otherwise should be
+        counted as lost and reopened too.
+        """
+        t = MassConnect("Server", "ws://127.0.0.1:9000", 10, 1, 10, 10,
+                        churn = {"duration": 0.55, "rate": 1})
+        t.d = Deferred()
+        t.started = monotonic()
+        protos = [FakeProtocol(t.started, t.started, test = t) for i in range(10)]
+        for p in protos:
+            t.onConnected(p)
+
+        reopen = []
+        def lose():
+            p = list(t.protos)[0]
+            reopen.append(t.onLost(p))
+        reactor.callLater(0.25, lose)
+
+        def check(r):
+            churn = r["churn"]
+            self.assertEquals(reopen, [True])
+            self.assertTrue(4 <= churn["closed"] <= 5)
+            self.assertEquals((churn["lost"], churn["open"]), (1, 10 - churn["closed"] - 1))
+            self.assertEquals(len([p for p in protos if p.closed]), 9)
+        return t.d.addCallback(check)
+
+
+
+class DroppingProtocol(protocol.Protocol):
+
+    def connectionMade(self):
+        self.transport.loseConnection()
+
+
+
+class TestDouble:
+    """
+    Stands in for the MassConnect test a MassConnectFactory belongs to.
+    """
+
+    def __init__(self):
+        self.failed = 0
+        self.lost = []
+        self.d = Deferred()
+
+    ## the Deferred fires once the factory is done with the connection
+    ##
+    def onFailed(self):
+        self.failed += 1
+        reactor.callLater(0, self.d.callback, None)
+        return False
+
+    def onLost(self, proto):
+        self.lost.append(proto)
+        reactor.callLater(0, self.d.callback, None)
+        return False
+
+
+
+class TestMassConnectFactory(unittest.TestCase):
+    """
+    This test case checks tracking connections by connector.
+    """
+
+    def setUp(self):
+        self.port = reactor.listenTCP(0, protocol.Factory.forProtocol(DroppingProtocol), interface = "127.0.0.1")
+        self.test = TestDouble()
+
+
+    def tearDown(self):
+        return self.port.stopListening()
+
+
+    def testLost(self):
+        """
+        A connection lost should be reported with the protocol of its connector.
+        """
+        factory = MassConnectFactory(self.test, "ws://127.0.0.1:%d" % self.port.getHost().port, 10)
+        factory.connect()
+
+        def check(_):
+            self.assertEquals(self.test.failed, 0)
+            self.assertEquals(len(self.test.lost), 1)
+            self.assertTrue(isinstance(self.test.lost[0], MassConnectProtocol))
+            self.assertFalse(self.test.lost[0].didHandshake)
+            self.assertEquals((factory.attempts, factory.connected), ({}, {}))
+            self.test.lost[0].openHandshakeTimeoutCall.cancel()
+        return self.test.d.addCallback(check)
+
+
+    def testFailed(self):
+        """
+        A connection failed should be reported as such, without a protocol.
+        """
+        uri = "ws://127.0.0.1:%d" % self.port.getHost().port
+        d = self.port.stopListening()
+
+        def connect(_):
+            factory = MassConnectFactory(self.test, uri, 10)
+            factory.connect()
+            return self.test.d.addCallback(lambda _: factory)
+
+        def check(factory):
+            self.assertEquals((self.test.failed, self.test.lost), (1, []))
+            self.assertEquals((factory.attempts, factory.connected), ({}, {}))
+        return d.addCallback(connect).addCallback(check)
@@ -0,0 +1,51 @@
+from twisted.trial import unittest
+from autobahntestsuite.metrics import Metrics, CounterMetric, GaugeMetric, HistogramMetric
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    This test case checks rendering metrics in the Prometheus text format.
+    """
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+
+    def testCounterGauge(self):
+        """
+        Counters and gauges should render a sample per label values, and
+        unlabeled counters should render 0 before being incremented.
+        """
+        c = self.metrics.add(CounterMetric("c_total", "A counter.", ["behavior"]))
+        c.inc(1, "OK")
+        c.inc(2, 'say "hi"')
+        self.metrics.add(CounterMetric("d_total", "Another counter."))
+        self.metrics.add(GaugeMetric("g", "A gauge.", collect = lambda: 3))
+
+        self.assertEquals(self.metrics.render().splitlines(),
+                          ['# HELP c_total A counter.',
+                           '# TYPE c_total counter',
+                           'c_total{behavior="OK"} 1',
+                           'c_total{behavior="say \\"hi\\""} 2',
+                           '# HELP d_total Another counter.',
+                           '# TYPE d_total counter',
+                           'd_total 0',
+                           '# HELP g A gauge.',
+                           '# TYPE g gauge',
+                           'g 3'])
+
+
+    def testHistogram(self):
+        """
+        Histogram buckets should be cumulative, ending with +Inf.
+        """
+        h = self.metrics.add(HistogramMetric("h_seconds", "A histogram.", [1, 0.1]))
+        for v in [0.05, 0.1, 0.5, 7]:
+            h.observe(v)
+
+        self.assertEquals(self.metrics.render().splitlines()[2:],
+                          ['h_seconds_bucket{le="0.1"} 2',
+                           'h_seconds_bucket{le="1.0"} 3',
+                           'h_seconds_bucket{le="+Inf"} 4',
+                           'h_seconds_sum 7.65',
+                           'h_seconds_count 4'])
@@ -0,0 +1,56 @@
+import os, sys, pstats
+from twisted.trial import unittest
+from autobahntestsuite.profiler import Profiler
+
+
+def busy():
+    return sum(range(10000))
+
+
+class TestProfiler(unittest.TestCase):
+    """
+    This test case checks attributing profiles to test cases.
+    """
+
+    def testCaseProfiles(self):
+        """
+        Calls made while a test case runs should be in the profile of the
+        case, and all calls in the profile of the whole run.
+        """
+        filename = self.mktemp()
+        proto = object()
+        p = Profiler(filename)
+        p.start()
+        busy()
+        p.caseStarted(proto, "1.2.3")
+        busy()
+        busy()
+        p.caseEnded(proto)
+        p.stop()
+
+        def calls(stats):
+            return [v[1] for k, v in stats.stats.items() if k[2] == "busy"][0]
+
+        self.assertEquals(calls(pstats.Stats(filename)), 3)
+        self.assertEquals(calls(pstats.Stats(os.path.join(filename + ".cases", "1.2.3.pstats"))), 2)
+
+
+    def testSampleAttribution(self):
+        """
+        Samples should be rooted at the id of the test case whose protocol
+        is on the stack.
+        """
+        p = Profiler(self.mktemp(), "sampling")
+
+        class Proto:
+            def run(self):
+                p.sample(None, sys._getframe())
+
+        proto = Proto()
+        p.caseStarted(proto, "4.5.6")
+        proto.run()
+        p.caseEnded(proto)
+        proto.run()
+
+        roots = sorted([k.split(";")[0] for k in p.stacks])
+        self.assertEquals(roots, [Profiler.NO_CASE, "4.5.6"])
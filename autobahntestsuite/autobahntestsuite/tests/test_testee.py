@@ -0,0 +1,124 @@
+from twisted.trial import unittest
+from twisted.internet import reactor, protocol
+from twisted.internet.defer import inlineCallbacks
+
+from autobahn.twisted.websocket import WebSocketServerFactory, WebSocketServerProtocol
+
+from autobahntestsuite import testee
+
+
+class FakeFuzzingServerProtocol(WebSocketServerProtocol):
+
+   def onConnect(self, request):
+      self.path = request.path
+      self.params = request.params
+
+   def onOpen(self):
+      self.opened = True
+      self.factory.requests.append((self.path, self.params.get("case", [None])[0]))
+      self.factory.open += 1
+      self.factory.maxOpen = max(self.factory.maxOpen, self.factory.open)
+      if self.path == "/getCaseCount":
+         self.sendMessage(str(self.factory.caseCount))
+         self.sendClose()
+      elif self.path == "/runCase":
+         ## keep case connections open a bit, so they overlap
+         reactor.callLater(0.05, self.sendClose)
+      else:
+         self.sendClose()
+
+   def onClose(self, wasClean, code, reason):
+      if getattr(self, "opened", False):
+         self.factory.open -= 1
+
+
+
+class FakeFuzzingServerFactory(WebSocketServerFactory):
+   """
+   Fuzzing server double, recording the resources requested by the testee.
+   """
+
+   protocol = FakeFuzzingServerProtocol
+
+   def __init__(self, caseCount):
+      WebSocketServerFactory.__init__(self, "ws://127.0.0.1:0")
+      self.caseCount = caseCount
+      self.requests = []
+      self.open = 0
+      self.maxOpen = 0
+
+
+
+class TestTesteeClient(unittest.TestCase):
+   """
+   This test case checks the testee client runs the cases of the fuzzing server.
+   """
+
+   def setUp(self):
+      self.factory = FakeFuzzingServerFactory(5)
+      self.port = reactor.listenTCP(0, self.factory, interface = "127.0.0.1")
+      self.url = "ws://127.0.0.1:%d" % self.port.getHost().port
+
+
+   def tearDown(self):
+      return self.port.stopListening()
+
+
+   def closedPort(self):
+      port = reactor.listenTCP(0, protocol.Factory(), interface = "127.0.0.1")
+      url = "ws://127.0.0.1:%d" % port.getHost().port
+      return url, port.stopListening()
+
+
+   @inlineCallbacks
+   def testConcurrentCases(self):
+      """
+      Each concurrent connection should request its own test case, and
+      reports should be updated after all of them have finished.
+      """
+      client = testee.TesteeClient(self.url, concurrency = 3)
+      client.start()
+      yield client.d
+
+      requests = self.factory.requests
+      self.assertEquals(requests[0], ("/getCaseCount", None))
+      self.assertEquals(sorted(requests[1:-1]), [("/runCase", str(i)) for i in range(1, 6)])
+      self.assertEquals(requests[-1], ("/updateReports", None))
+      self.assertEquals(self.factory.maxOpen, 3)
+
+
+   @inlineCallbacks
+   def testCaseConnectionFailed(self):
+      """
+      A test case whose connection failed should be dropped, and the run
+      should still finish.
+      """
+      url, stopped = self.closedPort()
+      yield stopped
+
+      client = testee.TesteeClient(self.url, concurrency = 2)
+      countDone = client.countDone
+      def moveAway(failed):
+         ## connect test cases to a port nobody listens on
+         client.url = url
+         countDone(failed)
+      client.countDone = moveAway
+      client.start()
+      yield client.d
+
+      self.assertEquals(self.factory.requests, [("/getCaseCount", None)])
+      self.assertEquals(client.casesDone, 5)
+
+
+   @inlineCallbacks
+   def testCountConnectionFailed(self):
+      """
+      The run should finish when the case count can't be retrieved.
+      """
+      url, stopped = self.closedPort()
+      yield stopped
+
+      client = testee.TesteeClient(url, concurrency = 2)
+      client.start()
+      yield client.d
+      self.assertEquals(client.endCaseId, None)
@@ -0,0 +1,245 @@
+from twisted.trial import unittest
+from autobahntestsuite.case import Case, Cases, case14_x_x, case15_x_x
+from autobahntestsuite.case.case15_x_x import StreamProducer
+
+
+CasesByName = dict([(C.__name__, C) for C in Cases])
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+
+class FakeTransport:
+
+    def unregisterProducer(self):
+        pass
+
+
+
+class FakeProtocol:
+    """
+    Records what a case sends, and pauses the producer registered when
+    pauseAfter frames were sent (as a full transport buffer would).
+    """
+
+    CLOSE_STATUS_CODE_NORMAL = 1000
+    CLOSE_STATUS_CODE_MESSAGE_TOO_BIG = 1009
+
+    def __init__(self, pauseAfter = None):
+        self.pauseAfter = pauseAfter
+        self.transport = FakeTransport()
+        self.closeHandshakeTimeout = 1
+        self.remoteCloseCode = None
+        self.producer = None
+        self.later = []
+        self.sent = []
+        self.closed = []
+
+    def enableWirelog(self, enable):
+        pass
+
+    def closeAfter(self, seconds):
+        pass
+
+    def continueLater(self, seconds, f):
+        self.later.append(f)
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def beginMessage(self, isBinary = False):
+        pass
+
+    def send(self, payload, binary):
+        self.sent.append((payload, binary))
+        if self.pauseAfter is not None and len(self.sent) % self.pauseAfter == 0:
+            self.producer.pauseProducing()
+
+    def sendMessage(self, payload, binary = False):
+        self.send(payload, binary)
+
+    def sendMessageFrame(self, payload):
+        self.send(payload, None)
+
+    def sendClose(self, code):
+        self.closed.append(code)
+
+
+
+class TestStreamProducer(unittest.TestCase):
+    """
+    This test case checks the push producer of the streaming cases.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(case15_x_x, "monotonic", self.clock)
+
+
+    def testPauses(self):
+        """
+        The producer should send until paused, and count how often and how
+        long it was paused.
+        """
+        sent = []
+        def send():
+            sent.append(None)
+            if len(sent) % 3 == 0:
+                producer.pauseProducing()
+        producer = StreamProducer(send)
+
+        producer.resumeProducing()
+        self.assertEquals((len(sent), producer.pauses), (3, 1))
+        self.clock.now = 0.5
+        producer.resumeProducing()
+        self.assertEquals((len(sent), producer.pauses), (6, 2))
+        self.clock.now = 0.75
+        producer.stopProducing()
+        self.assertEquals(producer.pausedSeconds, 0.75)
+
+        producer.resumeProducing()
+        self.assertEquals(len(sent), 6)
+
+
+
+class TestStreamingCases(unittest.TestCase):
+    """
+    This test case checks the throughput reported by the streaming cases (15.x).
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(case15_x_x, "monotonic", self.clock)
+
+
+    def testSinkStopsAtMaxOctets(self):
+        """
+        A sink-only case should stop streaming at the octet limit, and report
+        the frames processed when the testee replied to the close.
+        """
+        self.patch(case15_x_x, "SINK_MAX_OCTETS", 160)
+        p = FakeProtocol()
+        case = CasesByName["Case15_3_1"](p)
+        case.onOpen()
+
+        self.assertEquals(len(p.sent), 10)
+        self.assertEquals(p.closed, [1000])
+        self.assertFalse(case.streaming)
+
+        self.clock.now = 2.
+        p.remoteCloseCode = 1000
+        case.onClose(True, 1000, None)
+        self.assertEquals(case.behavior, Case.OK)
+        self.assertEquals((case.throughput["frames"], case.throughput["octets"]), (10, 160))
+        self.assertEquals(case.throughput["seconds"], 2.)
+        self.assertEquals(case.throughput["framesPerSec"], 5.)
+        self.assertEquals(case.throughput["octetsPerSec"], 80.)
+
+
+    def testSinkMessageTooBig(self):
+        """
+        A testee closing with 1009 while a sink-only case streams should be
+        informational, with the throughput up to then.
+        """
+        p = FakeProtocol(pauseAfter = 4)
+        case = CasesByName["Case15_4_1"](p)
+        case.onOpen()
+
+        self.clock.now = 1.
+        p.remoteCloseCode = 1009
+        case.onClose(True, 1009, None)
+        self.assertEquals(case.behavior, Case.INFORMATIONAL)
+        self.assertEquals(case.throughput["octetsPerSec"], 64.)
+        self.assertEquals(case.expectedClose["closeCode"], [1009])
+
+
+    def testEcho(self):
+        """
+        An echo case should report the throughput when all echo'ed messages
+        arrived after streaming stopped.
+        """
+        p = FakeProtocol(pauseAfter = 3)
+        case = CasesByName["Case15_1_1"](p)
+        case.onOpen()
+        self.assertEquals(len(p.sent), 3)
+
+        self.clock.now = 5.
+        p.later.pop()()
+        self.assertEquals(case.behavior, Case.FAILED)
+
+        for payload, binary in p.sent:
+            case.onMessage(payload, binary)
+        self.assertEquals(case.behavior, Case.OK)
+        self.assertEquals(p.closed, [1000])
+        self.assertEquals((case.throughput["frames"], case.throughput["octets"]), (3, 48))
+        self.assertEquals(case.throughput["pauses"], 1)
+        self.assertEquals(case.throughput["pausedSeconds"], 5.)
+
+
+    def testEchoMismatch(self):
+        """
+        An echo'ed message differing from what was sent should fail the case.
+        """
+        p = FakeProtocol(pauseAfter = 1)
+        case = CasesByName["Case15_2_1"](p)
+        case.onOpen()
+        case.onMessage(p.sent[0][0], False)
+        self.assertEquals(case.behavior, Case.FAILED)
+        self.assertEquals(p.closed, [1000])
+        self.assertTrue(case.producer.stopped)
+
+
+
+class TestPipelinedEchoCases(unittest.TestCase):
+    """
+    This test case checks the throughput reported by the pipelined echo cases (14.x).
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(case14_x_x, "monotonic", self.clock)
+
+
+    def testThroughput(self):
+        """
+        No more than the window of messages should be in flight, and the
+        throughput is reported when all messages were echo'ed.
+        """
+        C = type("Case14Short", (CasesByName["Case14_1_2"],), {"COUNT": 20})
+        p = FakeProtocol()
+        case = C(p)
+        case.onOpen()
+        self.assertEquals(len(p.sent), case.WINDOW)
+
+        echoed = 0
+        while echoed < len(p.sent):
+            self.clock.now += 0.25
+            case.onMessage(*p.sent[echoed])
+            echoed += 1
+            self.assertTrue(len(p.sent) - echoed <= case.WINDOW)
+
+        self.assertEquals(case.behavior, Case.OK)
+        self.assertEquals(p.closed, [1000])
+        self.assertEquals(case.throughput["messages"], 20)
+        self.assertEquals(case.throughput["octets"], sum([len(msg) for msg, binary in p.sent]))
+        self.assertEquals(case.throughput["seconds"], 5.)
+        self.assertEquals(case.throughput["messagesPerSec"], 4.)
+
+
+    def testWrongEcho(self):
+        """
+        An echo'ed message differing from what was sent should fail the case.
+        """
+        p = FakeProtocol()
+        case = CasesByName["Case14_1_1"](p)
+        case.onOpen()
+        case.onMessage(p.sent[0][0][::-1] + "x", p.sent[0][1])
+        self.assertEquals(case.behavior, Case.FAILED)
+        self.assertEquals(p.closed, [1000])
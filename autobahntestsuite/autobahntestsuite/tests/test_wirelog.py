@@ -0,0 +1,105 @@
+from twisted.trial import unittest
+from autobahn.websocket.protocol import FrameHeader
+from autobahntestsuite.wirelog import WireLog, binLogData, asciiLogData
+import binascii
+
+
+class TestWireLog(unittest.TestCase):
+    """
+    This test case checks that the binary wire log decodes to the same
+    rows as logged from the full data.
+    """
+
+    def setUp(self):
+        self.wirelog = WireLog()
+
+
+    def testOctets(self):
+        """
+        Octets should decode to hex of (at most) the first 64 octets.
+        """
+        for data in ["", "\x00\x01", "x" * 61, "\xff" * 1000]:
+            self.wirelog.appendRxOctets(data)
+            self.wirelog.appendTxOctets(data, True)
+        rows = self.wirelog.decode()
+        self.assertEquals(len(rows), 8)
+        for i, data in enumerate(["", "\x00\x01", "x" * 61, "\xff" * 1000]):
+            self.assertEquals(rows[2 * i], ("RO", (len(data), binLogData(data))))
+            self.assertEquals(rows[2 * i + 1], ("TO", (len(data), binLogData(data)), True))
+
+
+    def testFrames(self):
+        """
+        Frames should decode to the same rows as logged before.
+        """
+        mask = "\x01\x02\x03\x04"
+        payload = ["Hello, ", "world! " * 20, "\xce\xba\xe1\xbd\xb9"]
+        self.wirelog.appendRxFrame(FrameHeader(1, True, 0, 0, mask), payload)
+        self.wirelog.appendTxFrame(FrameHeader(2, False, 4, 0, None), "\xff" * 10, None, 5, False)
+        self.wirelog.append(("KL", 0.5))
+        rows = self.wirelog.decode()
+        self.assertEquals(rows[0], ("RF", (len(''.join(payload)), asciiLogData(''.join(payload))), 1, True, 0, True, binascii.b2a_hex(mask)))
+        self.assertEquals(rows[1], ("TF", (10, asciiLogData("\xff" * 10)), 2, False, 4, None, None, 5, False))
+        self.assertEquals(rows[2], ("KL", 0.5))
+
+
+class TestWireLogLimits(unittest.TestCase):
+    """
+    This test case checks bounding the wire log.
+    """
+
+    def testHeadTail(self):
+        """
+        Only the first and last rows should be kept, with the number of
+        rows dropped in between.
+        """
+        wirelog = WireLog(head = 2, tail = 3)
+        for i in range(10):
+            wirelog.append(("KL", i))
+        self.assertEquals(wirelog.decode(), [("KL", 0), ("KL", 1), ("ELIDED", 5), ("KL", 7), ("KL", 8), ("KL", 9)])
+
+
+    def testTailOnly(self):
+        """
+        With a tail only, just the last rows should be kept.
+        """
+        wirelog = WireLog(tail = 3)
+        for i in range(10):
+            wirelog.append(("KL", i))
+        self.assertEquals(wirelog.decode(), [("ELIDED", 7), ("KL", 7), ("KL", 8), ("KL", 9)])
+
+
+    def testTailOnlyBytes(self):
+        """
+        With a tail only, the tail should get all of the records size.
+        """
+        wirelog = WireLog(tail = 100, maxBytes = 1000)
+        for i in range(100):
+            wirelog.appendRxOctets("x" * 100)
+        rows = wirelog.decode()
+        self.assertEquals(len(wirelog.buffer), 0)
+        self.assertEquals(wirelog.tailSize, sum([len(record) for record, row in wirelog.tail]))
+        self.assertTrue(500 < wirelog.tailSize <= 1000)
+        self.assertEquals(rows[0], ("ELIDED", 100 - len(rows) + 1))
+
+
+    def testBytes(self):
+        """
+        The size of records stored should be bounded.
+        """
+        wirelog = WireLog(maxBytes = 1000)
+        for i in range(100):
+            wirelog.appendRxOctets("x" * 100)
+        rows = wirelog.decode()
+        self.assertTrue(len(wirelog.buffer) <= 1000)
+        self.assertEquals(rows[-1], ("ELIDED", 100 - len(rows) + 1))
+
+
+    def testUnlimited(self):
+        """
+        Without limits, all rows should be kept.
+        """
+        wirelog = WireLog()
+        for i in range(10):
+            wirelog.append(("KL", i))
+        self.assertEquals(wirelog.decode(), [("KL", i) for i in range(10)])
@@ -16,13 +16,15 @@
 ##
 ###############################################################################
 
-__all__ = ("AttributeBag", "Tabify", "perf_counter", )
+__all__ = ("AttributeBag", "Tabify", "perf_counter", "monotonic", "WorkerProcess", )
 
 
 import json, platform, sys
 from datetime import datetime
 
 from twisted.python import log
+from twisted.internet import protocol
+from twisted.internet.defer import Deferred
 
 import autobahn
 import autobahntestsuite
@@ -45,6 +47,35 @@ else:
    perf_counter = time.perf_counter
 
 
+# monotonic clock for measuring time intervals (not affected by system clock
+# adjustments). until time.monotonic becomes available in Python 2 we use
+# clock_gettime(CLOCK_MONOTONIC) on Linux, and fall back to perf_counter:
+if hasattr(time, 'monotonic'):
+   monotonic = time.monotonic
+else:
+   monotonic = perf_counter
+   if sys.platform.startswith('linux'):
+      try:
+         import ctypes, ctypes.util
+
+         class _timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+         _clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c')).clock_gettime
+         _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+         CLOCK_MONOTONIC = 1
+
+         def monotonic():
+            t = _timespec()
+            _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t))
+            return t.tv_sec + t.tv_nsec * 1e-9
+
+         monotonic()
+      except:
+         monotonic = perf_counter
+
+
 class AttributeBag:
 
    def __init__(self, **args):
@@ -279,3 +310,29 @@ def _createWssContext(self, options, factory):
    key = str(options['key'])
    cert = str(options['cert'])
    return ssl.DefaultOpenSSLContextFactory(key, cert)
+
+
+
+class WorkerProcess(protocol.ProcessProtocol):
+   """
+   Process protocol for a worker process (of the fuzzing client or the
+   mass connect test). Relays the output of the worker prefixed with the
+   worker number.
+   """
+
+   def __init__(self, worker):
+      self.worker = worker
+      self.buffers = {}
+      self.d = Deferred()
+
+   def childDataReceived(self, childFD, data):
+      lines = (self.buffers.get(childFD, '') + data).split('\n')
+      self.buffers[childFD] = lines.pop()
+      for line in lines:
+         print "[worker %d] %s" % (self.worker, line.rstrip())
+
+   def processEnded(self, reason):
+      for data in self.buffers.values():
+         if data:
+            print "[worker %d] %s" % (self.worker, data.rstrip())
+      self.d.callback(reason.value.exitCode)
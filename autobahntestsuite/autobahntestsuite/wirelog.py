@@ -0,0 +1,269 @@
+###############################################################################
+##
+##  Copyright (c) typedef int GmbH
+##
+##  Licensed under the Apache License, Version 2.0 (the "License");
+##  you may not use this file except in compliance with the License.
+##  You may obtain a copy of the License at
+##
+##      http://www.apache.org/licenses/LICENSE-2.0
+##
+##  Unless required by applicable law or agreed to in writing, software
+##  distributed under the License is distributed on an "AS IS" BASIS,
+##  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+##  See the License for the specific language governing permissions and
+##  limitations under the License.
+##
+###############################################################################
+
+__all__ = ("WireLog", "binLogData", "asciiLogData")
+
+
+import struct, binascii
+from collections import deque
+
+
+def binLogData(data, maxlen = 64):
+   ellipses = " ..."
+   if len(data) > maxlen - len(ellipses):
+      dd = binascii.b2a_hex(data[:maxlen]) + ellipses
+   else:
+      dd = binascii.b2a_hex(data)
+   return dd
+
+
+
+def asciiLogData(data, maxlen = 64, replace = False):
+   ellipses = " ..."
+   try:
+      if len(data) > maxlen - len(ellipses):
+         dd = data[:maxlen] + ellipses
+      else:
+         dd = data
+      return dd.decode('utf8', errors = 'replace' if replace else 'strict')
+   except:
+      return '0x' + binLogData(data, maxlen)
+
+
+
+class WireLog:
+   """
+   Append-only wire log of a test case connection. Octets and frames are
+   stored as binary records (a fixed header followed by the frame mask, if any,
+   and at most DATA_LEN octets of payload), and only decoded into log rows when
+   a report is created. Other rows are stored as is.
+
+   Rows decode to the tuples
+
+      ("RO", (length, hex)),
+      ("TO", (length, hex), sync),
+      ("RF", (length, text), opcode, fin, rsv, masked, mask),
+      ("TF", (length, text), opcode, fin, rsv, mask, repeatLength, chopsize, sync),
+      ("ELIDED", count),
+
+   and the tuples as appended for all other rows.
+
+   The wire log can be bounded: only the first head rows and the last tail
+   rows are kept (only the last tail rows when no head is given), and the rows
+   in between are counted in an "ELIDED" row. With maxBytes, the size of the
+   records stored is bounded as well (head and tail each get half of it, or
+   all of it when the other keeps no rows).
+   """
+
+   ## data logged for octets/frames - that's enough for binLogData/asciiLogData
+   ## to render exactly as for the full data
+   ##
+   DATA_LEN = 64
+
+   ## record kinds
+   ##
+   RO = 0
+   TO = 1
+   RF = 2
+   TF = 3
+   ROW = 4
+
+   ## record flags
+   ##
+   FIN = 1
+   SYNC = 2
+   MASK = 4
+   REPEAT = 8
+   CHOP = 16
+
+   ## kind, flags, opcode, rsv, payload length, repeat length, chopsize, data length
+   ##
+   HEADER = struct.Struct("!BBBBQQIB")
+
+
+   def __init__(self, head = None, tail = None, maxBytes = None):
+      """
+      :param head: Number of rows kept at the start, or None for no limit.
+      :type head: int
+      :param tail: Number of rows kept at the end when head rows are exceeded
+                   (with no head given, only those rows are kept).
+      :type tail: int
+      :param maxBytes: Maximum size of stored records, or None for no limit.
+      :type maxBytes: int
+      """
+      for v in [head, tail, maxBytes]:
+         if v is not None and (type(v) not in [int, long] or v < 0):
+            raise Exception("invalid wire log limit %s" % v)
+
+      self.buffer = bytearray()
+      self.rows = []
+
+      self.limited = head is not None or tail is not None or maxBytes is not None
+
+      ## with a tail only, all rows go to the tail
+      ##
+      if tail is not None and head is None:
+         head = 0
+
+      self.head = head
+      self.headCount = 0
+      if maxBytes is not None and head == 0:
+         self.headBytes = 0
+      elif maxBytes is not None and tail:
+         self.headBytes = maxBytes // 2
+      else:
+         self.headBytes = maxBytes
+      self.tail = deque()
+      self.tailCount = tail or 0
+      self.tailBytes = maxBytes - self.headBytes if maxBytes is not None else None
+      self.tailSize = 0
+      self.dropped = 0
+
+
+   def _append(self, kind, flags, opcode, rsv, length, repeatLength, chopsize, mask, data, row = None):
+      if not self.limited:
+         self.buffer.extend(WireLog.HEADER.pack(kind, flags, opcode, rsv, length, repeatLength, chopsize, len(data)))
+         if mask:
+            self.buffer.extend(mask)
+         self.buffer.extend(data)
+         if row is not None:
+            self.rows.append(row)
+         return
+
+      record = WireLog.HEADER.pack(kind, flags, opcode, rsv, length, repeatLength, chopsize, len(data)) + (mask or '') + str(data)
+
+      ## rows go to the head until it is full, then to the tail ring buffer
+      ##
+      if len(self.tail) == 0 and self.dropped == 0 and \
+         (self.head is None or self.headCount < self.head) and \
+         (self.headBytes is None or len(self.buffer) + len(record) <= self.headBytes):
+         self.buffer.extend(record)
+         if row is not None:
+            self.rows.append(row)
+         self.headCount += 1
+      else:
+         self.tail.append((record, row))
+         self.tailSize += len(record)
+         while len(self.tail) > self.tailCount or (self.tailBytes is not None and self.tailSize > self.tailBytes):
+            self.tailSize -= len(self.tail.popleft()[0])
+            self.dropped += 1
+
+
+   def appendRxOctets(self, data):
+      self._append(WireLog.RO, 0, 0, 0, len(data), 0, 0, None, data[:WireLog.DATA_LEN])
+
+
+   def appendTxOctets(self, data, sync):
+      self._append(WireLog.TO, WireLog.SYNC if sync else 0, 0, 0, len(data), 0, 0, None, data[:WireLog.DATA_LEN])
+
+
+   def appendRxFrame(self, frameHeader, payload):
+      """
+      Log received frame. The payload is given as list of chunks.
+      """
+      length = 0
+      data = bytearray()
+      for chunk in payload:
+         length += len(chunk)
+         if len(data) < WireLog.DATA_LEN:
+            data.extend(chunk[:WireLog.DATA_LEN - len(data)])
+      flags = WireLog.FIN if frameHeader.fin else 0
+      if frameHeader.mask:
+         flags |= WireLog.MASK
+      self._append(WireLog.RF, flags, frameHeader.opcode, frameHeader.rsv, length, 0, 0, frameHeader.mask, data)
+
+
+   def appendTxFrame(self, frameHeader, payload, repeatLength, chopsize, sync):
+      flags = WireLog.FIN if frameHeader.fin else 0
+      if frameHeader.mask:
+         flags |= WireLog.MASK
+      if sync:
+         flags |= WireLog.SYNC
+      if repeatLength is not None:
+         flags |= WireLog.REPEAT
+      if chopsize is not None:
+         flags |= WireLog.CHOP
+      self._append(WireLog.TF, flags, frameHeader.opcode, frameHeader.rsv, len(payload), repeatLength or 0, chopsize or 0, frameHeader.mask, payload[:WireLog.DATA_LEN])
+
+
+   def append(self, row):
+      """
+      Log any other row (a tuple with the row type as first element).
+      """
+      self._append(WireLog.ROW, 0, 0, 0, len(self.rows), 0, 0, None, '', row)
+
+
+   def _decode(self, buffer, rows, res):
+      offset = 0
+      while offset < len(buffer):
+         kind, flags, opcode, rsv, length, repeatLength, chopsize, datalen = WireLog.HEADER.unpack_from(buffer, offset)
+         offset += WireLog.HEADER.size
+
+         if flags & WireLog.MASK:
+            mask = binascii.b2a_hex(buffer[offset:offset + 4])
+            offset += 4
+         else:
+            mask = None
+
+         data = str(buffer[offset:offset + datalen])
+         offset += datalen
+
+         if kind == WireLog.RO:
+            res.append(("RO", (length, binLogData(data))))
+
+         elif kind == WireLog.TO:
+            res.append(("TO", (length, binLogData(data)), bool(flags & WireLog.SYNC)))
+
+         elif kind == WireLog.RF:
+            res.append(("RF",
+                        (length, asciiLogData(data)),
+                        opcode,
+                        bool(flags & WireLog.FIN),
+                        rsv,
+                        mask is not None,
+                        mask))
+
+         elif kind == WireLog.TF:
+            res.append(("TF",
+                        (length, asciiLogData(data)),
+                        opcode,
+                        bool(flags & WireLog.FIN),
+                        rsv,
+                        mask,
+                        repeatLength if flags & WireLog.REPEAT else None,
+                        chopsize if flags & WireLog.CHOP else None,
+                        bool(flags & WireLog.SYNC)))
+
+         else:
+            res.append(rows[length])
+
+
+   def decode(self):
+      """
+      Decode wire log into list of rows.
+      """
+      res = []
+      self._decode(self.buffer, self.rows, res)
+      if self.dropped > 0:
+         res.append(("ELIDED", self.dropped))
+      for record, row in self.tail:
+         if row is not None:
+            res.append(row)
+         else:
+            self._decode(record, self.rows, res)
+      return res
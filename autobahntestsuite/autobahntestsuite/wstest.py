@@ -47,6 +47,7 @@ import massconnect
 #import wsperfcontrol
 #import wsperfmaster
 import serializer
+import profiler
 
 
 from spectemplate import SPEC_FUZZINGSERVER, \
@@ -80,6 +81,7 @@ class WsTestOptions(usage.Options):
             #'wamptesteeserver',
             #'wampclient',
             'massconnect',
+            'unbundle',
             #'web',
             #'import',
             #'export',
@@ -121,10 +123,15 @@ class WsTestOptions(usage.Options):
       ['spec', 's', None, 'Test specification file [required in some modes].'],
       ['outfile', 'o', None, 'Output filename for modes that generate testdata.'],
       ['wsuri', 'w', None, 'WebSocket URI [required in some modes].'],
-      ['webport', 'u', 8080, 'Web port for running an embedded HTTP Web server; defaults to 8080; set to 0 to disable. [optionally used in some modes: fuzzingserver, echoserver, broadcastserver, wsperfmaster].'],
+      ['webport', 'u', 8080, 'Web port for running an embedded HTTP Web server; defaults to 8080; set to 0 to disable. [optionally used in some modes: fuzzingserver, echoserver, testeeserver, broadcastserver, wsperfmaster].'],
       ['ident', 'i', None, ('Testee client identifier [optional for client testees].')],
       ['key', 'k', None, ('Server private key file for secure WebSocket (WSS) [required in server modes for WSS].')],
-      ['cert', 'c', None, ('Server certificate file for secure WebSocket (WSS) [required in server modes for WSS].')]
+      ['cert', 'c', None, ('Server certificate file for secure WebSocket (WSS) [required in server modes for WSS].')],
+      ['workers', None, 1, ('Number of worker processes to spread the test cases (or connections) over [optionally used in modes: fuzzingclient, massconnect].')],
+      ['concurrency', None, 1, ('Number of test case connections kept open at once [optionally used in modes: testeeclient].')],
+      ['profile', None, None, ('Profile the reactor thread, and write profiler output to this file [optional in any mode].')],
+      ['profiler', None, 'cprofile', ('Profiler used with --profile, one of: %s; cprofile writes pstats, sampling writes collapsed stacks.' % ', '.join(profiler.Profiler.MODES))],
+      ['bundle', 'b', None, ('Report bundle file to export to classic reports in the directory given by --outfile [required in modes: unbundle].')]
    ]
 
    optFlags = [
@@ -153,6 +160,9 @@ class WsTestOptions(usage.Options):
       if (self['mode'] in WsTestOptions.MODES_NEEDING_WSURI and not self['wsuri']):
          raise usage.UsageError, "mode needs a WebSocket URI!"
 
+      if self['mode'] == 'unbundle' and not (self['bundle'] and self['outfile']):
+         raise usage.UsageError, "mode needs a report bundle file and output directory!"
+
       if self['webport'] is not None:
          try:
             self['webport'] = int(self['webport'])
@@ -161,6 +171,23 @@ class WsTestOptions(usage.Options):
          except:
             raise usage.UsageError, "invalid Web port %s" % self['webport']
 
+      try:
+         self['workers'] = int(self['workers'])
+         if self['workers'] < 1:
+            raise ValueError()
+      except:
+         raise usage.UsageError, "invalid number of workers %s" % self['workers']
+
+      try:
+         self['concurrency'] = int(self['concurrency'])
+         if self['concurrency'] < 1:
+            raise ValueError()
+      except:
+         raise usage.UsageError, "invalid concurrency %s" % self['concurrency']
+
+      if self['profiler'] not in profiler.Profiler.MODES:
+         raise usage.UsageError, "invalid profiler %s" % self['profiler']
+
 
 
 class WsTestRunner(object):
@@ -203,10 +230,10 @@ class WsTestRunner(object):
          return self.startWeb(debug = self.debug)
 
       elif self.mode == "testeeclient":
-         return testee.startClient(self.options['wsuri'], ident = self.options['ident'], debug = self.debug)
+         return testee.startClient(self.options['wsuri'], ident = self.options['ident'], debug = self.debug, concurrency = self.options['concurrency'])
 
       elif self.mode == "testeeserver":
-         return testee.startServer(self.options['wsuri'], debug = self.debug)
+         return testee.startServer(self.options['wsuri'], self.options['webport'], debug = self.debug)
 
       elif self.mode == "broadcastclient":
          return broadcast.startClient(self.options['wsuri'], debug = self.debug)
@@ -229,7 +256,7 @@ class WsTestRunner(object):
          servers = self.spec.get("servers", [])
          if len(servers) == 0:
              self.spec["servers"] = [{"url": self.options['wsuri']}]
-         return fuzzing.startClient(self.spec, debug = self.debug)
+         return fuzzing.startClient(self.spec, debug = self.debug, workers = self.options['workers'])
 
       elif self.mode == "fuzzingserver":
          return fuzzing.startServer(self.spec, self.options['webport'], debug = self.debug)
@@ -241,7 +268,10 @@ class WsTestRunner(object):
          return wsperfmaster.startServer(self.options['webport'], debug = self.debug)
 
       elif self.mode == "massconnect":
-         return massconnect.startClient(self.spec, debug = self.debug)
+         return massconnect.startClient(self.spec, debug = self.debug, outfile = self.options['outfile'], workers = self.options['workers'])
+
+      elif self.mode == "unbundle":
+         return fuzzing.exportBundle(self.options['bundle'], self.options['outfile'])
 
       elif self.mode == "serializer":
          return serializer.start(outfilename = self.options['outfile'], debug = self.debug)
@@ -277,7 +307,13 @@ def start(options, spec = None):
          def shutdown(_):
             reactor.stop()
          res.addBoth(shutdown)
-      reactor.run()
+
+      if options.get('profile', None):
+         profiler.startProfiler(options['profile'], options['profiler'])
+         reactor.run()
+         profiler.stopProfiler()
+      else:
+         reactor.run()
 
 
 